@@ -0,0 +1,35 @@
+"""add election results
+
+Revision ID: 0a8e5c7d3b41
+Revises: f27c4d9b8e13
+Create Date: 2026-10-18 15:09:12.634870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a8e5c7d3b41'
+down_revision = 'f27c4d9b8e13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "election_results",
+        sa.Column("election_id", sa.Integer(), nullable=False),
+        sa.Column("closed_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("total_votes", sa.Integer(), nullable=False),
+        sa.Column("statistics", sa.Text(), nullable=False),
+        sa.Column("participants", sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(["election_id"], ["election.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("election_id"),
+    )
+    op.create_index("ix_election_results_closed_at", "election_results", ["closed_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_election_results_closed_at", table_name="election_results")
+    op.drop_table("election_results")
@@ -0,0 +1,29 @@
+"""add entity versions
+
+Revision ID: 1c6f9a2e4d57
+Revises: 0a8e5c7d3b41
+Create Date: 2026-10-18 15:16:40.207318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c6f9a2e4d57'
+down_revision = '0a8e5c7d3b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "entity_versions",
+        sa.Column("entity", sa.String(), nullable=False),
+        sa.Column("version", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.PrimaryKeyConstraint("entity"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("entity_versions")
@@ -0,0 +1,43 @@
+"""add hot lookup indexes
+
+Revision ID: 3f1c9a7d2b6e
+Revises: a5e0c3f19d24
+Create Date: 2026-10-18 09:12:41.315530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b6e'
+down_revision = 'a5e0c3f19d24'
+branch_labels = None
+depends_on = None
+
+# name, table, columns or expressions
+INDEXES = [
+    ("ix_users_email", "users", ["email"]),
+    ("ix_users_admin_id", "users", ["admin_id"]),
+    ("ix_users_lower_state", "users", [sa.text("lower(state)")]),
+    ("ix_users_lower_lga", "users", [sa.text("lower(lga)")]),
+    ("ix_candidates_election_id", "candidates", ["election_id"]),
+    ("ix_candidates_party_name", "candidates", ["party_name"]),
+    ("ix_votes_candidateId", "votes", ["candidateId"]),
+    ("ix_election_end_date", "election", ["end_date"]),
+    ("ix_election_state_end_date", "election", ["state", "end_date"]),
+    ("ix_election_lga_end_date", "election", ["lga", "end_date"]),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY does not lock out writes but can not run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,38 @@
+"""add voter lookup indexes
+
+Revision ID: 8d42e6b1f0a7
+Revises: 3f1c9a7d2b6e
+Create Date: 2026-10-18 11:03:27.904112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d42e6b1f0a7'
+down_revision = '3f1c9a7d2b6e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index("ix_users_vin", "users", ["vin"], unique=True, postgresql_concurrently=True)
+        op.create_index(
+            "ix_users_mobile_no", "users", ["mobile_no"], postgresql_using="hash", postgresql_concurrently=True
+        )
+        # text_pattern_ops lets LIKE 'prefix%' use the index whatever the collation
+        ops = " text_pattern_ops" if op.get_bind().dialect.name == "postgresql" else ""
+        op.create_index(
+            "ix_users_lga_name_prefix", "users",
+            [sa.text(f"lower(lga){ops}"), sa.text(f"lower(name){ops}")],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_users_lga_name_prefix", table_name="users", postgresql_concurrently=True)
+        op.drop_index("ix_users_mobile_no", table_name="users", postgresql_concurrently=True)
+        op.drop_index("ix_users_vin", table_name="users", postgresql_concurrently=True)
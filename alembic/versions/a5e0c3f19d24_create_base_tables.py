@@ -0,0 +1,104 @@
+"""create base tables
+
+The tables of the application as they were created by Base.metadata.create_all before the schema was managed by
+Alembic. A database created that way is brought under Alembic with `alembic stamp a5e0c3f19d24` before upgrading,
+see the Deployment section of the README.
+
+Revision ID: a5e0c3f19d24
+Revises:
+Create Date: 2026-10-18 08:47:05.228164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5e0c3f19d24'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("nin", sa.String(), nullable=False),
+        sa.Column("vin", sa.String(), nullable=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("address", sa.String(), nullable=False),
+        sa.Column("ward", sa.Integer(), nullable=False),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("lga", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("mobile_no", sa.CHAR(11), nullable=False),
+        sa.Column("dob", sa.String(), nullable=False),
+        sa.Column("gender", sa.String(), nullable=False),
+        sa.Column("reg_date", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("role", sa.String(), server_default="user", nullable=False),
+        sa.Column("accredited", sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column("voted", sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column("admin_id", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("nin"),
+    )
+    op.create_table(
+        "party",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("party_logo_url", sa.String(), nullable=False),
+        sa.Column("ideology", sa.String(), nullable=False),
+        sa.Column("fullname", sa.String(), nullable=True),
+        sa.Column("party_chairman", sa.String(), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_table(
+        "election",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(255), nullable=False),
+        sa.Column("state", sa.String(255), nullable=True),
+        sa.Column("lga", sa.String(255), nullable=True),
+        sa.Column("start_date", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("end_date", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("created_by", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "candidates",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("party_name", sa.String(), nullable=False),
+        sa.Column("position", sa.String(), nullable=False),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("ideology", sa.String(), nullable=False),
+        sa.Column("reg_date", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("total_votes", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("election_id", sa.Integer(), nullable=False),
+        sa.Column("created_by", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["party_name"], ["party.name"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["election_id"], ["election.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "votes",
+        sa.Column("voterId", sa.Integer(), nullable=False),
+        sa.Column("electionId", sa.Integer(), nullable=False),
+        sa.Column("candidateId", sa.Integer(), nullable=False),
+        sa.Column("voted_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(["electionId"], ["election.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["candidateId"], ["candidates.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("voterId", "electionId"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("votes")
+    op.drop_table("candidates")
+    op.drop_table("election")
+    op.drop_table("party")
+    op.drop_table("users")
@@ -0,0 +1,41 @@
+"""add election stats
+
+Revision ID: c3d8f2a61b47
+Revises: 8d42e6b1f0a7
+Create Date: 2026-10-18 14:02:16.530871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d8f2a61b47'
+down_revision = '8d42e6b1f0a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "election_stats",
+        sa.Column("election_id", sa.Integer(), nullable=False),
+        sa.Column("candidate_id", sa.Integer(), nullable=False),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("lga", sa.String(), nullable=False),
+        sa.Column("votes", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.ForeignKeyConstraint(["election_id"], ["election.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["candidate_id"], ["candidates.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("election_id", "candidate_id", "state", "lga"),
+    )
+    # the table starts empty, fill it from the votes cast so far
+    op.execute(
+        'INSERT INTO election_stats (election_id, candidate_id, state, lga, votes) '
+        'SELECT v."electionId", v."candidateId", lower(trim(u.state)), lower(trim(u.lga)), count(*) '
+        'FROM votes v JOIN users u ON u.id = v."voterId" '
+        'GROUP BY v."electionId", v."candidateId", lower(trim(u.state)), lower(trim(u.lga))'
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("election_stats")
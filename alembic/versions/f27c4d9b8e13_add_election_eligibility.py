@@ -0,0 +1,34 @@
+"""add election eligibility
+
+Revision ID: f27c4d9b8e13
+Revises: e61b3f8a2c90
+Create Date: 2026-10-18 15:02:47.516203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f27c4d9b8e13'
+down_revision = 'e61b3f8a2c90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # filled by `python -m e_voting.api.app.manage rebuild-eligibility` once the migration has run
+    op.create_table(
+        "election_eligibility",
+        sa.Column("election_id", sa.Integer(), nullable=False),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("lga", sa.String(), nullable=False),
+        sa.Column("ward", sa.Integer(), nullable=False),
+        sa.Column("voters", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.ForeignKeyConstraint(["election_id"], ["election.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("election_id", "state", "lga", "ward"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("election_eligibility")
@@ -0,0 +1,8 @@
+"""
+Benchmarks of the hot paths of the API, run as modules from the repository root, e.g.
+
+    python -m benchmarks.vote_round_trips
+
+They run against DATABASE_URL when it is set, ideally a Postgres database created for the purpose since every
+benchmark fills it with its own rows, and against a throwaway SQLite database otherwise.
+"""
@@ -0,0 +1,80 @@
+"""
+Shared setup of the benchmarks.
+
+Importing this module sets up the environment the application reads its settings from, so it must be imported before
+anything from e_voting.
+
+Functions:
+
+    create_tables: creates the tables of the models in the benchmark database.
+    round_trips: counts the statements and commits sent to the database.
+    report: prints the results of a benchmark as an aligned table.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='e_voting_bench_'), 'bench.db')}"
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOK_EXPIRE_MINUTES", "30")
+os.environ.setdefault("CLOUDINARY_CLOUD_NAME", "benchmark")
+os.environ.setdefault("CLOUDINARY_API_KEY", "benchmark")
+os.environ.setdefault("CLOUDINARY_API_SECRET", "benchmark")
+
+from sqlalchemy import event  # noqa: E402
+from e_voting.api.app import models  # noqa: E402
+from e_voting.api.app.database import engine  # noqa: E402
+
+
+def create_tables():
+    models.Base.metadata.create_all(bind=engine)
+
+
+class RoundTrips:
+    """The number of statements and commits sent to the database"""
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+
+    @property
+    def total(self):
+        return self.statements + self.commits
+
+
+@contextmanager
+def round_trips(target):
+    """
+        Count the statements executed and the transactions committed through an engine.
+
+        Args:
+            target (Engine): The engine, `async_engine.sync_engine` for the asyncio one.
+
+        Yields:
+            RoundTrips: The counters, updated until the block exits.
+    """
+    counts = RoundTrips()
+
+    def on_execute(*args):
+        counts.statements += 1
+
+    def on_commit(*args):
+        counts.commits += 1
+
+    event.listen(target, "before_cursor_execute", on_execute)
+    event.listen(target, "commit", on_commit)
+    try:
+        yield counts
+    finally:
+        event.remove(target, "before_cursor_execute", on_execute)
+        event.remove(target, "commit", on_commit)
+
+
+def report(title: str, header: list, rows: list):
+    """Print a table, one row per benchmarked path"""
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    print(f"\n{title} ({engine.dialect.name})")
+    for row in (header, *rows):
+        print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,124 @@
+"""
+Requests per second served by one worker through three ways of reaching the database:
+
+    blocking: the original code path, endpoints taking a blocking Session from database.get_db. The endpoints
+        declared with `def` run in the threadpool, the party list, declared `async def`, blocks the event loop.
+    sync: the application with `db_mode` set to "sync", the blocking driver run in the threadpool by ThreadedSession.
+    async: the application with `db_mode` set to "async", the psycopg 3 asyncio driver.
+
+The application is driven in process through httpx, with `--concurrency` clients each sending `--requests` requests
+in turn to endpoints that query the database on every call: a page of votes, a voter profile and the party list.
+The blocking endpoints run the same queries as the application's.
+
+Only a Postgres server reached over the network says which mode to deploy: point DATABASE_URL at one, with both
+psycopg2 and psycopg 3 installed. On SQLite the comparison says little, queries return from the local disk in
+microseconds and aiosqlite runs them on a thread of its own anyway. There, with the defaults, blocking served
+443 requests/s, sync 616 and async 328. `db_mode` defaults to "sync" until async comes out ahead on Postgres.
+
+The concurrency defaults to the size of the connection pool, 5 connections plus 10 of overflow. Beyond it the
+blocking path stalls: the party list waits for a connection on the event loop, while the connections are held by
+requests that need the event loop to release them, until the pool times out after 30 seconds.
+
+    python -m benchmarks.db_modes [--concurrency 15] [--requests 50]
+"""
+import argparse
+import asyncio
+import time
+
+from typing import List
+
+import httpx
+from benchmarks.common import create_tables, report
+from benchmarks.vote_round_trips import seed
+from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from e_voting.api.app import models, oauth, schemas
+from e_voting.api.app.config import settings
+from e_voting.api.app.database import engine, get_db
+from e_voting.api.app.main import app
+
+blocking_app = FastAPI()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+
+
+def blocking_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """get_current_user as it was, one query per request"""
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    user = db.get(models.User, int(oauth.verify_tok(token, credentials_exception).id))
+    if user is None:
+        raise credentials_exception
+    return user
+
+
+@blocking_app.get("/votes/{electionId}", response_model=List[schemas.Vote])
+def blocking_votes(electionId: int, limit: int = 20, db: Session = Depends(get_db)):
+    V = models.Vote
+    return db.query(V).where(V.electionId == electionId).order_by(V.voterId).limit(limit).all()
+
+
+@blocking_app.get("/party/", response_model=List[schemas.PartyView])
+async def blocking_parties(db: Session = Depends(get_db)):
+    return db.query(models.Party).order_by(models.Party.id).limit(settings.page_default_limit).all()
+
+
+@blocking_app.get("/users/profile/{user_ID}", response_model=schemas.UserProfile)
+def blocking_profile(user_ID: int, db: Session = Depends(get_db), user: models.User = Depends(blocking_user)):
+    return db.get(models.User, user_ID)
+
+
+MODES = {"blocking": blocking_app, "sync": app, "async": app}
+
+
+def seed_votes(voters: int):
+    election_id, candidate_ids, by_path = seed(voters)
+    users = by_path["cast_vote"]
+    with engine.begin() as connection:
+        connection.execute(insert(models.Vote), [
+            {"voterId": user.id, "electionId": election_id, "candidateId": candidate_ids[n % len(candidate_ids)]}
+            for n, user in enumerate(users)
+        ])
+    return election_id, users
+
+
+async def drive(target: FastAPI, election_id: int, users: list, concurrency: int, requests: int):
+    paths = [f"/votes/{election_id}?limit=20", "/party/"]
+    transport = httpx.ASGITransport(app=target)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def session(n: int):
+            user = users[n % len(users)]
+            headers = {"Authorization": f"Bearer {oauth.create_access_token({'user_id': user.id})}"}
+            for i in range(requests):
+                path = paths[i % len(paths)] if i % 3 else f"/users/profile/{user.id}"
+                response = await client.get(path, headers=headers)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(session(n) for n in range(concurrency)))
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=15, help="clients sending requests at the same time")
+    parser.add_argument("--requests", type=int, default=50, help="requests sent by every client")
+    args = parser.parse_args()
+
+    create_tables()
+    election_id, users = seed_votes(200)
+    total = args.concurrency * args.requests
+    rows = []
+    for mode, target in MODES.items():
+        settings.db_mode = "sync" if mode == "blocking" else mode
+        # one warm-up round opens the connections and fills the caches
+        asyncio.run(drive(target, election_id, users, args.concurrency, 1))
+        elapsed = asyncio.run(drive(target, election_id, users, args.concurrency, args.requests))
+        rows.append((mode, total, f"{elapsed:.2f}", f"{total / elapsed:.0f}"))
+    report(
+        f"{args.concurrency} concurrent clients on one worker", ["mode", "requests", "seconds", "requests/s"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Time spent returning a list of votes, as GET /votes/{electionId} does, through two paths:
+
+    pydantic: the ORM entities are loaded, validated with schemas.Vote.from_orm, converted by jsonable_encoder and
+        dumped with json, which is what FastAPI does with a response_model.
+    projection: serialization.project selects the schema's columns only and orjson encodes the rows to bytes, which
+        is what pagination.paginate does.
+
+Both are timed on the same rows for every size given to `--rows`, split into the query, which includes building the
+ORM objects or the rows, and the encoding. The documents they produce are checked to be the same.
+
+    python -m benchmarks.serialization [--rows 10000 100000 1000000]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import create_tables, report
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, insert, select
+from e_voting.api.app import models, schemas
+from e_voting.api.app.database import SessionLocal, engine
+from e_voting.api.app.serialization import project
+
+CHUNK = 50_000
+
+
+def seed(rows: int):
+    """Insert an election with five candidates and `rows` votes, return the election's ID"""
+    now = datetime.now(timezone.utc)
+    with engine.begin() as connection:
+        election_id = connection.execute(insert(models.Election).values(
+            title="Serialization", start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1)
+        ).returning(models.Election.id)).scalar_one()
+        connection.execute(insert(models.Party).values(
+            name="SER", fullname="Serialization Party", ideology="centre", party_chairman="Chair",
+            party_logo_url="https://example.com/ser.png"
+        ))
+        candidate_ids = connection.execute(insert(models.Candidates).values([
+            {"name": f"Candidate {n}", "party_name": "SER", "position": "Governor", "state": "Lagos",
+             "ideology": "centre", "election_id": election_id}
+            for n in range(5)
+        ]).returning(models.Candidates.id)).scalars().all()
+        for start in range(0, rows, CHUNK):
+            connection.execute(insert(models.Vote), [
+                {"voterId": n, "electionId": election_id, "candidateId": candidate_ids[n % len(candidate_ids)]}
+                for n in range(start + 1, min(start + CHUNK, rows) + 1)
+            ])
+    return election_id
+
+
+def query(election_id: int, rows: int):
+    V = models.Vote
+    return select(V).where(V.electionId == election_id).order_by(V.voterId).limit(rows)
+
+
+def pydantic_path(db, election_id: int, rows: int):
+    started = time.perf_counter()
+    votes = db.scalars(query(election_id, rows)).all()
+    loaded = time.perf_counter()
+    body = json.dumps(jsonable_encoder([schemas.Vote.from_orm(vote) for vote in votes])).encode()
+    return body, loaded - started, time.perf_counter() - loaded
+
+
+def projection_path(db, election_id: int, rows: int):
+    started = time.perf_counter()
+    projection = project(query(election_id, rows), schemas.Vote)
+    result = db.execute(projection.stmt).all()
+    loaded = time.perf_counter()
+    body = projection.dumps(result)
+    return body, loaded - started, time.perf_counter() - loaded
+
+
+PATHS = {"pydantic": pydantic_path, "projection": projection_path}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="numbers of votes returned")
+    args = parser.parse_args()
+
+    create_tables()
+    election_id = seed(max(args.rows))
+    rows = []
+    for size in args.rows:
+        documents = []
+        for path, encode in PATHS.items():
+            with SessionLocal() as db:
+                body, query_seconds, encode_seconds = encode(db, election_id, size)
+            documents.append(json.loads(body))
+            total = query_seconds + encode_seconds
+            rows.append((size, path, f"{query_seconds:.3f}", f"{encode_seconds:.3f}", f"{total:.3f}",
+                         f"{size / total:.0f}"))
+        assert all(document == documents[0] for document in documents), "the paths produced different documents"
+    with engine.connect() as connection:
+        seeded = connection.scalar(select(func.count()).select_from(models.Vote))
+    report(
+        f"Returning votes out of {seeded}", ["rows", "path", "query s", "encode s", "total s", "rows/s"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
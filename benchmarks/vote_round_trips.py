@@ -0,0 +1,116 @@
+"""
+Round trips and throughput of casting a ballot.
+
+Three paths are compared, each casting one ballot for every voter of its own set:
+
+    chain: the original validation chain of POST /votes, one query per check followed by an ORM insert and a refresh.
+    cast_vote: ballot.cast_vote, the checks folded into a single INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+    cached: what POST /votes runs once the election is cached, ballot.check_ballot in memory followed by
+        ballot.record_vote, a plain INSERT ... ON CONFLICT DO NOTHING.
+
+    python -m benchmarks.vote_round_trips [--ballots 2000]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import create_tables, report, round_trips
+from fastapi import HTTPException, status
+from sqlalchemy import insert, select
+from e_voting.api.app import ballot, cache, models, schemas
+from e_voting.api.app.database import AsyncSessionLocal, async_engine, engine
+
+
+async def chain_vote(db, body: schemas.VoteCreate, user: models.User):
+    """The validation chain POST /votes used to run, with its lazy loads written as the queries they emitted"""
+    E, C, V = models.Election, models.Candidates, models.Vote
+    election = await db.scalar(select(E).where(E.id == body.electionId))
+    if election is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No Election with Id= {body.electionId}")
+    if cache.aware(election.end_date) <= datetime.now(timezone.utc):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Election is Closed!")
+    candidates = (await db.scalars(select(C).where(C.election_id == election.id))).all()
+    if body.candidateId not in {candidate.id for candidate in candidates}:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Candidate is not registered")
+    if not election.user_eligible(user):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="You are not eligible")
+    if await db.scalar(select(V).where(V.electionId == election.id, V.voterId == user.id)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="multiple voting is not allowed")
+    vote_cast = V(voterId=user.id, electionId=election.id, candidateId=body.candidateId)
+    db.add(vote_cast)
+    await db.commit()
+    await db.refresh(vote_cast)
+    return vote_cast
+
+
+async def cached_vote(db, body: schemas.VoteCreate, user: models.User):
+    ballot.check_ballot(await cache.get_election(db, body.electionId), body, user)
+    return await ballot.record_vote(db, body, user)
+
+
+PATHS = {"chain": chain_vote, "cast_vote": ballot.cast_vote, "cached": cached_vote}
+
+
+def seed(ballots: int):
+    """Insert an election with five candidates and a set of voters for every path"""
+    now = datetime.now(timezone.utc)
+    with engine.begin() as connection:
+        election_id = connection.execute(insert(models.Election).values(
+            title="Benchmark", start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1)
+        ).returning(models.Election.id)).scalar_one()
+        connection.execute(insert(models.Party).values(
+            name="BENCH", fullname="Benchmark Party", ideology="centre", party_chairman="Chair",
+            party_logo_url="https://example.com/bench.png"
+        ))
+        candidate_ids = connection.execute(insert(models.Candidates).values([
+            {"name": f"Candidate {n}", "party_name": "BENCH", "position": "Governor", "state": "Lagos",
+             "ideology": "centre", "election_id": election_id}
+            for n in range(5)
+        ]).returning(models.Candidates.id)).scalars().all()
+        voters = {}
+        for path in PATHS:
+            voters[path] = connection.execute(insert(models.User).values([
+                {"name": f"{path} {n}", "email": f"{path}{n}@example.com", "nin": f"{path}-{n}",
+                 "vin": f"{path}-vin-{n}", "dob": "1990-01-01", "gender": "F", "mobile_no": f"{n:011d}",
+                 "address": "1 Main Street", "state": "Lagos", "lga": "Ikeja", "ward": 1, "password": "x",
+                 "accredited": True}
+                for n in range(ballots)
+            ]).returning(models.User)).all()
+    return election_id, candidate_ids, voters
+
+
+async def run(path: str, election_id: int, candidate_ids: list, voters: list):
+    vote = PATHS[path]
+    async with AsyncSessionLocal() as db:
+        with round_trips(async_engine.sync_engine) as counts:
+            started = time.perf_counter()
+            for n, user in enumerate(voters):
+                body = schemas.VoteCreate(electionId=election_id, candidateId=candidate_ids[n % len(candidate_ids)])
+                await vote(db, body, user)
+            elapsed = time.perf_counter() - started
+    return counts, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ballots", type=int, default=2000, help="ballots cast by every path")
+    args = parser.parse_args()
+
+    create_tables()
+    election_id, candidate_ids, voters = seed(args.ballots)
+    rows = []
+    for path in PATHS:
+        counts, elapsed = asyncio.run(run(path, election_id, candidate_ids, voters[path]))
+        rows.append((
+            path, f"{counts.statements / args.ballots:.2f}", f"{counts.commits / args.ballots:.2f}",
+            f"{counts.total / args.ballots:.2f}", f"{args.ballots / elapsed:.0f}"
+        ))
+    report(
+        f"Casting {args.ballots} ballots one at a time",
+        ["path", "statements/ballot", "commits/ballot", "round trips/ballot", "ballots/s"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+"""
+This module provides the vote-casting engine used by the POST /votes route.
+
+A ballot is validated and written in a single database round trip: the election window, candidate
+membership and voter eligibility are expressed as the SELECT part of an
+INSERT ... SELECT ... ON CONFLICT ("voterId", "electionId") DO NOTHING ... RETURNING statement.
+When the statement inserts a row the vote has been cast. When it does not, a single diagnostic query
+is run to work out which rule rejected the ballot so that the API keeps returning the same errors.
+
+The ballot source of cast_votes and rejection_reasons is a VALUES list on Postgres and a UNION ALL of literal rows
+on other backends, and import_ballots only goes through COPY and a staging table on Postgres.
+
+When the election metadata is already cached, check_ballot validates the ballot in memory and
+record_vote only inserts into the votes table, relying on the primary key for duplicate votes and on
+the foreign keys to catch a stale cache.
+
+The response of a ballot sent with an Idempotency-Key is stored in the same transaction as the vote, so a vote is
+never committed without the response a retry replays.
+
+Functions:
+
+    vote_response: returns the response body of a recorded vote.
+    eligibility_clause: builds the SQL predicate matching elections a voter may take part in.
+    check_ballot: validates a ballot against cached election metadata.
+    record_vote: records a ballot already validated by check_ballot.
+    import_ballots: validates and records a chunk of offline ballots through a COPY into a staging table.
+    cast_vote: validates and records a ballot, raising an HTTPException when it is rejected.
+    cast_votes: validates and records a batch of ballots in one multi-row statement and one commit.
+    rejection_reason: works out why a ballot was not recorded.
+    rejection_reasons: works out why each ballot of a batch was not recorded, in one query.
+"""
+from datetime import datetime
+from typing import List, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import Integer, String, and_, or_, func, literal, select, exists, column, values, text, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, cache, idempotency
+from .database import IS_POSTGRES, copy_rows, insert
+
+
+def voter_region(user):
+    """Return the state and LGA of a voter normalised by models.normalise_region"""
+    return models.normalise_region(user.state), models.normalise_region(user.lga)
+
+
+def eligibility_clause(state, lga):
+    """
+        Build the SQL equivalent of models.Election.user_eligible for a voter's state and LGA.
+
+        Accreditation is not part of the clause since it is known from the user row already loaded.
+
+        Args:
+            state: The state of the voter normalised by models.normalise_region, as a string or a SQL expression.
+            lga: The LGA of the voter normalised by models.normalise_region, as a string or a SQL expression.
+
+        Returns:
+            sqlalchemy.sql.ColumnElement: A boolean clause on the election table.
+    """
+    E = models.Election
+    election_state, election_lga = models.normalise_region_sql(E.state), models.normalise_region_sql(E.lga)
+    return or_(
+        and_(election_state == "", election_lga == ""),
+        and_(election_lga == "", election_state == state),
+        and_(election_lga != "", election_lga == lga)
+    )
+
+
+def vote_response(vote_cast):
+    """Return the body of the 201 response of a recorded vote"""
+    return {column: getattr(vote_cast, column) for column in ("voterId", "electionId", "candidateId", "voted_at")}
+
+
+async def _record_key(db: AsyncSession, user: models.User, idempotency_key: str, vote_cast):
+    """Store the response of a recorded vote under its Idempotency-Key, in the transaction of the vote"""
+    if vote_cast is None or not idempotency_key:
+        return []
+    return await idempotency.record(
+        db, [(user.id, idempotency_key, status.HTTP_201_CREATED, vote_response(vote_cast))]
+    )
+
+
+def _diagnose(row, body: schemas.VoteCreate, user: models.User):
+    """Turn the diagnostic columns selected for a rejected ballot into the matching HTTPException"""
+    if row is None or not row.found:
+        return HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No Election with Id= {body.electionId}"
+        )
+    if not row.open:
+        return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Election is Closed!")
+    if not row.started:
+        return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Election has not started!")
+    if not row.candidate:
+        return HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Candidate is not registered for this election"
+        )
+    if not user.accredited or not row.eligible:
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="You are not eligible to vote in this election"
+        )
+    if row.voted:
+        return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="multiple voting is not allowed")
+    # the election changed between the insert and the diagnosis, e.g. it closed in between
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Vote could not be recorded, try again")
+
+
+def _diagnostics(voter_id, candidate_id, state, lga):
+    """The columns telling which rule rejected a ballot, for an election joined as models.Election"""
+    E, C, V = models.Election, models.Candidates, models.Vote
+    now = func.now()
+    return (
+        E.id.isnot(None).label("found"),
+        (E.start_date <= now).label("started"),
+        (E.end_date > now).label("open"),
+        exists().where(C.id == candidate_id, C.election_id == E.id).label("candidate"),
+        eligibility_clause(state, lga).label("eligible"),
+        exists().where(V.electionId == E.id, V.voterId == voter_id).label("voted"),
+    )
+
+
+def _ballot_source(names: tuple, types: tuple, rows: list):
+    """Return literal rows as a selectable named "ballot": a VALUES list on Postgres, a UNION ALL elsewhere"""
+    if IS_POSTGRES:
+        return values(*(column(name, type_) for name, type_ in zip(names, types)), name="ballot").data(rows)
+    # SQLite cannot name the columns of a VALUES list
+    return union_all(*(
+        select(*(literal(value).label(name) for name, value in zip(names, row))) for row in rows
+    )).subquery("ballot")
+
+
+async def rejection_reason(db: AsyncSession, body: schemas.VoteCreate, user: models.User):
+    """
+        Work out why a ballot was not recorded and return the matching HTTPException.
+
+        This only runs on the failure path, so accepted ballots never pay for it.
+        The checks are reported in the same order as the original validation chain.
+
+        Args:
+            db (AsyncSession): The database session.
+            body (schemas.VoteCreate): The rejected ballot.
+            user (models.User): The voter.
+
+        Returns:
+            HTTPException: The error to send back to the client.
+    """
+    E = models.Election
+    row = (await db.execute(
+        select(*_diagnostics(user.id, body.candidateId, *voter_region(user)))
+        .where(E.id == body.electionId)
+    )).first()
+    return _diagnose(row, body, user)
+
+
+async def rejection_reasons(db: AsyncSession, ballots: List[Tuple[schemas.VoteCreate, models.User]]):
+    """
+        Work out why each ballot of a batch was not recorded, with one query for the whole batch.
+
+        Args:
+            db (AsyncSession): The database session.
+            ballots (List[Tuple[schemas.VoteCreate, models.User]]): The rejected ballots and their voters.
+
+        Returns:
+            list: The HTTPException of every ballot, in order.
+    """
+    if not ballots:
+        return []
+    E = models.Election
+    batch = _ballot_source(
+        ("n", "voter_id", "election_id", "candidate_id", "state", "lga"),
+        (Integer, Integer, Integer, Integer, String, String),
+        [(n, user.id, body.electionId, body.candidateId, *voter_region(user))
+         for n, (body, user) in enumerate(ballots)]
+    )
+    rows = {row.n: row for row in await db.execute(
+        select(batch.c.n, *_diagnostics(batch.c.voter_id, batch.c.candidate_id, batch.c.state, batch.c.lga))
+        .select_from(batch).outerjoin(E, E.id == batch.c.election_id)
+    )}
+    return [_diagnose(rows.get(n), body, user) for n, (body, user) in enumerate(ballots)]
+
+
+async def cast_vote(db: AsyncSession, body: schemas.VoteCreate, user: models.User, idempotency_key: str = None):
+    """
+        Validate and record a ballot in a single statement.
+
+        Args:
+            db (AsyncSession): The database session.
+            body (schemas.VoteCreate): The ballot to cast.
+            user (models.User): The voter.
+            idempotency_key (str, optional): The Idempotency-Key the response is stored under, in the same
+                transaction as the vote.
+
+        Returns:
+            sqlalchemy.engine.Row: The recorded vote (voterId, electionId, candidateId, voted_at).
+
+        Raises:
+            HTTPException: With the same status codes as the original validation chain when
+                the ballot is rejected.
+    """
+    if not user.accredited:
+        raise await rejection_reason(db, body, user)
+
+    E, C, V = models.Election, models.Candidates, models.Vote
+    now = func.now()
+    ballot = select(literal(user.id), E.id, C.id).select_from(E).join(
+        C, and_(C.election_id == E.id, C.id == body.candidateId)
+    ).where(
+        E.id == body.electionId,
+        E.start_date <= now,
+        E.end_date > now,
+        eligibility_clause(*voter_region(user))
+    )
+    stmt = insert(V).from_select(
+        ["voterId", "electionId", "candidateId"], ballot
+    ).on_conflict_do_nothing(
+        index_elements=["voterId", "electionId"]
+    ).returning(V.voterId, V.electionId, V.candidateId, V.voted_at)
+
+    vote_cast = (await db.execute(stmt)).first()
+    stored = await _record_key(db, user, idempotency_key, vote_cast)
+    await db.commit()
+    if not vote_cast:
+        raise await rejection_reason(db, body, user)
+    idempotency.remember(stored)
+    return vote_cast
+
+
+async def cast_votes(db: AsyncSession, ballots: List[Tuple[schemas.VoteCreate, models.User]], keys: list = None):
+    """
+        Validate and record a batch of ballots with one multi-row INSERT ... SELECT and a single commit.
+
+        The ballots are joined to the election and candidates tables through a VALUES list, so every
+        ballot goes through the same checks as in cast_vote. Only the rejected ballots are diagnosed
+        afterwards, all of them with a single query. Voters are expected to be accredited, see cast_vote
+        for the unaccredited path.
+
+        Args:
+            db (AsyncSession): The database session.
+            ballots (List[Tuple[schemas.VoteCreate, models.User]]): The ballots and the voters casting them.
+            keys (list, optional): The Idempotency-Key of every ballot, or None. The responses of the recorded
+                ballots are stored under their keys in the same transaction.
+
+        Returns:
+            list: For each ballot, in order, either the recorded vote row or the HTTPException rejecting it.
+    """
+    E, C, V = models.Election, models.Candidates, models.Vote
+    now = func.now()
+
+    # a voter may only appear once per election in a statement, later copies are duplicates
+    unique = {}
+    for body, user in ballots:
+        unique.setdefault((user.id, body.electionId), (body, user))
+
+    batch = _ballot_source(
+        ("voter_id", "election_id", "candidate_id", "state", "lga"),
+        (Integer, Integer, Integer, String, String),
+        [(user.id, body.electionId, body.candidateId, *voter_region(user))
+         for body, user in unique.values()]
+    )
+    source = select(batch.c.voter_id, E.id, C.id).select_from(batch).join(
+        E, E.id == batch.c.election_id
+    ).join(
+        C, and_(C.election_id == E.id, C.id == batch.c.candidate_id)
+    ).where(
+        E.start_date <= now,
+        E.end_date > now,
+        eligibility_clause(batch.c.state, batch.c.lga)
+    )
+    stmt = insert(V).from_select(
+        ["voterId", "electionId", "candidateId"], source
+    ).on_conflict_do_nothing(
+        index_elements=["voterId", "electionId"]
+    ).returning(V.voterId, V.electionId, V.candidateId, V.voted_at)
+
+    recorded = {(row.voterId, row.electionId): row for row in await db.execute(stmt)}
+
+    results = []
+    rejected = []
+    replayable = []
+    for n, (body, user) in enumerate(ballots):
+        key = (user.id, body.electionId)
+        row = recorded.get(key)
+        if row is not None and unique[key][0] is body:
+            results.append(row)
+            if keys and keys[n]:
+                replayable.append((user.id, keys[n], status.HTTP_201_CREATED, vote_response(row)))
+        else:
+            results.append(None)
+            rejected.append(n)
+    stored = await idempotency.record(db, replayable)
+    await db.commit()
+    idempotency.remember(stored)
+
+    reasons = await rejection_reasons(db, [ballots[n] for n in rejected])
+    for n, reason in zip(rejected, reasons):
+        results[n] = reason
+    return results
+
+
+def check_ballot(election: cache.ElectionInfo, body: schemas.VoteCreate, user: models.User, at: datetime = None):
+    """
+        Validate a ballot against cached election metadata, without touching the database.
+
+        The checks are the same, and run in the same order, as in rejection_reason.
+
+        Args:
+            election (cache.ElectionInfo): The cached election, None if it does not exist.
+            body (schemas.VoteCreate): The ballot to cast.
+            user (models.User): The voter.
+            at (datetime, optional): When the ballot was cast. Defaults to now.
+
+        Raises:
+            HTTPException: If the ballot must be rejected.
+    """
+    if election is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No Election with Id= {body.electionId}"
+        )
+    # once the results are frozen no ballot is taken, whatever time it was cast at
+    if cache.is_closed(election.id) or not election.is_open(at):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Election is Closed!")
+    if not election.has_started(at):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Election has not started!")
+    if body.candidateId not in election.candidate_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Candidate is not registered for this election"
+        )
+    if not election.user_eligible(user):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="You are not eligible to vote in this election"
+        )
+
+
+async def record_vote(db: AsyncSession, body: schemas.VoteCreate, user: models.User, idempotency_key: str = None):
+    """
+        Record a ballot already validated by check_ballot with a plain INSERT ... ON CONFLICT.
+
+        If the cached metadata turns out to be stale, i.e. the election or candidate no longer exists,
+        the election is dropped from the cache and the ballot goes through cast_vote instead.
+
+        Args:
+            db (AsyncSession): The database session.
+            body (schemas.VoteCreate): The ballot to cast.
+            user (models.User): The voter.
+            idempotency_key (str, optional): The Idempotency-Key the response is stored under, in the same
+                transaction as the vote.
+
+        Returns:
+            sqlalchemy.engine.Row: The recorded vote (voterId, electionId, candidateId, voted_at).
+
+        Raises:
+            HTTPException: 403 if the voter already voted in this election, or the errors of cast_vote.
+    """
+    V = models.Vote
+    stmt = insert(V).values(
+        voterId=user.id, electionId=body.electionId, candidateId=body.candidateId
+    ).on_conflict_do_nothing(
+        index_elements=["voterId", "electionId"]
+    ).returning(V.voterId, V.electionId, V.candidateId, V.voted_at)
+
+    try:
+        vote_cast = (await db.execute(stmt)).first()
+        stored = await _record_key(db, user, idempotency_key, vote_cast)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        cache.invalidate_election(body.electionId)
+        return await cast_vote(db, body, user, idempotency_key)
+    if not vote_cast:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="multiple voting is not allowed")
+    idempotency.remember(stored)
+    return vote_cast
+
+
+STAGING_TABLE = "votes_staging"
+STAGING_COLUMNS = ['"voterId"', '"electionId"', '"candidateId"', "voted_at"]
+
+
+def _parse_ballot(record: dict):
+    body = schemas.VoteCreate(candidateId=record["candidateId"], electionId=record["electionId"])
+    voted_at = record.get("voted_at") or None
+    if voted_at is not None:
+        voted_at = datetime.fromisoformat(voted_at)
+        if voted_at.tzinfo is None:
+            raise ValueError("voted_at must include a timezone")
+    return int(record["voterId"]), body, voted_at
+
+
+async def import_ballots(db: AsyncSession, records: list):
+    """
+        Validate and record a chunk of offline ballots.
+
+        The ballots are validated against cached election metadata and a single query for the voters of the
+        chunk, loaded with COPY into a temporary staging table and merged into votes with
+        INSERT ... SELECT ... ON CONFLICT DO NOTHING, which detects the voters who already voted. Other backends
+        than Postgres insert the chunk with a multi-row INSERT ... ON CONFLICT DO NOTHING instead.
+        The chunk is committed on its own.
+
+        Args:
+            db (AsyncSession): The database session.
+            records (list): The numbered records of the chunk, as yielded by bulk.iter_records. A record holds
+                voterId, electionId, candidateId and optionally voted_at, an ISO 8601 timestamp with a timezone
+                which defaults to now.
+
+        Returns:
+            tuple: The accepted (schemas.VoteCreate, voter) pairs and the rejections, a list of dicts
+                holding the row number and the reason.
+    """
+    rejections = []
+    parsed = []
+    for row_no, record in records:
+        try:
+            parsed.append((row_no, *_parse_ballot(record)))
+        except (TypeError, KeyError, ValueError) as exc:
+            rejections.append({"row": row_no, "reason": f"Malformed row: {exc}"})
+
+    U = models.User
+    voters = {voter.id: voter for voter in (await db.execute(
+        select(U.id, U.accredited, U.state, U.lga).where(U.id.in_({voter_id for _, voter_id, _, _ in parsed}))
+    )).all()}
+
+    staged = {}
+    for row_no, voter_id, body, voted_at in parsed:
+        voter = voters.get(voter_id)
+        try:
+            if voter is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Voter not found")
+            check_ballot(await cache.get_election(db, body.electionId), body, voter, voted_at)
+            if (voter_id, body.electionId) in staged:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="multiple voting is not allowed")
+        except HTTPException as exc:
+            rejections.append({"row": row_no, "reason": exc.detail})
+            continue
+        staged[(voter_id, body.electionId)] = (row_no, body, voter, voted_at)
+
+    if not staged:
+        return [], rejections
+
+    if IS_POSTGRES:
+        inserted = await _merge_staged(db, staged)
+    else:
+        V = models.Vote
+        inserted = set((await db.execute(insert(V).values([
+            {"voterId": voter_id, "electionId": election_id, "candidateId": body.candidateId,
+             "voted_at": voted_at or func.now()}
+            for (voter_id, election_id), (_, body, _, voted_at) in staged.items()
+        ]).on_conflict_do_nothing(
+            index_elements=["voterId", "electionId"]
+        ).returning(V.voterId, V.electionId))).all())
+    await db.commit()
+
+    accepted = []
+    for key, (row_no, body, voter, _) in staged.items():
+        if key in inserted:
+            accepted.append((body, voter))
+        else:
+            rejections.append({"row": row_no, "reason": "multiple voting is not allowed"})
+    return accepted, rejections
+
+
+async def _merge_staged(db: AsyncSession, staged: dict):
+    """COPY the staged ballots into a temporary table and merge them into votes, returning the inserted keys"""
+    await db.execute(text(
+        f'CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} '
+        '("voterId" integer, "electionId" integer, "candidateId" integer, voted_at timestamptz) '
+        'ON COMMIT DELETE ROWS'
+    ))
+    await copy_rows(db, STAGING_TABLE, STAGING_COLUMNS, [
+        (voter_id, election_id, body.candidateId, voted_at)
+        for (voter_id, election_id), (_, body, _, voted_at) in staged.items()
+    ])
+    return set((await db.execute(text(
+        'INSERT INTO votes ("voterId", "electionId", "candidateId", voted_at) '
+        f'SELECT "voterId", "electionId", "candidateId", coalesce(voted_at, now()) FROM {STAGING_TABLE} '
+        'ON CONFLICT ("voterId", "electionId") DO NOTHING '
+        'RETURNING "voterId", "electionId"'
+    ))).all())
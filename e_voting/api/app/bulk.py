@@ -0,0 +1,106 @@
+"""
+This module provides the building blocks of the bulk upload endpoints.
+
+Uploads are read straight from the request stream, one line at a time, and handed over in chunks of
+`bulk_chunk_size` records, so memory use does not depend on the size of the upload. Two formats are accepted:
+
+    text/csv: a header line naming the fields, then one record per line.
+    application/x-ndjson (the default): one JSON object per line.
+
+Functions:
+
+    iter_lines: splits a byte stream into lines.
+    iter_records: yields the numbered records of an upload.
+    spool: copies an upload to a temporary file, for processing after the request.
+    iter_file: streams back a spooled upload.
+    chunks: groups an async iterator into lists of at most `size` items.
+"""
+import csv
+import json
+import tempfile
+from typing import AsyncIterator
+from fastapi.concurrency import run_in_threadpool
+from .config import settings
+
+SPOOL_READ_SIZE = 64 * 1024
+
+
+async def iter_lines(stream: AsyncIterator[bytes]):
+    """Split a byte stream into lines, without the line terminators"""
+    pending = b""
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+
+async def iter_records(stream: AsyncIterator[bytes], content_type: str):
+    """
+        Yield the records of a CSV or NDJSON upload as they are received.
+
+        Args:
+            stream (AsyncIterator[bytes]): The body of the upload, e.g. `request.stream()`.
+            content_type (str): The Content-Type header of the upload.
+
+        Yields:
+            tuple: The 1-based row number and the record as a dict, or None if the row could not be decoded.
+    """
+    is_csv = (content_type or "").startswith("text/csv")
+    header = None
+    row_no = 0
+    async for line in iter_lines(stream):
+        if not line.strip():
+            continue
+        try:
+            text = line.decode("utf-8")
+            if is_csv:
+                values = next(csv.reader([text]))
+                if header is None:
+                    header = [name.strip() for name in values]
+                    continue
+                record = dict(zip(header, values)) if len(values) == len(header) else None
+            else:
+                record = json.loads(text)
+                if not isinstance(record, dict):
+                    record = None
+        except (UnicodeDecodeError, ValueError, csv.Error):
+            record = None
+        row_no += 1
+        yield row_no, record
+
+
+async def chunks(items: AsyncIterator, size: int = None):
+    """Group the items of an async iterator into lists of at most `size` items"""
+    size = size or settings.bulk_chunk_size
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def spool(stream: AsyncIterator[bytes]):
+    """Copy a byte stream to an anonymous temporary file, returned rewound"""
+    file = tempfile.TemporaryFile()
+    async for chunk in stream:
+        await run_in_threadpool(file.write, chunk)
+    file.seek(0)
+    return file
+
+
+async def iter_file(file):
+    """Stream back the content of a spooled upload, closing the file at the end"""
+    try:
+        while True:
+            chunk = await run_in_threadpool(file.read, SPOOL_READ_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
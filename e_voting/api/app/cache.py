@@ -0,0 +1,265 @@
+"""
+This module provides the in-process read-through caches used on hot read paths.
+
+TTLCache is a small LRU cache whose entries also expire after a fixed time to live, so that workers which did not
+see a write themselves only serve stale data for a bounded time. Hits and misses are counted in the metrics
+registry as `<name>_cache_hits` and `<name>_cache_misses`.
+
+Election metadata is cached as ElectionInfo snapshots holding the election columns, the IDs of its candidates and
+the participants list, so that casting a vote or listing participants does not touch the election and candidates
+tables at all. The routers that write elections, candidates or parties invalidate the affected entries.
+
+The elections that have not ended yet are cached as one ActiveElections index, bucketed into national, per-state and
+per-LGA elections, so that listing the elections open to a voter is a couple of dictionary lookups. It is rebuilt on
+the first read after any election is written, and elections drop out of it on their own once their end date passes.
+
+Elections whose results lifecycle.ElectionScheduler has frozen are kept in the `closed` set, so that ballots for them
+are rejected before anything else is looked up.
+
+Classes:
+
+    TTLCache: an LRU cache with per-entry expiry.
+    ElectionInfo: an immutable snapshot of an election and its candidates.
+    ActiveElections: the elections that have not ended yet, bucketed by the region they are held in.
+
+Functions:
+
+    get_election: returns the cached ElectionInfo of an election, loading it on a miss.
+    get_active_elections: returns the cached list of elections that have not ended yet.
+    get_voter_elections: returns the cached list of elections that have not ended yet and are held in a voter's region.
+    invalidate_election: drops an election, and the active elections list, from the cache.
+    invalidate_elections: drops every cached election.
+    is_closed: tells whether the results of an election have been frozen.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from . import models
+from .config import settings
+from .metrics import metrics
+
+_MISSING = object()
+
+
+def aware(value: datetime):
+    """Return a datetime read from the database as an aware datetime, SQLite returns naive UTC datetimes"""
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after being stored"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value of `key`, or `default` if it is missing or expired"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    metrics.inc(f"{self.name}_cache_hits")
+                    return value
+                del self._data[key]
+        metrics.inc(f"{self.name}_cache_misses")
+        return default
+
+    def set(self, key, value, ttl: float = None):
+        """
+            Store `value` under `key`, evicting the least recently used entry when the cache is full.
+
+            Args:
+                key: The key.
+                value: The value.
+                ttl (float, optional): How long the entry lives, in seconds. Defaults to the TTL of the cache.
+        """
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    async def get_or_load(self, key, load):
+        """
+            Return the cached value of `key`, calling and awaiting `load()` on a miss.
+
+            A `None` result is returned but not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = await load()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+
+class ElectionInfo:
+    """Immutable snapshot of an election, the IDs of its candidates and its participants"""
+
+    __slots__ = ("id", "title", "state", "lga", "start_date", "end_date", "created_at",
+                 "candidate_ids", "participants")
+
+    def __init__(self, election: models.Election):
+        for name in ("id", "title", "state", "lga"):
+            object.__setattr__(self, name, getattr(election, name))
+        for name in ("start_date", "end_date", "created_at"):
+            object.__setattr__(self, name, aware(getattr(election, name)))
+        object.__setattr__(self, "candidate_ids", frozenset(c.id for c in election.candidates))
+        object.__setattr__(self, "participants", tuple(
+            {
+                "party_name": candidate.party.name,
+                "party_logo": candidate.party.party_logo_url,
+                "candidate_name": candidate.name,
+                "candidate_id": candidate.id
+            } for candidate in reversed(election.candidates)
+        ))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ElectionInfo is immutable")
+
+    def is_open(self, now: datetime = None):
+        return self.end_date > (now or datetime.now(timezone.utc))
+
+    def has_started(self, now: datetime = None):
+        return self.start_date <= (now or datetime.now(timezone.utc))
+
+    # same rules as models.Election.user_eligible
+    user_eligible = models.Election.user_eligible
+
+
+class ActiveElections:
+    """Elections that had not ended when the index was built, bucketed into national, per-state and per-LGA"""
+
+    def __init__(self, active: list):
+        self.all = sorted(active, key=lambda election: election.id)
+        self.national = []
+        self.by_state = {}
+        self.by_lga = {}
+        # same buckets as models.Election.user_eligible
+        for election in self.all:
+            lga, state = models.normalise_region(election.lga), models.normalise_region(election.state)
+            if lga:
+                self.by_lga.setdefault(lga, []).append(election)
+            elif state:
+                self.by_state.setdefault(state, []).append(election)
+            else:
+                self.national.append(election)
+
+    @staticmethod
+    def _open(elections: list, now: datetime):
+        return [election for election in elections if aware(election.end_date) > now]
+
+    def active(self, now: datetime = None):
+        """Return the elections that have not ended yet"""
+        return self._open(self.all, now or datetime.now(timezone.utc))
+
+    def for_voter(self, state: str, lga: str, now: datetime = None):
+        """Return the elections that have not ended yet and are held nationally, in `state` or in `lga`"""
+        candidates = (self.national + self.by_state.get(models.normalise_region(state), [])
+                      + self.by_lga.get(models.normalise_region(lga), []))
+        return sorted(self._open(candidates, now or datetime.now(timezone.utc)), key=lambda election: election.id)
+
+
+elections = TTLCache("election", settings.metadata_cache_size, settings.metadata_cache_ttl_seconds)
+
+# IDs of the elections whose results are frozen, maintained by lifecycle.ElectionScheduler
+closed = set()
+
+ACTIVE = "active"
+
+
+async def get_election(db: AsyncSession, election_id: int):
+    """
+        Return the cached snapshot of an election, loading it on a miss.
+
+        Args:
+            db (AsyncSession): The database session used on a miss.
+            election_id (int): The election.
+
+        Returns:
+            ElectionInfo: The election, or None if it does not exist.
+    """
+    async def load():
+        E, C = models.Election, models.Candidates
+        election = await db.scalar(select(E).options(
+            selectinload(E.candidates).joinedload(C.party)
+        ).where(E.id == election_id))
+        return ElectionInfo(election) if election else None
+
+    return await elections.get_or_load(election_id, load)
+
+
+async def _active_index(db: AsyncSession):
+    async def load():
+        E = models.Election
+        return ActiveElections((await db.scalars(select(E).where(E.end_date > func.now()))).all())
+
+    return await elections.get_or_load(ACTIVE, load)
+
+
+async def get_active_elections(db: AsyncSession):
+    """
+        Return the cached list of elections that have not ended yet, loading it on a miss.
+
+        Args:
+            db (AsyncSession): The database session used on a miss.
+
+        Returns:
+            list: The active models.Election rows.
+    """
+    return (await _active_index(db)).active()
+
+
+async def get_voter_elections(db: AsyncSession, state: str, lga: str):
+    """
+        Return the cached list of elections that have not ended yet and that a voter of a region may take part in.
+
+        Args:
+            db (AsyncSession): The database session used on a miss.
+            state (str): The state of the voter.
+            lga (str): The LGA of the voter.
+
+        Returns:
+            list: The national elections and the elections of the voter's state and LGA, as models.Election rows.
+    """
+    return (await _active_index(db)).for_voter(state, lga)
+
+
+def invalidate_election(election_id: int = None):
+    """Drop an election, and the list of active elections, from the cache"""
+    if election_id is not None:
+        elections.invalidate(election_id)
+    elections.invalidate(ACTIVE)
+
+
+def invalidate_elections():
+    """Drop every cached election"""
+    elections.clear()
+
+
+def is_closed(election_id: int):
+    """Tell whether the results of an election have been frozen, in which case it takes no more ballots"""
+    return election_id in closed
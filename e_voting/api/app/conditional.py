@@ -0,0 +1,130 @@
+"""
+This module adds HTTP conditional caching to the read endpoints of parties, candidates and elections.
+
+Every entity type has a version counter in the entity_versions table, bumped by the routers that write it. Read
+endpoints declare the entity types their responses are built from, and their responses carry a strong ETag made of
+those versions, together with a Cache-Control header letting browsers, CDNs and reverse proxies reuse them for
+`http_cache_max_age_seconds`. A request whose If-None-Match matches the current ETag gets a 304 before the endpoint
+runs, so revalidations never touch the database.
+
+Each worker keeps the versions in memory. A write updates them at once on the worker that made it, and a background
+task reloads them every `etag_refresh_seconds` to pick up the writes of the other workers, so that is how long those
+may keep validating a stale ETag.
+
+Classes:
+
+    VersionCounter: the version counters of the entity types, as known to the worker process.
+
+Functions:
+
+    conditional: builds the dependency adding ETag and Cache-Control headers to the responses of a read endpoint.
+
+Constants:
+
+    versions: the VersionCounter instance shared by the worker process.
+"""
+import asyncio
+import logging
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .config import settings
+from .database import insert, session_scope
+
+logger = logging.getLogger(__name__)
+
+PARTY = "party"
+CANDIDATE = "candidate"
+ELECTION = "election"
+
+
+class VersionCounter:
+    """Per-entity-type version counters, persisted in entity_versions"""
+
+    def __init__(self):
+        self._versions = {}
+
+    def current(self, entities):
+        """Return the current version of every entity type in `entities`"""
+        return tuple(self._versions.get(entity, 0) for entity in entities)
+
+    def _update(self, entity: str, version: int):
+        # a reload may race with a bump, never go back
+        if version > self._versions.get(entity, 0):
+            self._versions[entity] = version
+
+    async def bump(self, db: AsyncSession, *entities: str):
+        """
+            Record that entities of the given types were written, and commit.
+
+            Call it once the write itself is committed, so that no reader caches the old data under the new version.
+
+            Args:
+                db (AsyncSession): The database session.
+                *entities (str): The entity types written.
+        """
+        V = models.EntityVersion
+        for entity in entities:
+            stmt = insert(V).values(entity=entity, version=1)
+            stmt = stmt.on_conflict_do_update(index_elements=[V.entity], set_={"version": V.version + 1})
+            version = await db.scalar(stmt.returning(V.version))
+            self._update(entity, version)
+        await db.commit()
+
+    async def reload(self, db: AsyncSession):
+        """Read the versions written by every worker"""
+        V = models.EntityVersion
+        for entity, version in (await db.execute(select(V.entity, V.version))).all():
+            self._update(entity, version)
+
+    async def startup(self):
+        async with session_scope() as db:
+            await self.reload(db)
+
+    async def run(self, interval: float = None):
+        """Reload the versions every `interval` seconds until cancelled"""
+        interval = interval or settings.etag_refresh_seconds
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_scope() as db:
+                    await self.reload(db)
+            except Exception:
+                logger.exception("Failed to reload entity versions, retrying in %s seconds", interval)
+
+
+versions = VersionCounter()
+
+
+def _matches(if_none_match: str, etag: str):
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag in ("*", etag):
+            return True
+    return False
+
+
+def conditional(*entities: str):
+    """
+        Build the dependency stamping the responses of a read endpoint with an ETag and a Cache-Control header.
+
+        Args:
+            *entities (str): The entity types the responses are built from.
+
+        Returns:
+            callable: The dependency, which raises a 304 HTTPException when If-None-Match holds the current ETag.
+    """
+    async def dependency(request: Request, response: Response):
+        stamp = zip(entities, versions.current(entities))
+        etag = '"' + "-".join(f"{entity}.{version}" for entity, version in stamp) + '"'
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.http_cache_max_age_seconds}"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
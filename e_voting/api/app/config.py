@@ -2,17 +2,65 @@ from pydantic import BaseSettings
 
 
 class Settings(BaseSettings):
-    db_hostname: str
-    db_port: str
-    db_password: str
-    db_username: str
-    db_name: str
+    # any SQLAlchemy URL, e.g. "sqlite:///./e_voting.db" or "sqlite://" for an in-memory database.
+    # When empty, a Postgres URL is built from the db_* settings below.
+    database_url: str = ""
+    db_hostname: str = ""
+    db_port: str = ""
+    db_password: str = ""
+    db_username: str = ""
+    db_name: str = ""
     secret_key: str
     algorithm: str
     access_tok_expire_minutes: int
+    refresh_tok_expire_days: int = 14
     cloudinary_cloud_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
+    # "async" uses the psycopg 3 asyncio driver, "sync" runs the blocking driver in the threadpool. "sync" stays the
+    # default until benchmarks.db_modes shows "async" serving more requests per worker on Postgres
+    db_mode: str = "sync"
+    # make every lazy load of a relationship raise, to catch N+1 queries in tests and during development
+    raise_on_lazy_load: bool = False
+    tally_flush_interval_seconds: float = 1.0
+    # how often elections are opened and closed, and how long after its end date an election's results are frozen,
+    # which must leave every worker time to flush its tallies
+    lifecycle_interval_seconds: float = 5
+    election_close_grace_seconds: float = 10
+    # "direct" writes each ballot in its own transaction, "group_commit" batches them through ingest.writer
+    vote_ingest_mode: str = "direct"
+    vote_batch_size: int = 200
+    vote_batch_wait_ms: int = 10
+    vote_queue_size: int = 10000
+    live_results_interval_ms: int = 500
+    metadata_cache_size: int = 1024
+    metadata_cache_ttl_seconds: float = 30
+    # how long clients and proxies may reuse a party, candidate or election response without revalidating it,
+    # and how often a worker picks up the writes made by the others
+    http_cache_max_age_seconds: int = 5
+    etag_refresh_seconds: float = 2
+    bulk_chunk_size: int = 1000
+    page_default_limit: int = 100
+    page_max_limit: int = 1000
+    page_stream_batch_size: int = 500
+    # how long a response stored under an Idempotency-Key is replayed
+    idempotency_window_seconds: int = 86400
+    idempotency_cache_size: int = 10000
+    # processes running bcrypt, and how many more calls may wait for one before getting a 503
+    hash_workers: int = 2
+    hash_max_pending: int = 100
+    principal_cache_size: int = 10000
+    principal_cache_ttl_seconds: float = 30
+    # login attempts allowed per client IP, per client IP and account, and per account from all clients together,
+    # refilled steadily up to the burst size. Anybody can spend the per-account bucket, keep it large
+    login_ip_rate_per_minute: float = 30
+    login_ip_burst: int = 10
+    login_account_rate_per_minute: float = 6
+    login_account_burst: int = 5
+    login_account_global_rate_per_minute: float = 60
+    login_account_global_burst: int = 100
+    login_throttle_max_keys: int = 100000
+    login_max_in_flight: int = 32
 
     class Config:
         # env_file = "C:\\Users\\MAHADI\\Documents\\Python Projects\\e-voting_system\\e_voting\\api\\.env"
@@ -1,5 +1,13 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import csv
+import io
+from contextlib import asynccontextmanager
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, raiseload, sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from .config import settings
 import cloudinary
@@ -12,15 +20,210 @@ cloudinary.config(
     secure=True
 )
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.db_username}:{settings.db_password}@{settings.db_hostname}:{settings.db_port}/{settings.db_name}"
+SQLALCHEMY_DATABASE_URL = settings.database_url or f"postgresql://{settings.db_username}:{settings.db_password}@{settings.db_hostname}:{settings.db_port}/{settings.db_name}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# asyncio drivers of the supported backends: psycopg 3 for Postgres, aiosqlite for SQLite
+ASYNC_DRIVERS = {"postgresql": "postgresql+psycopg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_url(url: str):
+    """Return the URL of the asyncio driver of the same database"""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def engine_options(url: str):
+    """Return the create_engine keyword arguments needed by the backend of `url`"""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return {}
+    options = {"connect_args": {"check_same_thread": False}}
+    if url.database in (None, "", ":memory:"):
+        # an in-memory database only lives as long as its connection, share a single one
+        options["poolclass"] = StaticPool
+    return options
+
+
+ASYNC_SQLALCHEMY_DATABASE_URL = async_url(SQLALCHEMY_DATABASE_URL)
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Postgres-only fast paths, such as COPY and VALUES lists, are only taken when this is True
+IS_POSTGRES = engine.dialect.name == "postgresql"
+IS_SQLITE = engine.dialect.name == "sqlite"
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def enable_foreign_keys(dbapi_connection, connection_record):
+        # SQLite ignores foreign keys, and so ON DELETE CASCADE, unless asked per connection
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+if settings.raise_on_lazy_load:
+    @event.listens_for(Session, "do_orm_execute")
+    def raise_on_lazy_load(execute_state):
+        # relationships not loaded by an explicit option of the query raise instead of emitting a query per object;
+        # this also covers the blocking sessions behind ThreadedSession, where lazy loads would otherwise succeed
+        if execute_state.is_select and not execute_state.is_column_load and not execute_state.is_relationship_load:
+            execute_state.statement = execute_state.statement.options(raiseload("*"))
+
+
+def insert(table):
+    """
+    Return an INSERT construct of the configured dialect.
+
+    Both the Postgres and the SQLite constructs support `on_conflict_do_nothing`, `on_conflict_do_update` and
+    `excluded`, so upserts are written once for both backends.
+    """
+    return (sqlite.insert if IS_SQLITE else postgresql.insert)(table)
 
 
 Base = declarative_base()
 
 
+class ThreadedSession:
+    """
+    Expose the AsyncSession methods used by the application on top of a blocking Session.
+
+    This is what `get_async_db` hands out when `db_mode` is "sync": every call that may reach the database
+    runs in the threadpool, so the routers are written once against the AsyncSession API and never block
+    the event loop in either mode.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    @property
+    def bind(self):
+        return self.sync_session.bind
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, *args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, *args, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance, *args, **kwargs):
+        await run_in_threadpool(self.sync_session.refresh, instance, *args, **kwargs)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+
+@asynccontextmanager
+async def session_scope():
+    """Open a session for the configured `db_mode`, for use outside of request handlers"""
+    if settings.db_mode == "sync":
+        db = ThreadedSession(SessionLocal())
+    else:
+        db = AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def copy_rows(db, table: str, columns, rows):
+    """
+    Load rows into a table with COPY ... FROM STDIN on the connection of the session's current transaction.
+
+    On other backends than Postgres, the rows are inserted with a single executemany INSERT instead.
+
+    Args:
+        db (AsyncSession | ThreadedSession): The database session.
+        table (str): The name of the target table.
+        columns (list): The quoted names of the columns, in the order of the values in each row.
+        rows (list): The rows to load, None values are loaded as NULL.
+    """
+    if not IS_POSTGRES:
+        params = [f":p{i}" for i in range(len(columns))]
+        await db.execute(
+            text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(params)})"),
+            [{f"p{i}": value for i, value in enumerate(row)} for row in rows]
+        )
+        return
+
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    if isinstance(db, ThreadedSession):
+        def copy(session: Session):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            # psycopg2, whose COPY takes a file object
+            raw = session.connection().connection.driver_connection
+            with raw.cursor() as cursor:
+                cursor.copy_expert(f"{sql} WITH (FORMAT csv)", buffer)
+
+        await db.run_sync(copy)
+        return
+
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    # psycopg 3 in asyncio mode
+    async with raw.driver_connection.cursor() as cursor:
+        async with cursor.copy(sql) as copy:
+            for row in rows:
+                await copy.write_row(row)
+
+
+async def stream_partitions(db, stmt, batch_size: int):
+    """
+    Yield the rows selected by `stmt` in lists of `batch_size` rows, fetched from a server-side cursor.
+
+    Args:
+        db (AsyncSession | ThreadedSession): The database session.
+        stmt (Select): The query.
+        batch_size (int): The number of rows fetched at a time.
+    """
+    stmt = stmt.execution_options(yield_per=batch_size)
+    if isinstance(db, ThreadedSession):
+        result = await db.execute(stmt)
+        while True:
+            partition = await run_in_threadpool(result.fetchmany, batch_size)
+            if not partition:
+                break
+            yield partition
+        return
+
+    result = await db.stream(stmt)
+    async for partition in result.partitions():
+        yield partition
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -28,3 +231,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency
+async def get_async_db():
+    async with session_scope() as db:
+        yield db
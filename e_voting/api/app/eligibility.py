@@ -0,0 +1,133 @@
+"""
+This module maintains the election_eligibility table, the number of voters eligible for each election broken down by
+the voters' state, LGA and ward.
+
+The counts of an election are computed with one set-based INSERT ... SELECT over the accredited users when the
+election is created or updated, and by the rebuild-eligibility command of the manage module for every election that
+has not ended. From then on they are adjusted incrementally: accrediting, de-accrediting, moving or deleting a voter
+adds or removes one voter in the matching region of every election still running there, with one upsert per region
+changed. Once an election has ended its counts are frozen, so its turnout stays the one of polling day.
+
+Regions are normalised by models.normalise_region like the keys of election_stats and the vote path, so
+results.election_statistics can put votes and eligible voters side by side and turnout figures are indexed lookups
+instead of scans of the users table.
+
+Functions:
+
+    region: normalises a voter's state, LGA and ward into the key used by election_eligibility.
+    snapshot: captures the fields of a voter that eligibility depends on.
+    changes: counts the regional changes of adding or removing a list of voters.
+    moved: counts the regional changes of a voter going from one snapshot to another.
+    adjust: applies regional changes to every running election concerned.
+    rebuild: recomputes the counts of one election, or of every running election.
+    eligible_counts: returns the counts of an election per state and LGA.
+"""
+from collections import Counter, namedtuple
+from sqlalchemy import and_, delete, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .ballot import eligibility_clause
+from .database import insert
+
+Voter = namedtuple("Voter", "accredited state lga ward")
+
+
+def region(state: str, lga: str, ward: int):
+    return models.normalise_region(state), models.normalise_region(lga), ward
+
+
+def snapshot(user):
+    """Capture the fields of a voter that eligibility depends on, before changing them"""
+    return Voter(user.accredited, user.state, user.lga, user.ward)
+
+
+def changes(voters, delta: int):
+    """Return the regional changes of adding (delta=1) or removing (delta=-1) a list of voters"""
+    result = Counter()
+    for voter in voters:
+        result[region(voter.state, voter.lga, voter.ward)] += delta
+    return result
+
+
+def moved(before, after):
+    """Return the regional changes of a voter going from the `before` snapshot to the `after` one, either may be None"""
+    result = Counter()
+    if before is not None and before.accredited:
+        result.update(changes([before], -1))
+    if after is not None and after.accredited:
+        result.update(changes([after], 1))
+    return result
+
+
+async def adjust(db: AsyncSession, deltas: Counter):
+    """
+        Apply regional changes to the counts of every election that has not ended and is held in the region.
+
+        The caller commits the session, ideally together with the change of the voters.
+
+        Args:
+            db (AsyncSession): The database session.
+            deltas (Counter): A mapping of (state, lga, ward), as returned by region, to the change in voters.
+    """
+    E, G = models.Election, models.ElectionEligibility
+    for (state, lga, ward), delta in deltas.items():
+        if not delta:
+            continue
+        stmt = insert(G).from_select(
+            ["election_id", "state", "lga", "ward", "voters"],
+            select(E.id, literal(state), literal(lga), literal(ward), literal(delta))
+            .where(E.end_date > func.now(), eligibility_clause(state, lga))
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[G.election_id, G.state, G.lga, G.ward],
+            set_={"voters": G.voters + stmt.excluded.voters}
+        )
+        await db.execute(stmt)
+
+
+async def rebuild(db: AsyncSession, election_id: int = None):
+    """
+        Recompute the counts of an election from the users table, in one statement, and commit.
+
+        Args:
+            db (AsyncSession): The database session.
+            election_id (int, optional): The election. Defaults to every election that has not ended.
+    """
+    E, U, G = models.Election, models.User, models.ElectionEligibility
+    if election_id is None:
+        elections = select(E.id).where(E.end_date > func.now())
+        scope = E.end_date > func.now()
+    else:
+        elections = [election_id]
+        scope = E.id == election_id
+    state, lga = models.normalise_region_sql(U.state), models.normalise_region_sql(U.lga)
+
+    await db.execute(delete(G).where(G.election_id.in_(elections)).execution_options(synchronize_session=False))
+    await db.execute(insert(G).from_select(
+        ["election_id", "state", "lga", "ward", "voters"],
+        select(E.id, state, lga, U.ward, func.count())
+        .select_from(E)
+        .join(U, and_(U.accredited.is_(True), eligibility_clause(state, lga)))
+        .where(scope)
+        .group_by(E.id, state, lga, U.ward)
+    ))
+    await db.commit()
+
+
+async def eligible_counts(db: AsyncSession, election_id: int):
+    """
+        Return the number of voters eligible for an election per state and LGA.
+
+        Args:
+            db (AsyncSession): The database session.
+            election_id (int): The election.
+
+        Returns:
+            collections.Counter: A mapping of (state, lga) to the number of eligible voters.
+    """
+    G = models.ElectionEligibility
+    rows = (await db.execute(
+        select(G.state, G.lga, func.sum(G.voters)).where(G.election_id == election_id).group_by(G.state, G.lga)
+    )).all()
+    return Counter({(state, lga): voters for state, lga, voters in rows})
+
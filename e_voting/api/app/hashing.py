@@ -0,0 +1,142 @@
+"""
+This module runs bcrypt password hashing and verification in a pool of worker processes.
+
+bcrypt deliberately burns around 100 ms of CPU per call. Run inline in a request handler it blocks the event loop,
+and with it every other request of the worker, so a burst of logins at poll opening would stall voting. The
+PasswordHasher sends the work to a ProcessPoolExecutor of `hash_workers` processes instead. At most `hash_workers`
+calls are in flight at once and at most `hash_max_pending` more may wait for a slot, beyond that callers get a 503
+right away instead of piling up. Bulk imports hash in batches through hash_many, which shares the same slots
+but waits for them instead of being refused, so logins keep getting their turn.
+
+Metrics:
+
+    password_hash_pending: gauge of the calls waiting for a worker.
+    password_hash_rejected: counter of the calls refused because too many were waiting.
+    password_hash_wait_ms: summary of the time calls waited for a worker.
+    password_hash_ms: summary of the time taken by the worker to hash or verify.
+    password_hash_batch_ms: summary of the time taken by the worker to hash a batch of hash_many.
+
+Classes:
+
+    PasswordHasher: the process pool together with its concurrency limiter.
+
+Constants:
+
+    pwd_context: the passlib context used for every password.
+    hasher: the PasswordHasher instance shared by the worker process.
+"""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from .config import settings
+from .metrics import metrics
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str):
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed_password: str):
+    return pwd_context.verify(password, hashed_password)
+
+
+def _hash_many(passwords: list):
+    return [pwd_context.hash(password) for password in passwords]
+
+
+HASH_BATCH_SIZE = 16
+
+
+class PasswordHasher:
+    """Process pool running bcrypt, with a bounded number of calls in flight and waiting"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._slots = None
+        self._pending = 0
+        metrics.gauge("password_hash_pending", lambda: self._pending)
+
+    def _pool(self):
+        # created on first use, from inside the worker process rather than at import time
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._executor
+
+    async def _run(self, fn, *args):
+        executor = self._pool()
+        if self._pending >= self.max_pending:
+            metrics.inc("password_hash_rejected")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, retry later",
+                headers={"Retry-After": "1"}
+            )
+        queued = time.perf_counter()
+        self._pending += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._pending -= 1
+        try:
+            started = time.perf_counter()
+            metrics.observe("password_hash_wait_ms", (started - queued) * 1000)
+            result = await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+            metrics.observe("password_hash_ms", (time.perf_counter() - started) * 1000)
+            return result
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str):
+        """
+            Hash a password.
+
+            Raises:
+                HTTPException: 503 if too many calls are already waiting for a worker.
+        """
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str):
+        """
+            Check a password against its hash.
+
+            Raises:
+                HTTPException: 503 if too many calls are already waiting for a worker.
+        """
+        return await self._run(_verify, password, hashed_password)
+
+    async def hash_many(self, passwords: list):
+        """
+            Hash a list of passwords, in batches spread over the workers.
+
+            Returns:
+                list: The hashes, in the order of the passwords.
+        """
+        executor = self._pool()
+        loop = asyncio.get_running_loop()
+
+        async def run(batch):
+            async with self._slots:
+                started = time.perf_counter()
+                hashes = await loop.run_in_executor(executor, _hash_many, batch)
+                metrics.observe("password_hash_batch_ms", (time.perf_counter() - started) * 1000)
+                return hashes
+
+        batches = await asyncio.gather(*(
+            run(passwords[i:i + HASH_BATCH_SIZE]) for i in range(0, len(passwords), HASH_BATCH_SIZE)
+        ))
+        return [hashed_password for batch in batches for hashed_password in batch]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+hasher = PasswordHasher(settings.hash_workers, settings.hash_max_pending)
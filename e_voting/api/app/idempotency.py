@@ -0,0 +1,120 @@
+"""
+This module stores the responses of POST /votes sent with an `Idempotency-Key` header.
+
+Clients on unreliable networks retry a ballot when they do not get the response. A retry carrying the same key, from
+the same voter and within `idempotency_window_seconds`, gets the stored response back instead of running the
+validation chain again and ending in "multiple voting is not allowed".
+
+Responses live in the idempotency_keys table, so every worker can replay them, with a bounded in-memory LRU in front
+so that retries hitting the same worker do not touch the database at all. A response is written in the transaction
+of the ballot it describes, so that a committed vote always has its response stored, and it expires
+`idempotency_window_seconds` after it was first stored, whichever worker replays it. Expired keys are purged
+periodically.
+
+Functions:
+
+    lookup: returns the stored response of a key.
+    record: stores the responses of keys in the current transaction.
+    remember: caches the responses of keys once committed.
+    purge: deletes the keys older than the window.
+    run: purges expired keys periodically until cancelled.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .cache import TTLCache, aware
+from .config import settings
+from .database import insert, session_scope
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL_SECONDS = 3600
+
+responses = TTLCache("idempotency", settings.idempotency_cache_size, settings.idempotency_window_seconds)
+
+
+def _cutoff():
+    return datetime.now(timezone.utc) - timedelta(seconds=settings.idempotency_window_seconds)
+
+
+async def lookup(db: AsyncSession, user_id: int, key: str):
+    """
+        Return the response stored under a key.
+
+        Args:
+            db (AsyncSession): The database session, only used when the key is not in memory.
+            user_id (int): The voter who sent the key.
+            key (str): The Idempotency-Key header.
+
+        Returns:
+            tuple: The status code and the decoded response body, or None if the key is unknown or expired.
+    """
+    stored = responses.get((user_id, key))
+    if stored is None:
+        K = models.IdempotencyKey
+        row = (await db.execute(select(K.status_code, K.response, K.created_at).where(
+            K.user_id == user_id, K.key == key, K.created_at > _cutoff()
+        ))).first()
+        if row is None:
+            return None
+        stored = (row.status_code, json.loads(row.response))
+        # the key expires when its window does, not a full window after this worker first saw it
+        remaining = (aware(row.created_at) - _cutoff()).total_seconds()
+        responses.set((user_id, key), stored, ttl=remaining)
+    metrics.inc("idempotent_replays")
+    return stored
+
+
+async def record(db: AsyncSession, entries: list):
+    """
+        Store the responses of keys in the session's current transaction, without committing it.
+
+        Call it before committing the writes the responses describe, so that both are committed together, and pass
+        the result to `remember` once committed. A key that is already stored keeps its first response.
+
+        Args:
+            db (AsyncSession): The database session.
+            entries (list): (user_id, key, status_code, response) tuples, the response being the body to replay.
+
+        Returns:
+            list: The entries with their responses encoded with jsonable_encoder.
+    """
+    stored = [
+        (user_id, key, status_code, jsonable_encoder(response)) for user_id, key, status_code, response in entries
+    ]
+    if stored:
+        await db.execute(insert(models.IdempotencyKey).values([
+            {"user_id": user_id, "key": key, "status_code": status_code, "response": json.dumps(body)}
+            for user_id, key, status_code, body in stored
+        ]).on_conflict_do_nothing())
+    return stored
+
+
+def remember(stored: list):
+    """Cache the responses of keys committed after a call to `record`"""
+    for user_id, key, status_code, body in stored:
+        responses.set((user_id, key), (status_code, body))
+
+
+async def purge(db: AsyncSession):
+    """Delete the keys older than the window"""
+    K = models.IdempotencyKey
+    await db.execute(delete(K).where(K.created_at <= _cutoff()))
+    await db.commit()
+
+
+async def run(interval: float = PURGE_INTERVAL_SECONDS):
+    """Purge expired keys every `interval` seconds until cancelled"""
+    while True:
+        try:
+            async with session_scope() as db:
+                await purge(db)
+        except Exception:
+            logger.exception("Failed to purge expired idempotency keys")
+        await asyncio.sleep(interval)
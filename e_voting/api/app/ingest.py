@@ -0,0 +1,144 @@
+"""
+This module implements the optional group-commit ingestion mode of the POST /votes route.
+
+With `vote_ingest_mode` set to "group_commit", ballots are put on a bounded asyncio queue instead of being written
+by the request that received them. A single writer coroutine per worker drains the queue into batches of at most
+`vote_batch_size` ballots, waiting no more than `vote_batch_wait_ms` milliseconds for a batch to fill, and writes each
+batch with one multi-row INSERT and one commit. Every request awaits a future that is resolved only once its batch is
+durable, so clients still get the recorded vote, or the usual error, in the response.
+
+Metrics:
+
+    vote_queue_depth: gauge of the ballots waiting on the queue.
+    vote_queue_rejected: counter of ballots refused because the queue was full.
+    vote_batch_size: summary of the number of ballots per batch.
+    vote_batch_flush_ms: summary of the time taken to write and commit a batch.
+    vote_batch_wait_ms: summary of the time ballots spent queued before their batch was written.
+
+Classes:
+
+    BallotWriter: the queue together with its writer coroutine.
+
+Constants:
+
+    writer: the BallotWriter instance shared by the worker process.
+"""
+import asyncio
+import logging
+import time
+from fastapi import HTTPException, status
+from . import ballot, models, schemas
+from .config import settings
+from .database import session_scope
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BallotWriter:
+    """Bounded ballot queue drained into multi-row INSERTs, one commit per batch"""
+
+    def __init__(self, batch_size: int, batch_wait_ms: int, queue_size: int):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.queue_size = queue_size
+        self._queue = None
+        self._batch = []
+        metrics.gauge("vote_queue_depth", lambda: self._queue.qsize() if self._queue else 0)
+
+    @property
+    def running(self):
+        return self._queue is not None
+
+    async def submit(self, body: schemas.VoteCreate, user: models.User, idempotency_key: str = None):
+        """
+            Queue a ballot and wait until the batch it belongs to has been committed.
+
+            Args:
+                body (schemas.VoteCreate): The ballot to cast.
+                user (models.User): The voter.
+                idempotency_key (str, optional): The Idempotency-Key the response is stored under, in the
+                    transaction of the batch.
+
+            Returns:
+                sqlalchemy.engine.Row: The recorded vote.
+
+            Raises:
+                HTTPException: 503 if the queue is full, otherwise the same errors as ballot.cast_vote.
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((body, user, idempotency_key, time.perf_counter(), future))
+        except asyncio.QueueFull:
+            metrics.inc("vote_queue_rejected")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many votes are being processed, try again shortly",
+                headers={"Retry-After": "1"}
+            )
+        return await future
+
+    async def _next_batch(self):
+        batch = self._batch
+        batch.append(await self._queue.get())
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        self._batch = []
+        return batch
+
+    @staticmethod
+    async def _write_now(ballots, keys):
+        async with session_scope() as db:
+            return await ballot.cast_votes(db, ballots, keys)
+
+    async def _write(self, batch):
+        started = time.perf_counter()
+        for _, _, _, queued_at, _ in batch:
+            metrics.observe("vote_batch_wait_ms", (started - queued_at) * 1000)
+        try:
+            results = await self._write_now(
+                [(body, user) for body, user, _, _, _ in batch], [key for _, _, key, _, _ in batch]
+            )
+        except Exception as exc:
+            logger.exception("Failed to write a batch of %s votes", len(batch))
+            results = [exc] * len(batch)
+        metrics.observe("vote_batch_size", len(batch))
+        metrics.observe("vote_batch_flush_ms", (time.perf_counter() - started) * 1000)
+
+        for (_, _, _, _, future), result in zip(batch, results):
+            if future.cancelled():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def run(self):
+        """Drain the queue into batches until cancelled"""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        try:
+            while True:
+                batch = await self._next_batch()
+                # a batch that started writing is finished even if the writer is cancelled meanwhile
+                await asyncio.shield(self._write(batch))
+        finally:
+            # fail whatever was accepted but will never be written
+            pending, self._batch = self._batch, []
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            self._queue = None
+            for _, _, _, _, future in pending:
+                if not future.done():
+                    future.set_exception(HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is shutting down"
+                    ))
+
+
+writer = BallotWriter(settings.vote_batch_size, settings.vote_batch_wait_ms, settings.vote_queue_size)
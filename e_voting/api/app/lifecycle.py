@@ -0,0 +1,184 @@
+"""
+This module opens and closes elections on their start and end dates, and freezes their results when they close.
+
+A background task wakes up every `lifecycle_interval_seconds`. Elections whose start date has passed are opened:
+their cached metadata is dropped so every reader picks up the election as running. Elections whose end date passed
+more than `election_close_grace_seconds` ago, long enough for every worker to flush its tallies and queued ballots,
+are closed: their statistics and participants are written once to the election_results table as compact JSON
+documents, the election is added to cache.closed so that the vote path rejects its ballots from memory, and the
+clients following its live results get the final counts before their streams end.
+
+Every worker runs the scheduler. The snapshot is inserted with ON CONFLICT DO NOTHING, so whichever worker gets
+there first writes it and the others load that one. A worker learns of the elections the others closed from the
+snapshots written since its previous tick, found through the index on their closing time; only its first tick reads
+them all. Snapshots never change afterwards, which makes them cheap to cache: post-close reads of the statistics,
+participants and live results are served from them instead of the live tables.
+
+Classes:
+
+    ElectionScheduler: the task opening and closing elections, and the cache of frozen results.
+
+Constants:
+
+    scheduler: the ElectionScheduler instance shared by the worker process.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from . import models, cache, results
+from .cache import TTLCache
+from .config import settings
+from .database import insert, session_scope
+from .live import broadcaster
+from .tally import tally
+
+logger = logging.getLogger(__name__)
+
+# snapshots never change, the TTL only bounds how long a deleted election is still served
+SNAPSHOT_TTL = 3600
+# a close commits some time after the database took its closed_at, ticks look back this far to not miss it
+CLOSE_COMMIT_MARGIN = timedelta(seconds=60)
+
+
+class ElectionScheduler:
+    """Opens and closes elections on their start and end dates, and serves the frozen results of closed ones"""
+
+    def __init__(self):
+        self.opened = set()
+        # closed_at of the latest snapshot seen, None until the first tick has read them all
+        self.closed_through = None
+        self.snapshots = TTLCache("snapshot", settings.metadata_cache_size, SNAPSHOT_TTL)
+
+    async def snapshot(self, db: AsyncSession, election_id: int):
+        """
+            Return the frozen results of a closed election.
+
+            Args:
+                db (AsyncSession): The database session used on a miss.
+                election_id (int): The election.
+
+            Returns:
+                dict: The statistics and participants documents, the total votes and the closing time of the
+                    election, or None if it is not closed.
+        """
+        if not cache.is_closed(election_id):
+            return None
+
+        async def load():
+            R = models.ElectionResult
+            row = await db.scalar(select(R).where(R.election_id == election_id))
+            if row is None:
+                return None
+            return {
+                "closed_at": cache.aware(row.closed_at),
+                "total_votes": row.total_votes,
+                "statistics": json.loads(row.statistics),
+                "participants": json.loads(row.participants),
+            }
+
+        return await self.snapshots.get_or_load(election_id, load)
+
+    def forget(self, election_id: int):
+        """Drop a deleted election"""
+        cache.closed.discard(election_id)
+        self.opened.discard(election_id)
+        self.snapshots.invalidate(election_id)
+
+    async def close(self, db: AsyncSession, election_id: int):
+        """
+            Freeze the results of an election, unless another worker already did, and commit.
+
+            Args:
+                db (AsyncSession): The database session.
+                election_id (int): The election.
+        """
+        # persist what this worker counted so far, the other workers flushed during the grace period
+        await tally.flush(db)
+        E, C = models.Election, models.Candidates
+        election = await db.scalar(select(E).options(
+            selectinload(E.candidates).joinedload(C.party)
+        ).where(E.id == election_id))
+        if election is None:
+            return
+        statistics = await results.election_statistics(db, election)
+        participants = list(cache.ElectionInfo(election).participants)
+        await db.execute(insert(models.ElectionResult).values(
+            election_id=election_id,
+            total_votes=statistics["total_votes"],
+            statistics=json.dumps(jsonable_encoder(statistics), separators=(",", ":")),
+            participants=json.dumps(participants, separators=(",", ":")),
+        ).on_conflict_do_nothing(index_elements=["election_id"]))
+        await db.commit()
+        cache.closed.add(election_id)
+        self.opened.discard(election_id)
+        cache.invalidate_election(election_id)
+        logger.info("Election %s closed", election_id)
+        await self._finish_followers(db, [election_id])
+
+    async def _finish_followers(self, db: AsyncSession, election_ids):
+        """Send the frozen results of the closed elections among `election_ids` to their live results followers"""
+        for election_id in election_ids:
+            snapshot = await self.snapshot(db, election_id)
+            if snapshot is not None:
+                broadcaster.finish(election_id, snapshot)
+
+    async def tick(self, db: AsyncSession):
+        """
+            Open the elections whose start date passed and close the ones whose end date passed.
+
+            Args:
+                db (AsyncSession): The database session.
+        """
+        E, R = models.Election, models.ElectionResult
+        now = datetime.now(timezone.utc)
+
+        # elections frozen by other workers
+        frozen = select(R.election_id, R.closed_at)
+        if self.closed_through is not None:
+            frozen = frozen.where(R.closed_at > self.closed_through - CLOSE_COMMIT_MARGIN)
+        for election_id, closed_at in (await db.execute(frozen)).all():
+            cache.closed.add(election_id)
+            if self.closed_through is None or cache.aware(closed_at) > self.closed_through:
+                self.closed_through = cache.aware(closed_at)
+
+        running = (await db.execute(
+            select(E.id, E.start_date, E.end_date)
+            .outerjoin(R, R.election_id == E.id)
+            .where(R.election_id.is_(None), E.start_date <= now)
+        )).all()
+        grace = timedelta(seconds=settings.election_close_grace_seconds)
+        for election_id, start_date, end_date in running:
+            if cache.aware(end_date) + grace <= now:
+                await self.close(db, election_id)
+            elif election_id not in self.opened and cache.aware(end_date) > now:
+                self.opened.add(election_id)
+                cache.invalidate_election(election_id)
+                logger.info("Election %s opened", election_id)
+
+        # followers of elections another worker closed, or that started following after the close
+        await self._finish_followers(db, [election_id for election_id in broadcaster.watched()
+                                          if cache.is_closed(election_id)])
+
+    async def startup(self):
+        """Load the closed elections and close the ones that ended while the application was down"""
+        async with session_scope() as db:
+            await self.tick(db)
+
+    async def run(self, interval: float = None):
+        """Open and close elections every `interval` seconds until cancelled"""
+        interval = interval or settings.lifecycle_interval_seconds
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_scope() as db:
+                    await self.tick(db)
+            except Exception:
+                logger.exception("Failed to open or close elections, retrying in %s seconds", interval)
+
+
+scheduler = ElectionScheduler()
@@ -0,0 +1,170 @@
+"""
+This module streams live election results to WebSocket and Server-Sent Events clients.
+
+Every worker runs at most one producer per election, and only while somebody is watching it. The producer reads the
+candidates' live vote counts once per tick, every `live_results_interval_ms` milliseconds, and sends the counts that
+changed since the previous tick to every subscriber. Subscribers first receive a snapshot of all counts, then deltas.
+So the cost of a tick does not depend on the number of viewers.
+
+Messages are dictionaries of the form:
+
+    {"type": "snapshot", "election": 1, "counts": {"3": 120, "4": 98}}
+    {"type": "delta", "election": 1, "counts": {"4": 99}}
+
+Closed elections are not followed: the routers send them a single "final" message built from the frozen results,
+
+    {"type": "final", "election": 1, "counts": {"3": 131, "4": 102}}
+
+which is also what the subscribers of an election get when lifecycle.ElectionScheduler closes it, after which their
+feed stops and the routers end the streams.
+
+A subscriber that falls too far behind has its backlog replaced by a fresh snapshot instead of slowing the others down.
+
+Classes:
+
+    ResultsFeed: the producer and subscribers of one election.
+    ResultsBroadcaster: the registry of feeds, creating and stopping producers on demand.
+
+Functions:
+
+    final_message: builds the message carrying the frozen counts of a closed election.
+
+Constants:
+
+    broadcaster: the ResultsBroadcaster instance shared by the worker process.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from .config import settings
+from .database import session_scope
+from .tally import tally
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_BACKLOG = 16
+
+
+def final_message(election_id: int, snapshot: dict):
+    """Build the message of a closed election from its frozen results, see lifecycle.ElectionScheduler.snapshot"""
+    counts = {str(candidate["candidate_id"]): candidate["votes"] for candidate in snapshot["statistics"]["candidates"]}
+    return {"type": "final", "election": election_id, "counts": counts}
+
+
+class ResultsFeed:
+    """Coalesced vote count updates of one election, fanned out to every subscriber"""
+
+    def __init__(self, election_id: int, interval: float):
+        self.election_id = election_id
+        self.interval = interval
+        self.counts = {}
+        self.subscribers = set()
+        self.ready = asyncio.Event()
+        self.task = None
+
+    def _message(self, kind: str, counts: dict):
+        return {"type": kind, "election": self.election_id, "counts": {str(k): v for k, v in counts.items()}}
+
+    def _publish(self, queue: asyncio.Queue, message: dict):
+        if queue.full():
+            # the subscriber is too slow, drop its backlog and let it resync from a snapshot
+            while not queue.empty():
+                queue.get_nowait()
+            message = self._message("snapshot", self.counts)
+        queue.put_nowait(message)
+
+    def add(self, queue: asyncio.Queue):
+        self.subscribers.add(queue)
+        if self.ready.is_set():
+            queue.put_nowait(self._message("snapshot", self.counts))
+
+    async def _tick(self):
+        async with session_scope() as db:
+            counts = await tally.totals(db, self.election_id)
+        if not self.ready.is_set():
+            self.counts = counts
+            self.ready.set()
+            for queue in self.subscribers:
+                self._publish(queue, self._message("snapshot", counts))
+            return
+        delta = {candidate_id: votes for candidate_id, votes in counts.items() if self.counts.get(candidate_id) != votes}
+        if delta:
+            self.counts = counts
+            message = self._message("delta", delta)
+            for queue in self.subscribers:
+                self._publish(queue, message)
+
+    def finish(self, message: dict):
+        """Stop reading the counts and send the final message to every subscriber, ahead of any backlog"""
+        self.task.cancel()
+        for queue in self.subscribers:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def run(self):
+        """Read the counts once per tick until cancelled"""
+        while True:
+            try:
+                await self._tick()
+            except Exception:
+                logger.exception("Failed to read live results of election %s", self.election_id)
+            await asyncio.sleep(self.interval)
+
+
+class ResultsBroadcaster:
+    """Registry of live result feeds, one per watched election"""
+
+    def __init__(self, interval_ms: int):
+        self.interval = interval_ms / 1000
+        self.feeds = {}
+
+    @asynccontextmanager
+    async def subscribe(self, election_id: int):
+        """
+            Subscribe to the live results of an election.
+
+            Yields:
+                asyncio.Queue: The queue receiving the snapshot followed by the deltas, and a final message once
+                    the election is closed, after which nothing else is sent.
+        """
+        feed = self.feeds.get(election_id)
+        if feed is None:
+            feed = self.feeds[election_id] = ResultsFeed(election_id, self.interval)
+            feed.task = asyncio.create_task(feed.run())
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        feed.add(queue)
+        try:
+            yield queue
+        finally:
+            feed.subscribers.discard(queue)
+            if not feed.subscribers:
+                # nobody is watching anymore, stop reading the counts
+                feed.task.cancel()
+                if self.feeds.get(election_id) is feed:
+                    del self.feeds[election_id]
+
+    def watched(self):
+        """Return the IDs of the elections somebody is following"""
+        return list(self.feeds)
+
+    def finish(self, election_id: int, snapshot: dict):
+        """
+            Send the frozen results of a closed election to its subscribers and stop following it.
+
+            Args:
+                election_id (int): The election.
+                snapshot (dict): Its frozen results, see lifecycle.ElectionScheduler.snapshot.
+        """
+        feed = self.feeds.pop(election_id, None)
+        if feed is not None:
+            feed.finish(final_message(election_id, snapshot))
+
+    async def close(self):
+        """Stop every producer"""
+        for feed in self.feeds.values():
+            feed.task.cancel()
+        self.feeds.clear()
+
+
+broadcaster = ResultsBroadcaster(settings.live_results_interval_ms)
@@ -1,6 +1,16 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import official, auth, user, candidate, vote, view, election, party
+from .tally import tally
+from .lifecycle import scheduler
+from . import idempotency, models, oauth
+from .conditional import versions
+from .ingest import writer
+from .live import broadcaster
+from .hashing import hasher
+from .metrics import metrics
+from .config import settings
 
 # from . import models
 # from .database import engine
@@ -27,7 +37,37 @@ app.include_router(candidate.candidate_router)
 app.include_router(vote.votes_router)
 app.include_router(election.router)
 
+background_tasks = []
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    await scheduler.startup()
+    await versions.startup()
+    background_tasks.append(asyncio.create_task(tally.run()))
+    background_tasks.append(asyncio.create_task(idempotency.run()))
+    background_tasks.append(asyncio.create_task(scheduler.run()))
+    background_tasks.append(asyncio.create_task(versions.run()))
+    if settings.vote_ingest_mode == "group_commit":
+        background_tasks.append(asyncio.create_task(writer.run()))
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await broadcaster.close()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    hasher.shutdown()
+
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to our e_voting system"}
+
+
+@app.get("/metrics")
+async def get_metrics(admin: models.User = Depends(oauth.get_admin_user)):
+    # queue depths, batch sizes and cache hit rates are operational details, only admins get to see them
+    return metrics.snapshot()
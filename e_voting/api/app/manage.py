@@ -0,0 +1,61 @@
+"""
+This module holds the maintenance commands that must run once per deployment rather than in every worker process.
+
+    python -m e_voting.api.app.manage reconcile
+    python -m e_voting.api.app.manage rebuild-eligibility
+
+Run them from the release step of a deployment, before the workers start taking votes, or while voting is paused:
+they overwrite derived tables that live workers keep adding their unflushed increments to, so running them next to
+live workers counts those increments twice. The Deployment section of the README lists the release steps.
+
+Commands:
+
+    reconcile: rebuilds candidates.total_votes and election_stats from the votes table, e.g. after a crash lost
+        the increments a worker had not flushed.
+    rebuild-eligibility: recomputes election_eligibility for every election that has not ended, after the table is
+        created by its migration or if the counts drifted from the users table.
+
+Functions:
+
+    main: parses the command line and runs a command.
+"""
+import argparse
+import asyncio
+from . import eligibility
+from .database import session_scope
+from .tally import tally
+
+
+async def reconcile():
+    async with session_scope() as db:
+        await tally.reconcile(db)
+    print("Vote totals reconciled with the votes table")
+
+
+async def rebuild_eligibility():
+    async with session_scope() as db:
+        await eligibility.rebuild(db)
+    print("Eligible voters rebuilt for every running election")
+
+
+COMMANDS = {
+    "reconcile": reconcile,
+    "rebuild-eligibility": rebuild_eligibility,
+}
+
+
+def main(argv: list = None):
+    """
+        Run the command named on the command line.
+
+        Args:
+            argv (list, optional): The arguments, defaults to sys.argv[1:].
+    """
+    parser = argparse.ArgumentParser(prog="python -m e_voting.api.app.manage", description="Maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+    asyncio.run(COMMANDS[args.command]())
+
+
+if __name__ == "__main__":
+    main()
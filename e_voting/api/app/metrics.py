@@ -0,0 +1,69 @@
+"""
+This module provides a small in-process metrics registry exposed to admins through the GET /metrics route.
+
+Metrics are kept per worker process. Three kinds are supported:
+
+    counters: monotonically increasing values, e.g. the number of flushed batches.
+    gauges: values sampled when the metrics are read, e.g. the current depth of a queue.
+    summaries: count, sum, min and max of observed values, e.g. batch sizes or latencies.
+
+Constants:
+
+    metrics: the Metrics instance shared by the worker process.
+"""
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and summaries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._summaries = {}
+
+    def inc(self, name: str, value: int = 1):
+        """Increase the counter `name` by `value`"""
+        with self._lock:
+            self._counters[name] += value
+
+    def gauge(self, name: str, read):
+        """Register a callable returning the current value of the gauge `name`"""
+        with self._lock:
+            self._gauges[name] = read
+
+    def observe(self, name: str, value: float):
+        """Record one observation of the summary `name`"""
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = {"count": 1, "sum": value, "min": value, "max": value}
+                return
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["min"] = min(summary["min"], value)
+            summary["max"] = max(summary["max"], value)
+
+    def snapshot(self):
+        """
+            Return the current value of every metric.
+
+            Returns:
+                dict: counters, gauges and summaries keyed by metric name.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            summaries = {name: dict(summary) for name, summary in self._summaries.items()}
+        for summary in summaries.values():
+            summary["avg"] = summary["sum"] / summary["count"]
+        return {
+            "counters": counters,
+            "gauges": {name: read() for name, read in gauges.items()},
+            "summaries": summaries,
+        }
+
+
+metrics = Metrics()
@@ -1,29 +1,58 @@
 from .database import Base
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, TIMESTAMP, text, CHAR
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, TIMESTAMP, Text, text, false, func, CHAR
 from sqlalchemy.orm import relationship
 
 
+def normalise_region(name: str):
+    """
+        Return a state or LGA name in the form regions are compared and aggregated in: trimmed and lowercased.
+
+        Eligibility, the vote path, the tallies and the eligible voter counts all go through this function, or
+        through normalise_region_sql on the database side, so they always agree on who lives where.
+    """
+    return (name or "").strip().lower()
+
+
+def normalise_region_sql(name):
+    """Return the SQL equivalent of normalise_region for a column or expression"""
+    return func.lower(func.trim(func.coalesce(name, "")))
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, nullable=False)
     nin = Column(String, nullable=False, unique=True)
-    vin = Column(String, nullable=True)
+    vin = Column(String, nullable=True, unique=True, index=True)
     name = Column(String, nullable=False)
     address = Column(String, nullable=False)
     ward = Column(Integer, nullable=False)
     state = Column(String, nullable=False)
     lga = Column(String, nullable=False)
-    email = Column(String, nullable=False)
+    # looked up by the login route
+    email = Column(String, nullable=False, index=True)
     password = Column(String, nullable=False)
     mobile_no = Column(CHAR(11), nullable=False)
     dob = Column(String, nullable=False)
     gender = Column(String, nullable=False)
     reg_date = Column(TIMESTAMP(timezone=True),
-                      nullable=False, server_default=text("NOW()"))
+                      nullable=False, server_default=func.now())
     role = Column(String, nullable=False, server_default="user")
-    accredited = Column(Boolean, nullable=False, server_default="False")
-    voted = Column(Boolean, nullable=False, server_default="False")
-    admin_id = Column(String)
+    accredited = Column(Boolean, nullable=False, server_default=false())
+    voted = Column(Boolean, nullable=False, server_default=false())
+    # looked up by the official login route
+    admin_id = Column(String, index=True)
+
+    __table_args__ = (
+        # eligible voter counts and the voter list filters compare the lowercased region
+        Index("ix_users_lower_state", func.lower(state)),
+        Index("ix_users_lower_lga", func.lower(lga)),
+        # voter lookups at accreditation desks: by phone number, and by name prefix within an LGA
+        Index("ix_users_mobile_no", mobile_no, postgresql_using="hash"),
+        Index(
+            "ix_users_lga_name_prefix", func.lower(lga).label("lga_lower"), func.lower(name).label("name_lower"),
+            postgresql_ops={"lga_lower": "text_pattern_ops", "name_lower": "text_pattern_ops"}
+        ),
+    )
 
 
 class Candidates(Base):
@@ -31,22 +60,23 @@ class Candidates(Base):
     id = Column(Integer, primary_key=True, nullable=False)
     name = Column(String, nullable=False)
     party_name = Column(String, ForeignKey(
-        "party.name", ondelete="CASCADE"), nullable=False)
+        "party.name", ondelete="CASCADE"), nullable=False, index=True)
     position = Column(String, nullable=False)
     state = Column(String, nullable=False)
     ideology = Column(String, nullable=False)
     reg_date = Column(TIMESTAMP(timezone=True),
-                      nullable=False, server_default=text("NOW()"))
+                      nullable=False, server_default=func.now())
     total_votes = Column(Integer, nullable=False, server_default=text("0"))
     election_id = Column(Integer, ForeignKey(
         "election.id", ondelete="CASCADE"
-    ), nullable=False)
+    ), nullable=False, index=True)
     created_by = Column(Integer)
 
     party = relationship("Party")
 
-    # Total Votes earned by this candidate
-    votes = relationship("Vote")
+    # Votes earned by this candidate, never loaded as a whole: query them with `candidate.votes.select()`
+    # and count them with tally.total_for
+    votes = relationship("Vote", lazy="write_only")
 
 
 class Party(Base):
@@ -57,7 +87,7 @@ class Party(Base):
     ideology = Column(String, nullable=False)
     fullname = Column(String)
     party_chairman = Column(String, nullable=False)
-    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text("NOW()"))
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
 
 
 class Vote(Base):
@@ -67,9 +97,9 @@ class Vote(Base):
     electionId = Column(Integer, ForeignKey(
         "election.id", ondelete="CASCADE"), primary_key=True, nullable=False)
     candidateId = Column(Integer, ForeignKey(
-        "candidates.id", ondelete="CASCADE"), nullable=False)
+        "candidates.id", ondelete="CASCADE"), nullable=False, index=True)
     voted_at = Column(TIMESTAMP(timezone=True),
-                      nullable=False, server_default=text("Now()"))
+                      nullable=False, server_default=func.now())
 
 
 class Election(Base):
@@ -81,16 +111,22 @@ class Election(Base):
     # if specified only users from the lga can participate
     lga = Column(String(255))
     start_date = Column(TIMESTAMP(timezone=True), nullable=False)
-    end_date = Column(TIMESTAMP(timezone=True), nullable=False)
+    end_date = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
     created_at = Column(TIMESTAMP(timezone=True),
-                        nullable=False, server_default=text("Now()"))
+                        nullable=False, server_default=func.now())
     created_by = Column(Integer)
 
+    __table_args__ = (
+        # active elections of a state or an LGA
+        Index("ix_election_state_end_date", "state", "end_date"),
+        Index("ix_election_lga_end_date", "lga", "end_date"),
+    )
+
     # List of candidates in this election
     candidates = relationship("Candidates")
 
-    # total votes casted in this election
-    votes = relationship("Vote")
+    # Votes cast in this election, never loaded as a whole: query them with `election.votes.select()`
+    votes = relationship("Vote", lazy="write_only")
 
     def user_eligible(self, user: User):
         """Check if a user is eligible to cast a vote for this election
@@ -103,9 +139,78 @@ class Election(Base):
         """
         if not user.accredited:
             return False
-        if not self.lga and not self.state:
+        state, lga = normalise_region(self.state), normalise_region(self.lga)
+        if not lga and not state:
             return True
-        if self.state and not self.lga:
-            return self.state.lower() == user.state.lower()
-        if self.lga:
-            return self.lga.lower() == user.lga.lower()
+        if state and not lga:
+            return state == normalise_region(user.state)
+        return lga == normalise_region(user.lga)
+
+
+class ElectionStats(Base):
+    __tablename__ = "election_stats"
+    # Votes of a candidate within one LGA, maintained incrementally by tally.TallyCounter.flush
+    election_id = Column(Integer, ForeignKey(
+        "election.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    candidate_id = Column(Integer, ForeignKey(
+        "candidates.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    state = Column(String, primary_key=True, nullable=False)
+    lga = Column(String, primary_key=True, nullable=False)
+    votes = Column(Integer, nullable=False, server_default=text("0"))
+
+
+class ElectionEligibility(Base):
+    __tablename__ = "election_eligibility"
+    # Accredited voters eligible for an election within one ward, maintained by the eligibility module
+    election_id = Column(Integer, ForeignKey(
+        "election.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    state = Column(String, primary_key=True, nullable=False)
+    lga = Column(String, primary_key=True, nullable=False)
+    ward = Column(Integer, primary_key=True, nullable=False)
+    voters = Column(Integer, nullable=False, server_default=text("0"))
+
+
+class ElectionResult(Base):
+    __tablename__ = "election_results"
+    # Results of an election frozen when it closed, written once by lifecycle.ElectionScheduler
+    election_id = Column(Integer, ForeignKey(
+        "election.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    closed_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now(), index=True)
+    total_votes = Column(Integer, nullable=False)
+    # the JSON documents served by GET /elections/{electionId}/statistics and /participants
+    statistics = Column(Text, nullable=False)
+    participants = Column(Text, nullable=False)
+
+
+class EntityVersion(Base):
+    __tablename__ = "entity_versions"
+    # Version of an entity type bumped on every write, the source of the ETags built by the conditional module
+    entity = Column(String, primary_key=True, nullable=False)
+    version = Column(Integer, nullable=False, server_default=text("0"))
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    # Response stored for an Idempotency-Key sent by a voter, replayed when the request is retried
+    user_id = Column(Integer, ForeignKey(
+        "users.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    key = Column(String(255), primary_key=True, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    # JSON encoded response body
+    response = Column(Text, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=func.now())
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    id = Column(Integer, primary_key=True, nullable=False)
+    user_id = Column(Integer, ForeignKey(
+        "users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # SHA-256 of the token, the token itself is only ever known to the client
+    token_hash = Column(CHAR(64), nullable=False, unique=True)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    # set when the token is rotated or revoked
+    revoked_at = Column(TIMESTAMP(timezone=True))
+    created_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=func.now())
@@ -4,9 +4,19 @@ This module provides utility functions for authentication and authorization of u
 Functions:
 
     create_access_token: creates an access token using a dictionary of data provided.
+    token_hash: returns the hash under which a refresh token is stored.
+    create_refresh_token: issues a refresh token for a user and stores its hash.
+    rotate_refresh_token: exchanges a refresh token for a new access and refresh token.
+    revoke_refresh_tokens: revokes a refresh token, or every refresh token of its user.
     verify_tok: verifies a given token and returns the token data if it is valid.
     get_current_user: gets the current user based on the provided token and database.
     get_admin_user: gets the current user and raises an HTTPException if they are not an admin.
+    invalidate_principal: drops a user from the principal cache.
+    invalidate_principals: drops a list of users from the principal cache.
+
+Classes:
+
+    Principal: the cached snapshot of the user fields needed for authorization and voting eligibility.
 
 Dependencies:
 
@@ -16,6 +26,7 @@ Dependencies:
     timedelta: class for representing time differences.
     schemas: module containing Pydantic models for the API's data structures.
     database: module providing database functionality for the API.
+    select: function from SQLAlchemy for building SELECT statements.
     models: module containing SQLAlchemy models for the API's database tables.
     Depends: class from FastAPI for injecting dependencies into endpoints.
     status: module containing HTTP status codes.
@@ -28,17 +39,23 @@ Constants:
     SECRET_KEY: the secret key used for encoding and decoding JSON Web Tokens.
     ALGORITHM: the encryption algorithm used for encoding and decoding JSON Web Tokens.
     ACCESS_TOKEN_EXPIRE_MINUTES: the number of minutes until an access token expires.
+    REFRESH_TOKEN_EXPIRE_DAYS: the number of days until a refresh token expires.
+    principals: the TTLCache of Principal snapshots, keyed by user ID.
 
 Configurations:
 
     settings: an instance of the Settings class containing environment variables used in the module.
 """
+import hashlib
+import secrets
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from . import schemas, database, models
 from fastapi import Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from .cache import TTLCache
 from .config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -46,6 +63,33 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_tok_expire_minutes
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_tok_expire_days
+
+
+class Principal:
+    """Immutable snapshot of the user fields needed for authorization and voting eligibility"""
+
+    __slots__ = ("id", "role", "accredited", "state", "lga")
+
+    def __init__(self, user):
+        for name in self.__slots__:
+            object.__setattr__(self, name, getattr(user, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Principal is immutable")
+
+
+principals = TTLCache("principal", settings.principal_cache_size, settings.principal_cache_ttl_seconds)
+
+
+def invalidate_principal(user_id: int):
+    """Drop a user from the principal cache, after a change of role, accreditation, state or LGA, or a delete"""
+    principals.invalidate(int(user_id))
+
+
+def invalidate_principals(user_ids):
+    """Drop a list of users from the principal cache at once"""
+    principals.invalidate_many(int(user_id) for user_id in user_ids)
 
 
 def create_access_token(data: dict):
@@ -66,6 +110,89 @@ def create_access_token(data: dict):
     return encoded
 
 
+def token_hash(token: str):
+    """Return the hash under which a refresh token is stored"""
+    # refresh tokens are long random strings, a fast hash is enough to keep them out of the database
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_refresh_token(db: AsyncSession, user_id: int):
+    """
+        Issue a refresh token for a user. Only its hash is stored, the caller commits the session.
+
+        Args:
+            db (AsyncSession): The database session.
+            user_id (int): The user the token is issued to.
+
+        Returns:
+            str: The refresh token.
+    """
+    token = secrets.token_urlsafe(32)
+    db.add(models.RefreshToken(
+        user_id=user_id,
+        token_hash=token_hash(token),
+        expires_at=datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+
+async def rotate_refresh_token(db: AsyncSession, token: str):
+    """
+        Exchange a refresh token for a new access token and a new refresh token.
+
+        The presented token is revoked by the same statement that looks it up, so it can only be used once. If a
+        token that was already rotated is presented again, it has leaked: every refresh token of its user is revoked.
+
+        Args:
+            db (AsyncSession): The database session.
+            token (str): The refresh token.
+
+        Returns:
+            tuple: The new access token and the new refresh token.
+
+        Raises:
+            HTTPException: 401 if the token is unknown, expired or revoked.
+    """
+    R = models.RefreshToken
+    hashed_token = token_hash(token)
+    user_id = await db.scalar(
+        update(R).where(
+            R.token_hash == hashed_token, R.revoked_at.is_(None), R.expires_at > func.now()
+        ).values(revoked_at=func.now()).returning(R.user_id)
+    )
+    if user_id is None:
+        reused = await db.scalar(select(R.user_id).where(R.token_hash == hashed_token, R.revoked_at.is_not(None)))
+        if reused is not None:
+            await revoke_refresh_tokens(db, user_id=reused)
+        await db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    refresh_token = create_refresh_token(db, user_id)
+    await db.commit()
+    return create_access_token(data={"user_id": user_id}), refresh_token
+
+
+async def revoke_refresh_tokens(db: AsyncSession, token: str = None, user_id: int = None):
+    """
+        Revoke a refresh token, or every refresh token of a user. The caller commits the session.
+
+        Args:
+            db (AsyncSession): The database session.
+            token (str, optional): The refresh token to revoke.
+            user_id (int, optional): The user whose refresh tokens are all revoked.
+    """
+    R = models.RefreshToken
+    stmt = update(R).where(R.revoked_at.is_(None)).values(revoked_at=func.now())
+    if token is not None:
+        stmt = stmt.where(R.token_hash == token_hash(token))
+    if user_id is not None:
+        stmt = stmt.where(R.user_id == user_id)
+    await db.execute(stmt)
+
+
 def verify_tok(token: str, credentials_exception):
     """
         Verify the given token and return its data.
@@ -93,18 +220,21 @@ def verify_tok(token: str, credentials_exception):
     return tok_data
 
 
-def get_current_user(token: str = Depends(oauth2_scheme),
-                     db: Session = Depends(database.get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme),
+                           db: AsyncSession = Depends(database.get_async_db)):
     """
        Get the current user based on the provided token and database session.
 
+       The user is resolved from the principal cache, so most requests do not query the users table at all.
+       Routes needing other columns of the user load the row themselves.
+
        Args:
            token (str, optional): The access token to use for authentication. Defaults to Depends(oauth2_scheme).
-           db (sqlalchemy.orm.Session, optional): The database session to use for queries.
-                    Defaults to Depends(database.get_db).
+           db (sqlalchemy.ext.asyncio.AsyncSession, optional): The database session to use for queries.
+                    Defaults to Depends(database.get_async_db).
 
        Returns:
-           models.User: The current user.
+           Principal: The current user, or None if the user no longer exists.
 
        Raises:
            fastapi.HTTPException: If the token is not valid or the user does not exist.
@@ -117,24 +247,32 @@ def get_current_user(token: str = Depends(oauth2_scheme),
     )
 
     token = verify_tok(token, credentials_exception)
-    user = db.query(models.User).filter(models.User.id == token.id).first()
-    return user
+    user_id = int(token.id)
+
+    async def load():
+        U = models.User
+        user = (await db.execute(
+            select(U.id, U.role, U.accredited, U.state, U.lga).where(U.id == user_id)
+        )).first()
+        return Principal(user) if user else None
+
+    return await principals.get_or_load(user_id, load)
 
 
-def get_admin_user(user: models.User = Depends(get_current_user)):
+async def get_admin_user(user: Principal = Depends(get_current_user)):
     """
         Get the current user as an admin user.
 
         Args:
-            user (models.User): The current user.
+            user (Principal): The current user.
 
         Raises:
             HTTPException: If the current user is not an admin user.
 
         Returns:
-            models.User: The current user as an admin user.
+            Principal: The current user as an admin user.
     """
-    if user.role != 'admin':
+    if user is None or user.role != 'admin':
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="You are not authorized to execute this action"
@@ -0,0 +1,155 @@
+"""
+This module implements keyset pagination and streaming for the list endpoints.
+
+List endpoints take three query parameters, gathered by the Page dependency:
+
+    limit: the maximum number of items to return, `page_default_limit` by default and at most `page_max_limit`.
+    after: the cursor of the previous page, as returned in its X-Next-Cursor header.
+    stream: when true, every item after the cursor is streamed as one JSON array instead, for exports.
+
+Pages are read with `WHERE (keys) > (cursor) ORDER BY keys LIMIT n`, which costs the same however deep the page is,
+unlike OFFSET. Cursors are opaque to clients: the sort keys of the last item of the page, JSON and base64 encoded.
+Streams read the rows in partitions of `page_stream_batch_size` rows and encode them as they are written, so the
+memory used by a request does not depend on the number of rows either way.
+
+Both pages and streams select the columns of the response schema rather than ORM objects and are encoded with
+orjson by the serialization module, bypassing Pydantic. The endpoints keep their response_model for the OpenAPI
+document only.
+
+Classes:
+
+    Page: the query parameters of a list endpoint.
+
+Functions:
+
+    encode_cursor: encodes the sort keys of an item into a cursor.
+    decode_cursor: decodes a cursor into the sort keys it holds.
+    paginate: runs a list query as a page or as a stream.
+    fetch_page: reads one page of a list query as dictionaries, for responses that embed the page in a document.
+"""
+import base64
+import binascii
+import json
+from typing import Optional
+from fastapi import HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select, tuple_
+from .config import settings
+from .database import stream_partitions
+from .serialization import Projection, project
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page:
+    """Query parameters of a list endpoint"""
+
+    def __init__(
+            self,
+            limit: int = Query(settings.page_default_limit, ge=1, le=settings.page_max_limit),
+            after: Optional[str] = None,
+            stream: bool = False
+    ):
+        self.limit = limit
+        self.after = after
+        self.stream = stream
+
+
+def encode_cursor(values: list):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int):
+    """
+        Decode a cursor into the `size` sort keys it holds.
+
+        Raises:
+            HTTPException: 400 if the cursor is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+async def _encode_stream(db, projection: Projection):
+    yield b"["
+    first = True
+    async for partition in stream_partitions(db, projection.stmt, settings.page_stream_batch_size):
+        if not first:
+            yield b","
+        first = False
+        yield projection.dumps_items(partition)
+    yield b"]"
+
+
+def _after(stmt: Select, keys: list, page: Page):
+    if not page.after:
+        return stmt
+    values = decode_cursor(page.after, len(keys))
+    if len(keys) == 1:
+        return stmt.where(keys[0] > values[0])
+    return stmt.where(tuple_(*keys) > tuple_(*values))
+
+
+async def paginate(db, stmt: Select, keys: list, page: Page, response: Response, schema: BaseModel):
+    """
+        Run a list query as a page, or as a stream if the page asks for one.
+
+        Args:
+            db (AsyncSession): The database session.
+            stmt (Select): The filtered query, without ordering.
+            keys (list): The columns the items are sorted by, which must identify an item uniquely.
+            page (Page): The query parameters of the request.
+            response (Response): The response, whose headers are copied to the returned one, with the X-Next-Cursor
+                header when there are more items.
+            schema (BaseModel): The schema of the items, whose fields are the columns selected and encoded.
+
+        Returns:
+            Response | StreamingResponse: The JSON encoded items of the page, or the stream of every item after the
+                cursor.
+    """
+    projection = project(_after(stmt, keys, page).order_by(*keys), schema, keys)
+    # the response returned replaces the one the dependencies set headers on, such as the ETag
+    headers = dict(response.headers)
+
+    if page.stream:
+        return StreamingResponse(_encode_stream(db, projection), media_type="application/json", headers=headers)
+
+    rows = (await db.execute(projection.stmt.limit(page.limit + 1))).all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(projection.extras(rows[-1]))
+    return Response(projection.dumps(rows), media_type="application/json", headers=headers)
+
+
+async def fetch_page(db, stmt: Select, keys: list, page: Page, response: Response, schema: BaseModel):
+    """
+        Read one page of a list query, for endpoints returning the page inside a larger document.
+
+        Args:
+            db (AsyncSession): The database session.
+            stmt (Select): The filtered query, without ordering.
+            keys (list): The columns the items are sorted by, which must identify an item uniquely.
+            page (Page): The query parameters of the request, which must not ask for a stream.
+            response (Response): The response, which gets the X-Next-Cursor header when there are more items.
+            schema (BaseModel): The schema of the items, whose fields are the columns selected.
+
+        Returns:
+            list: The items of the page as dictionaries.
+
+        Raises:
+            HTTPException: 400 if the cursor is invalid or a stream is asked for.
+    """
+    if page.stream:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="This endpoint can not be streamed")
+    projection = project(_after(stmt, keys, page).order_by(*keys), schema, keys)
+    rows = (await db.execute(projection.stmt.limit(page.limit + 1))).all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(projection.extras(rows[-1]))
+    return [dict(zip(projection.names, row)) for row in rows]
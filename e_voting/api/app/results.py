@@ -0,0 +1,94 @@
+"""
+This module builds the results of an election served by GET /elections/{electionId}/statistics.
+
+Vote counts come from the election_stats aggregate table, which tally.TallyCounter keeps up to date as votes are
+cast, plus the increments the current worker has not flushed yet. Eligible voters come from the election_eligibility
+table maintained by the eligibility module. Neither the votes nor the users table is scanned.
+
+Functions:
+
+    election_statistics: returns per-candidate counts and percentages, turnout and per-state and per-LGA breakdowns.
+"""
+from collections import Counter, defaultdict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .eligibility import eligible_counts
+from .tally import tally
+
+
+def percentage(part: int, whole: int):
+    return round(part * 100 / whole, 2) if whole else 0.0
+
+
+def _breakdown(counts: dict):
+    return [{"candidate_id": candidate_id, "votes": votes} for candidate_id, votes in counts.most_common()]
+
+
+async def election_statistics(db: AsyncSession, election: models.Election):
+    """
+        Build the statistics of an election from the election_stats aggregate table.
+
+        Args:
+            db (AsyncSession): The database session.
+            election (models.Election): The election.
+
+        Returns:
+            dict: The total votes, eligible voters and turnout of the election, the votes and percentage of every
+                candidate, and the votes of every candidate, eligible voters and turnout per state and per LGA.
+    """
+    C = models.Candidates
+    candidates = (await db.execute(
+        select(C.id, C.name, C.party_name).where(C.election_id == election.id)
+    )).all()
+    regional = await tally.regional_totals(db, election.id)
+
+    by_candidate = Counter()
+    by_state = defaultdict(Counter)
+    by_lga = defaultdict(Counter)
+    for (candidate_id, state, lga), votes in regional.items():
+        by_candidate[candidate_id] += votes
+        by_state[state][candidate_id] += votes
+        by_lga[(state, lga)][candidate_id] += votes
+
+    total_votes = sum(by_candidate.values())
+    eligible_by_lga = await eligible_counts(db, election.id)
+    eligible_by_state = Counter()
+    for (state, lga), voters in eligible_by_lga.items():
+        eligible_by_state[state] += voters
+    eligible = sum(eligible_by_lga.values())
+
+    return {
+        "election": election.id,
+        "total_votes": total_votes,
+        "eligible_voters": eligible,
+        "turnout": percentage(total_votes, eligible),
+        "candidates": sorted([
+            {
+                "candidate_id": candidate.id,
+                "candidate_name": candidate.name,
+                "party_name": candidate.party_name,
+                "votes": by_candidate[candidate.id],
+                "percentage": percentage(by_candidate[candidate.id], total_votes),
+            } for candidate in candidates
+        ], key=lambda c: c["votes"], reverse=True),
+        "states": [
+            {
+                "state": state,
+                "votes": sum(counts.values()),
+                "eligible_voters": eligible_by_state[state],
+                "turnout": percentage(sum(counts.values()), eligible_by_state[state]),
+                "candidates": _breakdown(counts),
+            } for state, counts in sorted(by_state.items())
+        ],
+        "lgas": [
+            {
+                "state": state,
+                "lga": lga,
+                "votes": sum(counts.values()),
+                "eligible_voters": eligible_by_lga[(state, lga)],
+                "turnout": percentage(sum(counts.values()), eligible_by_lga[(state, lga)]),
+                "candidates": _breakdown(counts),
+            } for (state, lga), counts in sorted(by_lga.items())
+        ],
+    }
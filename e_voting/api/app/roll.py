@@ -0,0 +1,208 @@
+"""
+This module imports voter rolls uploaded in bulk by officials.
+
+An upload, CSV or NDJSON with the fields of schemas.CreateVoter, is first spooled to a temporary file so that the
+request returns right away with a job ID. A background task then processes it in chunks of `bulk_chunk_size` rows:
+
+    1. every row is validated with the CreateVoter rules, and NINs repeated within the chunk are rejected,
+    2. the passwords of the valid rows are hashed in batches across the password hashing processes,
+    3. every voter gets a VIN and a ward, as in POST /users/register,
+    4. the rows are loaded with COPY into a temporary staging table and merged into users with
+       INSERT ... SELECT ... ON CONFLICT (nin) DO NOTHING, which reports the NINs that are already registered.
+
+Each chunk is committed on its own. Progress, including the throughput in rows per second, is kept in an ImportJob
+which GET /users/bulk/{job_id} reports. Jobs live in the memory of the worker process that received the upload.
+
+Metrics:
+
+    voter_import_rows: counter of the rows processed.
+    voter_import_rows_per_sec: summary of the throughput of completed imports.
+
+Classes:
+
+    ImportJob: the progress and rejection report of one upload.
+
+Functions:
+
+    import_voters: validates, hashes and records a chunk of voters.
+    start_import: starts processing a spooled upload in the background.
+    get_job: returns a job by ID.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import bulk, models, schemas, utils
+from .database import IS_POSTGRES, copy_rows, insert, session_scope
+from .hashing import hasher
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_JOBS = 100
+
+STAGING_TABLE = "users_staging"
+COLUMNS = ("nin", "vin", "name", "address", "ward", "state", "lga", "email", "password", "mobile_no", "dob", "gender")
+
+
+class ImportJob:
+    """Progress and rejection report of one voter roll upload"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "pending"
+        self.error = None
+        self.rows = 0
+        self.inserted = 0
+        self.rejections = []
+        self.started = None
+        self.finished = None
+        self.task = None
+
+    @property
+    def rows_per_sec(self):
+        if self.started is None:
+            return 0.0
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return round(self.rows / elapsed, 1) if elapsed else 0.0
+
+    def report(self):
+        return {
+            "job": self.id,
+            "status": self.status,
+            "error": self.error,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "rejected": len(self.rejections),
+            "rows_per_sec": self.rows_per_sec,
+            "rejections": sorted(self.rejections, key=lambda rejection: rejection["row"]),
+        }
+
+
+jobs = OrderedDict()
+
+
+def get_job(job_id: str):
+    return jobs.get(job_id)
+
+
+def _reason(exc: Exception):
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors())
+    if isinstance(exc, HTTPException):
+        return exc.detail
+    return f"Malformed row: {exc}"
+
+
+async def import_voters(db: AsyncSession, records: list):
+    """
+        Validate, hash and record a chunk of voters.
+
+        Args:
+            db (AsyncSession): The database session.
+            records (list): The numbered records of the chunk, as yielded by bulk.iter_records.
+
+        Returns:
+            tuple: The number of voters registered and the rejections, a list of dicts holding the row number and
+                the reason.
+    """
+    rejections = []
+    voters = {}
+    for row_no, record in records:
+        try:
+            # the dob validator of CreateVoter raises an HTTPException
+            voter = schemas.CreateVoter(**record)
+        except (TypeError, ValidationError, HTTPException) as exc:
+            rejections.append({"row": row_no, "reason": _reason(exc)})
+            continue
+        if voter.nin in voters:
+            rejections.append({"row": row_no, "reason": f"User with nin {voter.nin} appears more than once"})
+            continue
+        voters[voter.nin] = (row_no, voter)
+
+    if not voters:
+        return 0, rejections
+
+    passwords = await hasher.hash_many([voter.password for _, voter in voters.values()])
+    rows = [
+        (voter.nin, utils.new_vin(), voter.name, voter.address, utils.new_ward(), voter.state, voter.lga,
+         voter.email, password, voter.mobile_no, voter.dob.isoformat(), voter.gender)
+        for (_, voter), password in zip(voters.values(), passwords)
+    ]
+    if IS_POSTGRES:
+        inserted = await _merge_staged(db, rows)
+    else:
+        U = models.User
+        inserted = set((await db.scalars(insert(U).values([
+            dict(zip(COLUMNS, row)) for row in rows
+        ]).on_conflict_do_nothing(index_elements=["nin"]).returning(U.nin))).all())
+    await db.commit()
+
+    for nin, (row_no, _) in voters.items():
+        if nin not in inserted:
+            rejections.append({"row": row_no, "reason": f"User with nin {nin} already exists"})
+    return len(inserted), rejections
+
+
+async def _merge_staged(db: AsyncSession, rows: list):
+    """COPY the voters into a temporary table and merge them into users, returning the inserted NINs"""
+    await db.execute(text(
+        f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} "
+        "(nin varchar, vin varchar, name varchar, address varchar, ward integer, state varchar, lga varchar, "
+        "email varchar, password varchar, mobile_no char(11), dob varchar, gender varchar) ON COMMIT DELETE ROWS"
+    ))
+    await copy_rows(db, STAGING_TABLE, COLUMNS, rows)
+    columns = ", ".join(COLUMNS)
+    return set((await db.scalars(text(
+        f"INSERT INTO users ({columns}) SELECT {columns} FROM {STAGING_TABLE} "
+        "ON CONFLICT (nin) DO NOTHING RETURNING nin"
+    ))).all())
+
+
+async def _run(job: ImportJob, file, content_type: str):
+    job.status = "running"
+    job.started = time.perf_counter()
+    try:
+        async with session_scope() as db:
+            records = bulk.iter_records(bulk.iter_file(file), content_type)
+            async for chunk in bulk.chunks(records):
+                inserted, rejections = await import_voters(db, chunk)
+                job.rows += len(chunk)
+                job.inserted += inserted
+                job.rejections.extend(rejections)
+                metrics.inc("voter_import_rows", len(chunk))
+        job.status = "done"
+    except Exception as exc:
+        logger.exception("Voter roll import %s failed", job.id)
+        job.status = "failed"
+        job.error = str(exc)
+    finally:
+        file.close()
+        job.finished = time.perf_counter()
+        job.task = None
+        if job.status == "done":
+            metrics.observe("voter_import_rows_per_sec", job.rows_per_sec)
+
+
+def start_import(file, content_type: str):
+    """
+        Start importing a spooled upload in the background.
+
+        Args:
+            file: The upload, as returned by bulk.spool.
+            content_type (str): The Content-Type header of the upload.
+
+        Returns:
+            ImportJob: The job tracking the import.
+    """
+    job = ImportJob()
+    jobs[job.id] = job
+    while len(jobs) > MAX_JOBS:
+        jobs.popitem(last=False)
+    job.task = asyncio.create_task(_run(job, file, content_type))
+    return job
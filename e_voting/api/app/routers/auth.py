@@ -1,22 +1,34 @@
 """
-This module defines endpoints for user authentication and authorization. It provides two API routes:
-- /authentication/login: Logs a user into the system and returns an access token.
-- /authentication/official/login: Logs an admin user into the system and returns an access token.
+This module defines endpoints for user authentication and authorization. It provides four API routes:
+- /authentication/login: Logs a user into the system and returns an access token and a refresh token.
+- /authentication/official/login: Logs an admin user into the system and returns an access token and a refresh token.
+- /authentication/refresh: Exchanges a refresh token for a new access token and a new refresh token.
+- /authentication/revoke: Revokes a refresh token, or every refresh token of its user.
+
+Refresh tokens are single use: each renewal revokes the presented token and issues a new one, and only costs an
+indexed lookup instead of a bcrypt verification.
+
+Both login routes go through throttle.login_gate first, which answers 429 when the client IP, the client for this
+account, or the account from all clients together made too many attempts recently, or when too many logins are
+already in flight.
 
 Both routes use OAuth2 for authentication, and rely on SQLAlchemy to interact with the database. The endpoints
 return JSON responses with information about the user and their access token.
 
-Note that this module requires a valid database connection to function properly. The `get_db` function from the
+Note that this module requires a valid database connection to function properly. The `get_async_db` function from the
 `database` module is used to create a SQLAlchemy session, which is passed as a dependency to the API routes.
 
 For more information on how to use the endpoints, refer to the documentation for each function.
 """
 
 
-from fastapi import APIRouter, Response, HTTPException, status, Depends
-from .. import models, schemas, utils, oauth
-from ..database import get_db
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Request, Response, HTTPException, status, Depends
+from .. import models, schemas, oauth
+from ..hashing import hasher
+from ..throttle import login_gate
+from ..database import get_async_db
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
 
 
@@ -25,68 +37,137 @@ router = APIRouter(tags=["Authentications"], prefix="/authentication")
 
 @router.post("/login", response_model=schemas.UserLogin)
 async def user_login(
-        res: Response, usr_credentials: OAuth2PasswordRequestForm = Depends(),
-        db: Session = Depends(get_db)
+        req: Request, res: Response, usr_credentials: OAuth2PasswordRequestForm = Depends(),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
-       Logs a user into the system and returns an access token.
+       Logs a user into the system and returns an access token and a refresh token.
 
        Args:
+           req (Request): The incoming request, used for the client IP.
            res (Response): A FastAPI Response object.
            usr_credentials (OAuth2PasswordRequestForm): A form containing the user's email and password.
-           db (Session): A SQLAlchemy session object.
+           db (AsyncSession): A SQLAlchemy session object.
 
        Returns:
-           dict: A dictionary containing the user's name, access token, token type, and ID.
+           dict: A dictionary containing the user's name, access token, refresh token, token type, and ID.
 
        Raises:
-           HTTPException: If the user's credentials are invalid or if the user does not exist.
+           HTTPException: If the user's credentials are invalid or if the user does not exist, 429 if the client or
+               the account made too many attempts, or 503 if too many logins are waiting for a password check.
     """
-    user = db.query(models.User).filter(models.User.email == usr_credentials.username).first()
+    async with login_gate.admit(req.client.host, usr_credentials.username):
+        user = await db.scalar(select(models.User).where(models.User.email == usr_credentials.username))
 
-    if not user or not utils.verify(usr_credentials.password, user.password):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Invalid login credentials")
+        if not user or not await hasher.verify(usr_credentials.password, user.password):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Invalid login credentials")
 
     access_tok = oauth.create_access_token(data={"user_id": user.id})
+    refresh_tok = oauth.create_refresh_token(db, user.id)
+    await db.commit()
     res.set_cookie(key="token", value=access_tok)
     return {
         "name": user.name,
         "access_token": access_tok,
+        "refresh_token": refresh_tok,
         "token_type": "bearer",
         "id": user.id
     }
 
-@router.post("/official/login", response_model=schemas.UserLogin)
+@router.post("/official/login", response_model=schemas.TokenPair)
 async def official_login(
-        res: Response, request: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+        req: Request, res: Response, request: OAuth2PasswordRequestForm = Depends(),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Logs an admin user into the system and returns an access token.
+    Logs an admin user into the system and returns an access token and a refresh token.
 
     Args:
+        req (Request): The incoming request, used for the client IP.
         res (Response): A FastAPI Response object.
         request (OAuth2PasswordRequestForm): A form containing the admin user's username and password.
-        db (Session): A SQLAlchemy session object.
+        db (AsyncSession): A SQLAlchemy session object.
 
     Returns:
-        dict: A dictionary containing the access token and token type.
+        dict: A dictionary containing the access token, refresh token and token type.
 
     Raises:
-        HTTPException: If the admin user's credentials are invalid or if the user is not authorized to perform the request.
+        HTTPException: If the admin user's credentials are invalid or if the user is not authorized to perform the request,
+            or 429 if the client or the account made too many attempts.
     """
-    user = db.query(models.User).filter(models.User.admin_id == request.username).first()
+    async with login_gate.admit(req.client.host, f"official:{request.username}"):
+        user = await db.scalar(select(models.User).where(models.User.admin_id == request.username))
 
-    if not user or not utils.verify(request.password, user.password):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Login Credentials")
+        if not user or not await hasher.verify(request.password, user.password):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Login Credentials")
 
     if user.role != "admin":
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized to perform this request")
 
     access_token = oauth.create_access_token(data={"user_id": user.id})
+    refresh_token = oauth.create_refresh_token(db, user.id)
+    await db.commit()
     res.set_cookie(key="token", value=access_token)
     return {
         # "name": user.name,
         "access_token": access_token,
+        "refresh_token": refresh_token,
         "token_type": "bearer"
         # "id": user.id
     }
+
+
+@router.post("/refresh", response_model=schemas.TokenPair)
+async def refresh(res: Response, body: schemas.RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Exchanges a refresh token for a new access token and a new refresh token.
+
+    Args:
+        res (Response): A FastAPI Response object.
+        body (schemas.RefreshRequest): The refresh token, which can not be used again afterwards.
+        db (AsyncSession): A SQLAlchemy session object.
+
+    Returns:
+        dict: A dictionary containing the access token, refresh token and token type.
+
+    Raises:
+        HTTPException: 401 if the refresh token is unknown, expired or revoked.
+    """
+    access_token, refresh_token = await oauth.rotate_refresh_token(db, body.refresh_token)
+    res.set_cookie(key="token", value=access_token)
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer"
+    }
+
+
+@router.post("/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke(body: schemas.RefreshRequest, everywhere: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """
+    Revokes a refresh token, e.g. on logout. Unknown tokens are ignored.
+
+    Args:
+        body (schemas.RefreshRequest): The refresh token to revoke.
+        everywhere (bool, optional): Also revoke every other refresh token of the same user, which takes a token
+            that is still valid. Defaults to False.
+        db (AsyncSession): A SQLAlchemy session object.
+
+    Raises:
+        HTTPException: 401 if `everywhere` is set and the token is unknown, expired or revoked.
+    """
+    if everywhere:
+        R = models.RefreshToken
+        user_id = await db.scalar(select(R.user_id).where(
+            R.token_hash == oauth.token_hash(body.refresh_token), R.revoked_at.is_(None), R.expires_at > func.now()
+        ))
+        if user_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid refresh token",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+        await oauth.revoke_refresh_tokens(db, user_id=user_id)
+    else:
+        await oauth.revoke_refresh_tokens(db, token=body.refresh_token)
+    await db.commit()
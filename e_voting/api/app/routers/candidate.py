@@ -7,7 +7,7 @@ votes a candidate has received in an election.
 
 Routes:
     - POST /candidates: create a new candidate in the database
-    - GET /candidates: retrieve all candidates from the database
+    - GET /candidates: retrieve a page of candidates, or stream them all, optionally filtered
     - GET /candidates/{candidateId}: retrieve a candidate with the specified ID
     - PATCH /candidates/{candidateId}: update a candidate with the specified ID
     - DELETE /candidates/{candidateId}: delete a candidate with the specified ID
@@ -19,7 +19,7 @@ Dependencies:
     - fastapi.status
     - fastapi.HTTPException
     - fastapi.security.OAuth2PasswordRequestForm
-    - sqlalchemy.orm.Session
+    - sqlalchemy.ext.asyncio.AsyncSession
     - typing.List
 
 Models:
@@ -41,18 +41,23 @@ Functions:
 
 """
 
-from fastapi import APIRouter, Depends, status, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, Response, status, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from ..database import get_db
-from sqlalchemy.orm import Session
-from .. import models, schemas, oauth, utils
+from ..database import get_async_db
+from sqlalchemy import func, select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas, oauth, utils, cache
+from ..conditional import CANDIDATE, conditional, versions
+from ..pagination import Page, fetch_page, paginate
 from typing import List
+from ..tally import tally
 
 candidate_router = APIRouter(tags=["Candidates"], prefix="/candidates")
 
 
 @candidate_router.post("", status_code=status.HTTP_201_CREATED, response_model=schemas.Candidate)
-async def create_candidate(body: schemas.CandidateCreate, db: Session = Depends(get_db),
+async def create_candidate(body: schemas.CandidateCreate, db: AsyncSession = Depends(get_async_db),
                            user: models.User = Depends(oauth.get_admin_user)):
     """
     Creates a new candidate in the database with the provided data.
@@ -60,7 +65,7 @@ async def create_candidate(body: schemas.CandidateCreate, db: Session = Depends(
     Args:
 
         body: An instance of schemas.CandidateCreate containing the data for the new candidate.
-        db: An instance of sqlalchemy.orm.Session representing the database session.
+        db: An instance of sqlalchemy.ext.asyncio.AsyncSession representing the database session.
         user: An instance of models.User representing the admin user making the request.
     Returns:
         An instance of schemas.Candidate representing the newly created candidate.
@@ -68,41 +73,58 @@ async def create_candidate(body: schemas.CandidateCreate, db: Session = Depends(
     data = body.dict()
     new_candidate = models.Candidates(**data, created_by=user.id)
     db.add(new_candidate)
-    db.commit()
-    db.refresh(new_candidate)
+    await db.commit()
+    await db.refresh(new_candidate)
+    cache.invalidate_election(new_candidate.election_id)
+    await versions.bump(db, CANDIDATE)
     return new_candidate
 
 
-@candidate_router.get("", response_model=List[schemas.Candidate])
-async def get_all_candidates(db: Session = Depends(get_db)):
+@candidate_router.get("", response_model=List[schemas.Candidate], dependencies=[Depends(conditional(CANDIDATE))])
+async def get_all_candidates(response: Response, election_id: Optional[int] = None, party: Optional[str] = None,
+                             state: Optional[str] = None, page: Page = Depends(),
+                             db: AsyncSession = Depends(get_async_db)):
     """
-    Retrieves all candidates from the database.
+    Retrieves a page of candidates from the database, ordered by ID.
 
     Args:
 
-        db: An instance of sqlalchemy.orm.Session representing the database session.
+        response: The response, which gets the cursor of the next page in its X-Next-Cursor header.
+        election_id: Only return the candidates of this election.
+        party: Only return the candidates of this party.
+        state: Only return the candidates of this state, case-insensitively.
+        page: The limit, the cursor and the streaming flag, see pagination.Page.
+        db: An instance of sqlalchemy.ext.asyncio.AsyncSession representing the database session.
     Returns:
-        A list of instances of schemas.Candidate representing all candidates in the database.
+        A list of instances of schemas.Candidate, or a stream of every matching candidate.
 
     """
-    data = db.query(models.Candidates).all()
-    return data
-
-
-@candidate_router.get("/{candidateId}", response_model=schemas.Candidate)
-async def get_candidate(candidateId: int, db: Session = Depends(get_db)):
+    C = models.Candidates
+    qry = select(C)
+    if election_id is not None:
+        qry = qry.where(C.election_id == election_id)
+    if party is not None:
+        qry = qry.where(C.party_name == party)
+    if state is not None:
+        qry = qry.where(func.lower(C.state) == state.lower())
+    return await paginate(db, qry, [C.id], page, response, schemas.Candidate)
+
+
+@candidate_router.get("/{candidateId}", response_model=schemas.Candidate,
+                      dependencies=[Depends(conditional(CANDIDATE))])
+async def get_candidate(candidateId: int, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieves a candidate with the specified ID from the database.
 
     Args:
 
         candidateId: An integer representing the ID of the candidate to retrieve.
-        db: An instance of sqlalchemy.orm.Session representing the database session.
+        db: An instance of sqlalchemy.ext.asyncio.AsyncSession representing the database session.
     Returns:
         An instance of schemas.Candidate representing the candidate with the specified ID.
     """
-    candidate = db.query(models.Candidates).where(
-        models.Candidates.id == candidateId).first()
+    candidate = await db.scalar(select(models.Candidates).where(
+        models.Candidates.id == candidateId))
     if not candidate:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -115,7 +137,7 @@ async def get_candidate(candidateId: int, db: Session = Depends(get_db)):
 @candidate_router.patch("/{candidateId}")
 async def update_candidate(
         candidateId: int, body: schemas.CandidateUpdate,
-        db: Session = Depends(get_db), user: models.User = Depends(oauth.get_admin_user)
+        db: AsyncSession = Depends(get_async_db), user: models.User = Depends(oauth.get_admin_user)
 ):
     """
     Updates the details of a candidate with the specified ID in the database.
@@ -124,30 +146,35 @@ async def update_candidate(
 
         candidateId: An integer representing the ID of the candidate to update.
         body: An instance of schemas.CandidateUpdate containing the data to update the candidate with.
-        db: An instance of sqlalchemy.orm.Session representing the database session.
+        db: An instance of sqlalchemy.ext.asyncio.AsyncSession representing the database session.
         user: An instance of models.User representing the admin user making the request.
     Returns:
         An instance of schemas.Candidate representing the updated candidate.
     """
-    data = utils.filter_nones(body)
-    candidate_qry = db.query(models.Candidates).where(
-        models.Candidates.id == candidateId)
-    old = candidate_qry.first()
+    data = utils.filter_nones(body.dict())
+    old = await db.scalar(select(models.Candidates).where(
+        models.Candidates.id == candidateId))
     if not old:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No candidate found with id: {candidateId}"
         )
-    candidate_qry.update(data)
-    db.commit()
-    db.refresh(old)
+    if data:
+        old_election_id = old.election_id
+        await db.execute(update(models.Candidates).where(
+            models.Candidates.id == candidateId).values(**data))
+        await db.commit()
+        await db.refresh(old)
+        cache.invalidate_election(old_election_id)
+        cache.invalidate_election(old.election_id)
+        await versions.bump(db, CANDIDATE)
 
     return old
 
 
 @candidate_router.delete("/{candidateId}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_candidate(
-        candidateId: int, db: Session = Depends(get_db),
+        candidateId: int, db: AsyncSession = Depends(get_async_db),
         user: int = Depends(oauth.get_admin_user)
 ):
     """
@@ -156,36 +183,47 @@ async def delete_candidate(
     Args:
 
         candidateId: An integer representing the ID of the candidate to delete.
-        db: An instance of sqlalchemy.orm.Session representing the database session.
+        db: An instance of sqlalchemy.ext.asyncio.AsyncSession representing the database session.
         user: An instance of models.User representing the admin user making the request.
     Returns:
         None.
     """
-    db.query(models.Candidates).where(
-        models.Candidates.id == candidateId).delete()
-    db.commit()
+    election_id = await db.scalar(delete(models.Candidates).where(
+        models.Candidates.id == candidateId).returning(models.Candidates.election_id))
+    await db.commit()
+    if election_id is not None:
+        cache.invalidate_election(election_id)
+        await versions.bump(db, CANDIDATE)
     return None
 
 
 @candidate_router.get("/{candidateId}/votes")
-def get_candidate_votes(candidateId: int, db: Session = Depends(get_db)):
+async def get_candidate_votes(candidateId: int, response: Response, page: Page = Depends(),
+                              db: AsyncSession = Depends(get_async_db)):
     """
-    Retrieves the number of votes for a candidate with the specified ID.
+    Retrieves the number of votes for a candidate with the specified ID, and a page of those votes.
 
     Args:
 
         candidateId: An integer representing the ID of the candidate to retrieve the votes for.
-        db: An instance of sqlalchemy.orm.Session representing the database session.
+        response: The response, which gets the cursor of the next page of votes in its X-Next-Cursor header.
+        page: The limit and the cursor of the page of votes, see pagination.Page. Streams are not supported,
+            GET /votes/{electionId}?candidate_id={candidateId}&stream=true exports every vote.
+        db: An instance of sqlalchemy.ext.asyncio.AsyncSession representing the database session.
     Returns:
-        A dictionary containing the ID of the election the candidate is running in and the number of votes they have received.
+        A dictionary containing the ID of the election the candidate is running in, a page of the votes they have
+        received, ordered by voter, and their live vote count.
 
     """
-    candidate: models.Candidates = db.query(models.Candidates).where(
-        models.Candidates.id == candidateId).first()
+    candidate: models.Candidates = await db.scalar(select(models.Candidates).where(
+        models.Candidates.id == candidateId))
     if not candidate:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No candidate found with id: {candidateId}"
         )
 
-    return {"election": candidate.election_id, "votes": candidate.votes}
+    V = models.Vote
+    votes = await fetch_page(db, select(V).where(V.candidateId == candidateId), [V.voterId], page, response,
+                             schemas.Vote)
+    return {"election": candidate.election_id, "votes": votes, "total_votes": tally.total_for(candidate)}
@@ -6,7 +6,7 @@ as well as retrieving statistics and participants for a particular election.
 The endpoints in this module require authentication and certain actions are restricted to users with admin privileges.
 
 Endpoints:
-- GET /elections: Retrieve and return all elections.
+- GET /elections: Retrieve a page of elections, or stream them all, optionally filtered by state and LGA.
 - POST /elections: Create a new election.
 - GET /elections/active: Retrieve all active elections.
 - GET /elections/{electionId}: Retrieve a single election by its ID.
@@ -15,51 +15,72 @@ Endpoints:
 - GET /elections/{electionId}/statistics: Retrieve the statistics of a particular election.
 - GET /elections/{electionId}/participants: Retrieve the participants (candidates) for a particular election.
 - GET /elections/active/mine: Retrieve all active elections available to the logged-in user.
+- GET /elections/{electionId}/results/stream: Stream live results of an election as Server-Sent Events.
+- WEBSOCKET /elections/{electionId}/results/ws: Stream live results of an election over a WebSocket.
+
+Once an election is closed, its statistics, participants and results are served from the snapshot frozen by
+lifecycle.ElectionScheduler, and it can no longer be updated.
+
+Elections, single elections and participants are served with an ETag and Cache-Control header, see conditional.
 
 This module depends on other modules such as `database`, `models`, `schemas`, `utils`, and `oauth`.
 It uses SQLAlchemy for interacting with the database and FastAPI for creating the API.
 """
-from fastapi import APIRouter, status, Depends, HTTPException
-from ..database import get_db
-from sqlalchemy.orm import Session
-from .. import models, schemas, utils, oauth
-from datetime import datetime
-from typing import List
-from sqlalchemy import or_, and_, func
+import json
+from fastapi import APIRouter, status, Depends, HTTPException, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from ..database import get_async_db, session_scope
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas, utils, oauth, results, cache, eligibility
+from ..conditional import CANDIDATE, ELECTION, PARTY, conditional, versions
+from ..lifecycle import scheduler
+from ..live import broadcaster, final_message
+from ..pagination import Page, paginate
+from typing import List, Optional
+from sqlalchemy import func, select, update, delete
 
 router = APIRouter(tags=["Elections"], prefix="/elections")
 
 
-@router.get("", response_model=List[schemas.Election])
-def get_all_elections(db: Session = Depends(get_db)):
+@router.get("", response_model=List[schemas.Election], dependencies=[Depends(conditional(ELECTION))])
+async def get_all_elections(response: Response, state: Optional[str] = None, lga: Optional[str] = None,
+                            page: Page = Depends(), db: AsyncSession = Depends(get_async_db)):
     """
-    Retrieve and return all elections.
+    Retrieve and return a page of elections, ordered by ID.
 
-    Dependencies: Depends(get_db)
+    Dependencies: Depends(get_async_db)
     Models: models.Election
     Schemas: schemas.Election
 
     Args:
-        - db: Session (default: Depends(get_db)) - SQLAlchemy Session object
+        - response: Response - gets the cursor of the next page in its X-Next-Cursor header
+        - state: str (default: None) - only return the elections of this state, case-insensitively
+        - lga: str (default: None) - only return the elections of this LGA, case-insensitively
+        - page: Page - the limit, the cursor and the streaming flag, see pagination.Page
+        - db: AsyncSession (default: Depends(get_async_db)) - SQLAlchemy AsyncSession object
     Returns:
-        - List[schemas.Election] - a list of Election objects in the form of a schema
+        - List[schemas.Election] - a list of Election objects in the form of a schema, or a stream of all of them
     Raises:
-        - None
+        - HTTPException: 400 if the cursor is invalid
     """
-
-    data = db.query(models.Election).all()
-    return data
+    E = models.Election
+    qry = select(E)
+    if state is not None:
+        qry = qry.where(func.lower(E.state) == state.lower())
+    if lga is not None:
+        qry = qry.where(func.lower(E.lga) == lga.lower())
+    return await paginate(db, qry, [E.id], page, response, schemas.Election)
 
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=schemas.Election)
-def create_election(election: schemas.ElectionCreate,
-                    db: Session = Depends(get_db), user: models.User = Depends(oauth.get_admin_user)):
+async def create_election(election: schemas.ElectionCreate,
+                          db: AsyncSession = Depends(get_async_db), user: models.User = Depends(oauth.get_admin_user)):
     """
     Creates a new election in the database.
 
     Args:
         election (schemas.ElectionCreate): The details of the election to be created.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
         user (models.User, optional): The authenticated user. Defaults to Depends(oauth.get_admin_user).
 
     Returns:
@@ -69,39 +90,37 @@ def create_election(election: schemas.ElectionCreate,
     data = election.dict()
     new_election = models.Election(**data, created_by=user.id)
     db.add(new_election)
-    db.commit()
-    db.refresh(new_election)
+    await db.commit()
+    await db.refresh(new_election)
+    await eligibility.rebuild(db, new_election.id)
+    cache.invalidate_election()
+    await versions.bump(db, ELECTION)
     return new_election
 
 
 @router.get("/active", response_model=List[schemas.Election])
-def get_active_elections(db: Session = Depends(get_db)):
+async def get_active_elections(db: AsyncSession = Depends(get_async_db)):
     """
     Fetches all active elections from the database.
 
     Args:
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
 
     Returns:
         List[schemas.Election]: A list of active elections.
     """
 
-    E = models.Election
-    qry = db.query(E).where(
-        (E.end_date > datetime.utcnow())
-    )
+    return await cache.get_active_elections(db)
 
-    return qry.all()
 
-
-@router.get("/{electionId}", response_model=schemas.Election)
-def get_one_election(electionId: str, db: Session = Depends(get_db)):
+@router.get("/{electionId}", response_model=schemas.Election, dependencies=[Depends(conditional(ELECTION))])
+async def get_one_election(electionId: int, db: AsyncSession = Depends(get_async_db)):
     """
     Fetches a single election from the database by ID.
 
     Args:
-        electionId (str): The ID of the election to fetch.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        electionId (int): The ID of the election to fetch.
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
 
     Returns:
         schemas.Election: The details of the election.
@@ -110,8 +129,7 @@ def get_one_election(electionId: str, db: Session = Depends(get_db)):
         HTTPException: If the election with the specified ID is not found in the database.
     """
 
-    election = db.query(models.Election).where(
-        models.Election.id == electionId).first()
+    election = await cache.get_election(db, electionId)
     if not election:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Election with id={electionId} not found!")
@@ -119,47 +137,52 @@ def get_one_election(electionId: str, db: Session = Depends(get_db)):
 
 
 @router.patch("/{electionId}", response_model=schemas.Election)
-def update_election(electionId: str, body: schemas.ElectionUpdate,
-                    db: Session = Depends(get_db), user: models.User = Depends(oauth.get_admin_user)):
+async def update_election(electionId: int, body: schemas.ElectionUpdate,
+                          db: AsyncSession = Depends(get_async_db), user: models.User = Depends(oauth.get_admin_user)):
     """
     Updates an existing election in the database by ID.
 
     Args:
-        electionId (str): The ID of the election to update.
+        electionId (int): The ID of the election to update.
         body (schemas.ElectionUpdate): The new details to update the election with.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
         user (models.User, optional): The authenticated user. Defaults to Depends(oauth.get_admin_user).
 
     Returns:
         schemas.Election: The updated details of the election.
 
     Raises:
-        HTTPException: If the election with the specified ID is not found in the database.
+        HTTPException: If the election with the specified ID is not found in the database, or 409 if it is closed.
     """
 
-    qry = db.query(models.Election).where(models.Election.id == electionId)
-    old = qry.first()
+    old = await db.scalar(select(models.Election).where(models.Election.id == electionId))
     if not old:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Election with id={electionId} not found!")
+    if cache.is_closed(electionId):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=f"Election with id={electionId} is closed!")
     data = utils.filter_nones(body.dict())
     if data == {}:
         return old
-    qry.update(data)
-    db.commit()
-    db.refresh(old)
+    await db.execute(update(models.Election).where(models.Election.id == electionId).values(**data))
+    await db.commit()
+    await eligibility.rebuild(db, electionId)
+    await db.refresh(old)
+    cache.invalidate_election(electionId)
+    await versions.bump(db, ELECTION)
     return old
 
 
 @router.delete("/{electionId}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_election(electionId: str, db: Session = Depends(get_db),
-                    user: models.User = Depends(oauth.get_admin_user)):
+async def delete_election(electionId: int, db: AsyncSession = Depends(get_async_db),
+                          user: models.User = Depends(oauth.get_admin_user)):
     """
     Deletes an existing election from the database by ID.
 
     Args:
-        electionId (str): The ID of the election to delete.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        electionId (int): The ID of the election to delete.
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
         user (models.User, optional): The authenticated user. Defaults to Depends(oauth.get_admin_user).
 
     Returns:
@@ -169,39 +192,53 @@ def delete_election(electionId: str, db: Session = Depends(get_db),
         HTTPException: If the election with the specified ID is not found in the database.
     """
 
-    db.query(models.Election).where(models.Election.id == electionId).delete()
-    db.commit()
+    await db.execute(delete(models.Election).where(models.Election.id == electionId))
+    await db.commit()
+    cache.invalidate_election(electionId)
+    scheduler.forget(electionId)
+    # deleting an election cascades to its candidates
+    await versions.bump(db, ELECTION, CANDIDATE)
     return None
 
 
 @router.get("/{electionId}/statistics")
-def get_election_statistics(electionId: int, db: Session = Depends(get_db)):
+async def get_election_statistics(electionId: int, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve and return the statistics of an election, including vote distribution and percentages.
 
+    The counts are read from the election_stats aggregate table, which is updated incrementally as votes are cast,
+    or from the frozen snapshot once the election is closed.
+
     Args:
         electionId (int): The ID of the election to retrieve statistics for.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
 
     Returns:
-        dict: A dictionary containing the statistics for the election.
+        dict: A dictionary containing the total votes, eligible voters and turnout of the election,
+            the votes and percentage of every candidate and the votes per state and per LGA.
 
     Raises:
         HTTPException: Raised if no election is found with the given ID.
-    - mark as TODO
     """
+    snapshot = await scheduler.snapshot(db, electionId)
+    if snapshot:
+        return snapshot["statistics"]
+    election = await db.scalar(select(models.Election).where(models.Election.id == electionId))
+    if not election:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Election with id={electionId} not found!")
 
-    return "Stats"
+    return await results.election_statistics(db, election)
 
 
-@router.get("/{electionId}/participants")
-def get_election_participants(electionId: int, db: Session = Depends(get_db)):
+@router.get("/{electionId}/participants", dependencies=[Depends(conditional(ELECTION, CANDIDATE, PARTY))])
+async def get_election_participants(electionId: int, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve the list of candidates and parties participating in an election.
 
     Args:
         electionId (int): The ID of the election to fetch participants for.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
 
     Returns:
         dict: A dictionary with the ID of the election and a list of candidate and party information.
@@ -210,53 +247,111 @@ def get_election_participants(electionId: int, db: Session = Depends(get_db)):
     Raises:
         HTTPException: Raised with a 404 status code if the election is not found in the database.
     """
-    election: models.Election = db.query(models.Election).where(
-        models.Election.id == electionId).first()
+    snapshot = await scheduler.snapshot(db, electionId)
+    if snapshot:
+        return {"election": electionId, "participants": snapshot["participants"]}
+    election = await cache.get_election(db, electionId)
     if not election:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Election with id={electionId} not found!")
 
-    candidates: List[models.Candidates] = election.candidates
-    result = []
-    for candidate in candidates:
-        party: models.Party = candidate.party
-        result.insert(0, {
-            "party_name": party.name,
-            "party_logo": party.party_logo_url,
-            "candidate_name": candidate.name,
-            "candidate_id": candidate.id
-        })
-
-    return {"election": election.id, "participants": result}
+    return {"election": election.id, "participants": list(election.participants)}
 
 
 @router.get("/active/mine")
-def get_active_elections(db: Session = Depends(get_db), user: models.User = Depends(oauth.get_current_user)):
+async def get_my_active_elections(db: AsyncSession = Depends(get_async_db),
+                                  user: models.User = Depends(oauth.get_current_user)):
     """
-        Returns a list of all active elections available to the logged-in user.
+        Returns a list of all active elections available to the logged-in user, from the cached index of active
+        elections.
         - All national elections (state = null and lga = null)
         - All user's state elections (state = user.state and lga = null)
         - All user's lga elections (lga = user.lga)
 
         Args:
-            db (Session, optional): Database session. Defaults to Depends(get_db).
+            db (AsyncSession, optional): Database session. Defaults to Depends(get_async_db).
             user (models.User, optional): The logged-in user. Defaults to Depend on(oauth.get_current_user).
 
         Returns:
             list: A list of all active elections available to the logged-in user.
     """
 
-    E = models.Election
-    qry = db.query(E).where(
-        and_(
-            E.end_date > datetime.utcnow(),
-            or_(
-                and_(func.coalesce(E.state, "") ==
-                     "", func.coalesce(E.lga, "") == ""),
-                and_(E.state == user.state, func.coalesce(E.lga, "") == ""),
-                (E.lga == user.lga)
-            )
-        )
-    )
-
-    return qry.all()
+    return await cache.get_voter_elections(db, user.state, user.lga)
+
+
+@router.get("/{electionId}/results/stream")
+async def stream_election_results(electionId: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Stream the live vote counts of an election as Server-Sent Events.
+
+    The first event is a snapshot of every candidate's count, the following ones only carry the counts that changed.
+    A closed election gets a single "final" event with the frozen counts and the stream ends, and so does a stream
+    following an election when it closes.
+
+    Args:
+        electionId (int): The ID of the election to follow.
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
+
+    Returns:
+        StreamingResponse: A text/event-stream response.
+
+    Raises:
+        HTTPException: Raised with a 404 status code if the election is not found in the database.
+    """
+    election = await db.scalar(select(models.Election.id).where(models.Election.id == electionId))
+    if not election:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Election with id={electionId} not found!")
+    snapshot = await scheduler.snapshot(db, electionId)
+    # do not hold on to a connection for as long as the client is watching
+    await db.close()
+
+    async def events():
+        if snapshot:
+            yield f"event: final\ndata: {json.dumps(final_message(electionId, snapshot))}\n\n"
+            return
+        async with broadcaster.subscribe(electionId) as queue:
+            while True:
+                message = await queue.get()
+                yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+                if message["type"] == "final":
+                    return
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket("/{electionId}/results/ws")
+async def election_results_socket(websocket: WebSocket, electionId: int):
+    """
+    Stream the live vote counts of an election over a WebSocket.
+
+    The first message is a snapshot of every candidate's count, the following ones only carry the counts that changed.
+    A closed election gets a single "final" message with the frozen counts and the socket is closed, and so does a
+    socket following an election when it closes.
+
+    Args:
+        websocket (WebSocket): The client connection.
+        electionId (int): The ID of the election to follow.
+    """
+    async with session_scope() as db:
+        election = await db.scalar(select(models.Election.id).where(models.Election.id == electionId))
+        snapshot = election and await scheduler.snapshot(db, electionId)
+    if not election:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    if snapshot:
+        await websocket.send_json(final_message(electionId, snapshot))
+        await websocket.close()
+        return
+    try:
+        async with broadcaster.subscribe(electionId) as queue:
+            while True:
+                message = await queue.get()
+                await websocket.send_json(message)
+                if message["type"] == "final":
+                    await websocket.close()
+                    return
+    except WebSocketDisconnect:
+        pass
@@ -5,9 +5,11 @@ Routes:
 - POST /register/{userID}: Creates a new official and returns the created instance.
 - POST /accredit/{voterID}: Accredits a voter and returns a status message.
 - POST /de_accredit/{voterID}: De-accredits a voter and returns a status message.
+- POST /accreditation: Accredits or de-accredits voters in bulk and reports the IDs that changed.
+- GET /voters: Looks a voter up by VIN, NIN or phone number, or searches voters of an LGA by name prefix.
 
 Dependencies:
-- db: SQLAlchemy database session dependency.
+- db: SQLAlchemy async database session dependency.
 - user: OAuth2 user authentication dependency.
 
 Models:
@@ -15,24 +17,34 @@ Models:
 
 Schemas:
 - Official: Pydantic schema for Official model.
+- BulkAccreditation: Pydantic schema for the voters to accredit or de-accredit in bulk.
+- VoterLookup: Pydantic schema for the voter fields shown at an accreditation desk.
 
 Functions:
-- create_official(userID: str, db: Session, user: int) -> Official:
+- create_official(userID: int, db: AsyncSession, user: int) -> Official:
         Creates a new official and returns the created instance.
-- accredit_voter(voterID: str, db: Session, user: int) -> Dict[str, str]:
+- accredit_voter(voterID: int, db: AsyncSession, user: int) -> Dict[str, str]:
         Accredits a voter and returns a status message.
-- de_accredit_voter(voterID: str, db: Session, user: int) -> Dict[str, str]:
+- de_accredit_voter(voterID: int, db: AsyncSession, user: int) -> Dict[str, str]:
         De-accredits a voter and returns a status message.
+- bulk_accreditation(body: BulkAccreditation, db: AsyncSession, user: int) -> Dict:
+        Accredits or de-accredits voters in bulk and reports the IDs that changed.
+- find_voters(vin: str, nin: str, mobile_no: str, name: str, lga: str, ward: int, limit: int, db: AsyncSession,
+        user: int) -> List[VoterLookup]:
+        Looks a voter up by VIN, NIN or phone number, or searches voters of an LGA by name prefix.
 
 Raises:
 - HTTPException: Raises an HTTPException with a corresponding error message for various error scenarios.
 
 """
 
-from fastapi import APIRouter, status, HTTPException, Depends
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, status, HTTPException, Depends, Query
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
-from .. import schemas, database, models, utils, oauth
+from .. import schemas, database, models, utils, oauth, eligibility
+from ..config import settings
 
 
 router = APIRouter(tags=["Officials"], prefix="/officials")
@@ -41,13 +53,13 @@ router = APIRouter(tags=["Officials"], prefix="/officials")
 @router.post("/register/{userID}", status_code=status.HTTP_201_CREATED,
              response_model=schemas.Official)
 async def create_official(
-        userID: str, db: Session = Depends(database.get_db), user: int = Depends(oauth.get_admin_user)
+        userID: int, db: AsyncSession = Depends(database.get_async_db), user: int = Depends(oauth.get_admin_user)
 ):
     """
     Creates a new official and returns the created instance.
     Args:
-        userID (str): The ID of the user to be created as an official.
-        db (Session): The SQLAlchemy database session dependency.
+        userID (int): The ID of the user to be created as an official.
+        db (AsyncSession): The SQLAlchemy database session dependency.
         user (int): The OAuth2 user authentication dependency.
 
     Returns:
@@ -56,24 +68,27 @@ async def create_official(
     Raises:
         HTTPException: If the provided user ID is not valid or if the user is already accredited.
     """
-    found_user = utils.get_user_with_id(userID)
+    found_user = await utils.get_user_with_id(userID, db)
 
     if not found_user.accredited:
-        found_user.update({"accredited": True}, synchronize_session=False)
-    found_user.update({"role": "admin", "admin_id": f"{uuid.uuid4().hex[:8]}"}, synchronize_session=False)
-    db.commit()
-    return found_user.first()
+        found_user.accredited = True
+        await eligibility.adjust(db, eligibility.changes([found_user], 1))
+    found_user.role = "admin"
+    found_user.admin_id = f"{uuid.uuid4().hex[:8]}"
+    await db.commit()
+    oauth.invalidate_principal(found_user.id)
+    return found_user
 
 
 @router.post("/accredit/{voterID}", status_code=status.HTTP_201_CREATED)
 async def accredit_voter(
-        voterID: str, db: Session = Depends(database.get_db), user: int = Depends(oauth.get_admin_user)
+        voterID: int, db: AsyncSession = Depends(database.get_async_db), user: int = Depends(oauth.get_admin_user)
 ):
     """
     Accredits a voter and returns a status message.
     Args:
-        voterID (str): The ID of the voter to be accredited.
-        db (Session): The SQLAlchemy database session dependency.
+        voterID (int): The ID of the voter to be accredited.
+        db (AsyncSession): The SQLAlchemy database session dependency.
         user (int): The OAuth2 user authentication dependency.
 
     Returns:
@@ -82,24 +97,26 @@ async def accredit_voter(
     Raises:
         HTTPException: If the provided voter ID is not valid or if the voter is already accredited.
     """
-    found_user = utils.get_user_with_id(voterID)
+    found_user = await utils.get_user_with_id(voterID, db)
 
     if not found_user.accredited:
-        found_user.update({"accredited": True}, synchronize_session=False)
-        db.commit()
+        found_user.accredited = True
+        await eligibility.adjust(db, eligibility.changes([found_user], 1))
+        await db.commit()
+        oauth.invalidate_principal(found_user.id)
         return {"status": "successfully accredited"}
 
 
 @router.post("/de_accredit/{voterID}", status_code=status.HTTP_201_CREATED)
 async def de_accredit_voter(
-        voterID: str, db: Session = Depends(database.get_db), user: int = Depends(oauth.get_admin_user)
+        voterID: int, db: AsyncSession = Depends(database.get_async_db), user: int = Depends(oauth.get_admin_user)
 ):
     """
     This function de-accredits a voter by updating the accredited column of their user profile to False.
 
     Args:
-        voterID (str): The ID of the voter to be de-accredited.
-        db (Session, optional): The database session. Defaults to Depends(database.get_db).
+        voterID (int): The ID of the voter to be de-accredited.
+        db (AsyncSession, optional): The database session. Defaults to Depends(database.get_async_db).
         user (int, optional): The admin user who is performing the de-accreditation. Defaults to Depends(oauth.get_admin_user).
 
     Returns:
@@ -108,9 +125,145 @@ async def de_accredit_voter(
     Raises:
         HTTPException: Raised if the specified voter ID is invalid or if the user is not an admin.
     """
-    found_user = utils.get_user_with_id(voterID)
+    found_user = await utils.get_user_with_id(voterID, db)
 
     if found_user.accredited:
-        found_user.update({"accredited": False}, synchronize_session=False)
-        db.commit()
+        found_user.accredited = False
+        await eligibility.adjust(db, eligibility.changes([found_user], -1))
+        await db.commit()
+        oauth.invalidate_principal(found_user.id)
+
+
+async def _set_accredited(db: AsyncSession, condition, accredited: bool, *returning):
+    """Run one chunk of a bulk accreditation, returning the changed rows"""
+    U = models.User
+    changed = (await db.execute(
+        update(U).where(condition, U.accredited != accredited).values(accredited=accredited)
+        .returning(U.id, U.state, U.lga, U.ward, *returning)
+    )).all()
+    await eligibility.adjust(db, eligibility.changes(changed, 1 if accredited else -1))
+    await db.commit()
+    return changed
+
+
+@router.post("/accreditation")
+async def bulk_accreditation(
+        body: schemas.BulkAccreditation, db: AsyncSession = Depends(database.get_async_db),
+        user: int = Depends(oauth.get_admin_user)
+):
+    """
+    Accredits or de-accredits voters in bulk.
+
+    Voters are selected by ID, by VIN, or by a selector matching every voter of a ward, state or LGA. They are
+    updated with set-based UPDATE ... RETURNING statements of at most `bulk_chunk_size` voters, each committed on
+    its own, and only the voters whose accreditation actually changes are written.
+
+    Args:
+        body (schemas.BulkAccreditation): The voters to update and whether to accredit or de-accredit them.
+        db (AsyncSession): The SQLAlchemy database session dependency.
+        user (int): The OAuth2 user authentication dependency.
+
+    Returns:
+        dict: The IDs of the voters whose accreditation changed, and the requested IDs and VINs that did not change
+            because they are unknown or already in the requested state.
+
+    Raises:
+        HTTPException: If no voter is selected or if the user is not an admin.
+    """
+    U = models.User
+    size = settings.bulk_chunk_size
+    selector = [
+        condition for value, condition in (
+            (body.ward, U.ward == body.ward),
+            (body.state, func.lower(U.state) == (body.state or "").lower()),
+            (body.lga, func.lower(U.lga) == (body.lga or "").lower()),
+        ) if value is not None
+    ]
+    if not (body.ids or body.vins or selector):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No voters selected")
+
+    changed = []
+    unchanged_ids = set()
+    unchanged_vins = set()
+    try:
+        ids = list(dict.fromkeys(body.ids or []))
+        for i in range(0, len(ids), size):
+            chunk = ids[i:i + size]
+            rows = await _set_accredited(db, U.id.in_(chunk), body.accredited)
+            changed.extend(row.id for row in rows)
+            unchanged_ids.update(set(chunk) - {row.id for row in rows})
+        vins = list(dict.fromkeys(body.vins or []))
+        for i in range(0, len(vins), size):
+            chunk = vins[i:i + size]
+            rows = await _set_accredited(db, U.vin.in_(chunk), body.accredited, U.vin)
+            changed.extend(row.id for row in rows)
+            unchanged_vins.update(set(chunk) - {row.vin for row in rows})
+        if selector:
+            while True:
+                batch = select(U.id).where(*selector, U.accredited != body.accredited).order_by(U.id).limit(size)
+                rows = await _set_accredited(db, U.id.in_(batch.scalar_subquery()), body.accredited)
+                if not rows:
+                    break
+                changed.extend(row.id for row in rows)
+    finally:
+        # the chunks committed so far stay committed even if a later one fails
+        oauth.invalidate_principals(changed)
+    return {
+        "accredited": body.accredited,
+        "changed": changed,
+        "unchanged_ids": sorted(unchanged_ids),
+        "unchanged_vins": sorted(unchanged_vins),
+    }
+
+
+@router.get("/voters", response_model=List[schemas.VoterLookup])
+async def find_voters(
+        vin: Optional[str] = None, nin: Optional[str] = None, mobile_no: Optional[str] = None,
+        name: Optional[str] = Query(None, min_length=2), lga: Optional[str] = None, ward: Optional[int] = None,
+        limit: int = Query(20, ge=1, le=100), db: AsyncSession = Depends(database.get_async_db),
+        user: int = Depends(oauth.get_admin_user)
+):
+    """
+    Finds voters at an accreditation desk.
+
+    A voter is looked up exactly by VIN, NIN or phone number, each backed by its own index. Without any of those,
+    the voters of an LGA, and optionally of one of its wards, are searched by the case-insensitive prefix of their
+    name, backed by an index on the lowercased LGA and name.
+
+    Args:
+        vin (str, optional): The voter identification number.
+        nin (str, optional): The national identification number.
+        mobile_no (str, optional): The phone number.
+        name (str, optional): The first letters of the name, at least two.
+        lga (str, optional): The LGA to search by name in, required with `name`.
+        ward (int, optional): The ward to search by name in.
+        limit (int, optional): The maximum number of voters returned. Defaults to 20.
+        db (AsyncSession): The SQLAlchemy database session dependency.
+        user (int): The OAuth2 user authentication dependency.
+
+    Returns:
+        List[schemas.VoterLookup]: The matching voters, ordered by name.
+
+    Raises:
+        HTTPException: If no criterion is given, if a name is searched without an LGA or if the user is not an admin.
+    """
+    U = models.User
+    qry = select(U.id, U.vin, U.name, U.state, U.lga, U.ward, U.accredited)
+    if vin or nin or mobile_no:
+        for column, value in ((U.vin, vin), (U.nin, nin), (U.mobile_no, mobile_no)):
+            if value:
+                qry = qry.where(column == value)
+    elif name and lga:
+        qry = qry.where(
+            func.lower(U.lga) == lga.lower(),
+            func.lower(U.name).startswith(name.lower(), autoescape=True)
+        )
+        if ward is not None:
+            qry = qry.where(U.ward == ward)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give a VIN, a NIN or a phone number, or a name with an LGA"
+        )
+    return (await db.execute(qry.order_by(func.lower(U.name), U.id).limit(limit))).all()
 
@@ -6,7 +6,7 @@ Routes:
     - `PUT /party/{partyID}/update`: Update an existing party.
     - `GET /party/{partyID}`: Get a single party by ID.
     - `DELETE /party/{partyID}`: Delete a single party by ID.
-    - `GET /party/`: Get all parties.
+    - `GET /party/`: Get a page of parties, or stream them all.
 
 Dependencies:
     - `fastapi.APIRouter`: Defines the API router and allows for route creation.
@@ -14,7 +14,7 @@ Dependencies:
     - `fastapi.HTTPException`: Exception that will return an HTTP error response.
     - `fastapi.File`: Helper function to receive a file in a route.
     - `fastapi.UploadFile`: File uploaded via an HTTP request.
-    - `sqlalchemy.orm.Session`: A SQLAlchemy database session.
+    - `sqlalchemy.ext.asyncio.AsyncSession`: A SQLAlchemy async database session.
     - `cloudinary.uploader.upload`: Upload files to a cloud storage service.
     - `cloudinary.utils.cloudinary_url`: Helper function to get a URL for a cloudinary file.
 
@@ -50,9 +50,13 @@ Raises:
 
 
 from typing import Optional, List
-from fastapi import APIRouter, status, Depends, HTTPException, File, UploadFile
-from sqlalchemy.orm import Session
-from .. import schemas, database, models, utils, oauth
+from fastapi import APIRouter, status, Depends, HTTPException, File, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, database, models, utils, oauth, cache
+from ..conditional import CANDIDATE, PARTY, conditional, versions
+from ..pagination import Page, paginate
 from cloudinary.uploader import upload
 from cloudinary.utils import cloudinary_url
 
@@ -63,7 +67,7 @@ router = APIRouter(tags=["party"], prefix="/party")
 @router.post("/register", status_code=status.HTTP_201_CREATED, response_model=schemas.Party)
 async def create_party(
         party: schemas.CreateParty,
-        db: Session = Depends(database.get_db),
+        db: AsyncSession = Depends(database.get_async_db),
         admin: int = Depends(oauth.get_admin_user),
         party_logo: UploadFile = File(...)
 ):
@@ -72,7 +76,7 @@ async def create_party(
 
        Args:
            party (schemas.CreateParty): The data needed to create a new political party.
-           db (Session, optional): The database session. Defaults to Depends(database.get_db).
+           db (AsyncSession, optional): The database session. Defaults to Depends(database.get_async_db).
            admin (int, optional): The user ID of an admin user. Defaults to Depends(oauth.get_admin_user).
            party_logo (UploadFile, optional): The image file of the party's logo. Defaults to File(...).
 
@@ -93,18 +97,19 @@ async def create_party(
         'image/bmp',
     ]
     await utils.validate_file(party_logo, 2000000, valid_types)
-    party_query = db.query(models.Party).filter(models.Party.name == party.name).first()
+    party_query = await db.scalar(select(models.Party).where(models.Party.name == party.name))
     if party_query:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail=f"Party with name {party.name} already exists")
 
-    pics = upload(party_logo.file)
+    pics = await run_in_threadpool(upload, party_logo.file)
     url = pics.get("url")
     new_party = models.Party(**party.dict())
     new_party.party_logo_url = url
     db.add(new_party)
-    db.commit()
-    db.refresh(new_party)
+    await db.commit()
+    await db.refresh(new_party)
+    await versions.bump(db, PARTY)
     return new_party
 
 
@@ -112,7 +117,7 @@ async def create_party(
 async def update_party(
         partyID: int,
         party: schemas.UpdateParty,
-        db: Session = Depends(database.get_db),
+        db: AsyncSession = Depends(database.get_async_db),
         admin: int = Depends(oauth.get_admin_user),
         file: Optional[UploadFile] = File(...)
 ):
@@ -122,7 +127,7 @@ async def update_party(
         Args:
             partyID (int): The ID of the political party to be updated.
             party (schemas.UpdateParty): The new data for the political party.
-            db (Session, optional): The database session. Defaults to Depends(database.get_db).
+            db (AsyncSession, optional): The database session. Defaults to Depends(database.get_async_db).
             admin (int, optional): The user ID of an admin user. Defaults to Depends(oauth.get_admin_user).
             file (Optional[UploadFile], optional): The new image file of the party's logo. Defaults to File(...).
 
@@ -144,30 +149,34 @@ async def update_party(
         ]
         await utils.validate_file(file, 2000000, valid_types)
 
-    party_query = db.query(models.Party).filter(models.Party.id == partyID).first()
+    party_query = await db.scalar(select(models.Party).where(models.Party.id == partyID))
     if not party_query:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Party with id {partyID} does not exist")
-    party_query.update(party)
+    for key, value in utils.filter_nones(party.dict(exclude={"id"})).items():
+        setattr(party_query, key, value)
 
     if file:
-        pics = upload(file.file, public_id=file.filename)
+        pics = await run_in_threadpool(upload, file.file, public_id=file.filename)
         url = pics.get("url")
         party_query.party_logo_url = url
 
-    db.commit()
-    db.refresh(party_query)
+    await db.commit()
+    await db.refresh(party_query)
+    # participants lists embed the party name and logo
+    cache.invalidate_elections()
+    await versions.bump(db, PARTY)
     return party_query
 
 
-@router.get('/{partyID}', response_model=schemas.PartyView)
-async def get_party(partyID: int, db: Session = Depends(database.get_db)):
+@router.get('/{partyID}', response_model=schemas.PartyView, dependencies=[Depends(conditional(PARTY))])
+async def get_party(partyID: int, db: AsyncSession = Depends(database.get_async_db)):
     """
         Retrieve the details of a political party by ID.
 
         Args:
             partyID (int): The ID of the political party to be retrieved.
-            db (Session, optional): The database session. Defaults to Depends(database.get_db).
+            db (AsyncSession, optional): The database session. Defaults to Depends(database.get_async_db).
 
         Returns:
             schemas.PartyView: The details of the political party.
@@ -175,7 +184,7 @@ async def get_party(partyID: int, db: Session = Depends(database.get_db)):
         Raises:
             HTTPException: If the party does not exist.
     """
-    party_query = db.query(models.Party).filter(models.Party.id == partyID).first()
+    party_query = await db.scalar(select(models.Party).where(models.Party.id == partyID))
     if not party_query:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"Party with id {partyID} does not exist")
@@ -184,14 +193,14 @@ async def get_party(partyID: int, db: Session = Depends(database.get_db)):
 
 @router.delete('/{partyID}', status_code=status.HTTP_204_NO_CONTENT)
 async def delete_party(
-        partyID: int, db: Session = Depends(database.get_db), admin: int = Depends(oauth.get_admin_user)
+        partyID: int, db: AsyncSession = Depends(database.get_async_db), admin: int = Depends(oauth.get_admin_user)
 ):
     """
        Delete a political party by ID.
 
        Args:
            partyID (int): The ID of the political party to be deleted.
-           db (Session, optional): The database session. Defaults to Depends(database.get_db).
+           db (AsyncSession, optional): The database session. Defaults to Depends(database.get_async_db).
            admin (int, optional): The user ID of an admin user. Defaults to Depends(oauth.get_admin_user).
 
        Returns:
@@ -200,24 +209,30 @@ async def delete_party(
        Raises:
            HTTPException: If the party does not exist.
     """
-    db.query(models.Party).where(models.Party.id == partyID).delete()
-    db.commit()
+    await db.execute(delete(models.Party).where(models.Party.id == partyID))
+    await db.commit()
+    # deleting a party cascades to its candidates
+    cache.invalidate_elections()
+    await versions.bump(db, PARTY, CANDIDATE)
     return
 
 
-@router.get('/', response_model=List[schemas.PartyView])
-async def get_all_parties(db: Session = Depends(database.get_db)):
+@router.get('/', response_model=List[schemas.PartyView], dependencies=[Depends(conditional(PARTY))])
+async def get_all_parties(
+        response: Response, page: Page = Depends(), db: AsyncSession = Depends(database.get_async_db)
+):
     """
-        Retrieves all parties from the database.
+        Retrieves a page of parties from the database, ordered by ID.
 
         Args:
-            db (Session, optional): The database session to be used. Defaults to Depends(database.get_db).
+            response (Response): The response, which gets the cursor of the next page in its X-Next-Cursor header.
+            page (Page): The limit, the cursor and the streaming flag, see pagination.Page.
+            db (AsyncSession, optional): The database session to be used. Defaults to Depends(database.get_async_db).
 
         Returns:
-            List[schemas.PartyView]: A list of dictionaries containing details of all the parties in the database.
+            List[schemas.PartyView]: A list of dictionaries containing details of the parties, or a stream of all of them.
 
         Raises:
-            HTTPException: If there are no parties in the database.
+            HTTPException: 400 if the cursor is invalid.
     """
-    parties = db.query(models.Party).all()
-    return parties
+    return await paginate(db, select(models.Party), [models.Party.id], page, response, schemas.PartyView)
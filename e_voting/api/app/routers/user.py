@@ -2,20 +2,22 @@
 This module defines the API routes for managing the users in the system.
 
 Dependencies:
-    - uuid
     - typing.List
     - fastapi.APIRouter
     - fastapi.status
     - fastapi.Depends
     - fastapi.HTTPException
     - fastapi.security.OAuth2PasswordRequestForm
-    - sqlalchemy.orm.Session
+    - sqlalchemy.ext.asyncio.AsyncSession
     - ..schemas
     - ..database
     - ..models
     - ..utils
     - ..oauth
-    - random.randint
+    - ..hashing
+    - ..bulk
+    - ..roll
+    - ..eligibility
 
 Models:
     - User
@@ -28,20 +30,28 @@ Schemas:
     - UserProfile
 
 Functions:
-    - get_all_users(db: Session, admin_user: int) -> List[schemas.User]
-    - create_user(user: schemas.CreateVoter, db: Session) -> schemas.UserCreate
-    - get_user_profile(user_ID: int, form_data: OAuth2PasswordRequestForm) -> schemas.UserProfile
-    - update_user(userID: int, user: schemas.UpdateVoters, db: Session, found_user: models.User) -> schemas.User
-    - delete_user(userID: int, db: Session, user: models.User)
-    - get_user(user_ID: int, form_data: OAuth2PasswordRequestForm) -> schemas.User
+    - get_all_users(db: AsyncSession, admin_user: int) -> List[schemas.User]
+    - create_user(user: schemas.CreateVoter, db: AsyncSession) -> schemas.UserCreate
+    - get_user_profile(user_ID: int, db: AsyncSession, form_data: OAuth2PasswordRequestForm) -> schemas.UserProfile
+    - update_user(userID: int, user: schemas.UpdateVoters, db: AsyncSession, current_user: oauth.Principal) -> schemas.User
+    - import_users(request: Request, admin_user: int) -> dict
+    - get_import(job_id: str, admin_user: int) -> dict
+    - delete_user(userID: int, db: AsyncSession, user: models.User)
+    - get_user(user_ID: int, db: AsyncSession, form_data: OAuth2PasswordRequestForm) -> schemas.User
 
 Routes:
     - /users/ -> GET
-        Retrieve all users.
+        Retrieve a page of users, or stream them all, optionally filtered by state and LGA.
 
     - /users/register -> POST
         Register a new user.
 
+    - /users/bulk -> POST
+        Start importing a CSV or NDJSON voter roll.
+
+    - /users/bulk/{job_id} -> GET
+        Report the progress of a voter roll import.
+
     - /users/profile/{user_ID} -> GET
         Retrieve a user's profile.
 
@@ -55,13 +65,14 @@ Routes:
         Retrieve a user's information.
 """
 
-import uuid
-from typing import List
-from fastapi import APIRouter, status, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, status, Depends, HTTPException, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from .. import schemas, database, models, utils, oauth
-from random import randint
+from sqlalchemy import func, select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas, database, models, utils, oauth, bulk, roll, eligibility
+from ..hashing import hasher
+from ..pagination import Page, paginate
 
 
 router = APIRouter(tags=["Users"], prefix="/users")
@@ -69,35 +80,45 @@ router = APIRouter(tags=["Users"], prefix="/users")
 
 @router.get("/", response_model=List[schemas.User])
 async def get_all_users(
-        db: Session = Depends(database.get_db), admin_user: int = Depends(oauth.get_admin_user)
+        response: Response, state: Optional[str] = None, lga: Optional[str] = None, page: Page = Depends(),
+        db: AsyncSession = Depends(database.get_async_db), admin_user: int = Depends(oauth.get_admin_user)
 ):
     """
-        Retrieve all users.
+        Retrieve a page of users, ordered by ID. Users who have no VIN yet are left out, see serialization.project.
 
         Args:
-            db (Session): The database session.
+            response (Response): The response, which gets the cursor of the next page in its X-Next-Cursor header.
+            state (str, optional): Only return the users of this state, case-insensitively.
+            lga (str, optional): Only return the users of this LGA, case-insensitively.
+            page (Page): The limit, the cursor and the streaming flag, see pagination.Page.
+            db (AsyncSession): The database session.
             admin_user (int): The ID of the admin user who is making the request.
 
         Returns:
-            List[schemas.User]: A list of all users in the database.
+            List[schemas.User]: A list of users, or a stream of every matching user.
 
         Raises:
-            HTTPException: If the authenticated user is not an admin user.
+            HTTPException: If the authenticated user is not an admin user, or 400 if the cursor is invalid.
     """
-    users = db.query(models.User).all()
-    return users
+    U = models.User
+    qry = select(U)
+    if state is not None:
+        qry = qry.where(func.lower(U.state) == state.lower())
+    if lga is not None:
+        qry = qry.where(func.lower(U.lga) == lga.lower())
+    return await paginate(db, qry, [U.id], page, response, schemas.User)
 
 
 @router.post("/register", status_code=status.HTTP_201_CREATED, response_model=schemas.UserCreate)
 async def create_user(
-        user: schemas.CreateVoter, db: Session = Depends(database.get_db)
+        user: schemas.CreateVoter, db: AsyncSession = Depends(database.get_async_db)
 ):
     """
         Register a new user.
 
     Args:
         user (schemas.CreateVoter): The user information to create.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         schemas.UserCreate: The created user.
@@ -106,31 +127,79 @@ async def create_user(
         HTTPException: If a user with the same national identification number (NIN) already exists in the database.
 
     """
-    user_query = db.query(models.User).filter(models.User.nin == user.nin).first()
+    user_query = await db.scalar(select(models.User).where(models.User.nin == user.nin))
     if user_query:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail=f"User with nin {user.nin} already exists")
 
-    hashed_pwd = utils.hashed(user.password)
+    hashed_pwd = await hasher.hash(user.password)
     user.password = hashed_pwd
     new_user = models.User(**user.dict())
-    new_user.ward = randint(1, 10)
-    new_user.vin = uuid.uuid4().hex.upper()[:20]
+    new_user.ward = utils.new_ward()
+    new_user.vin = utils.new_vin()
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
+@router.post("/bulk", status_code=status.HTTP_202_ACCEPTED)
+async def import_users(request: Request, admin_user: int = Depends(oauth.get_admin_user)):
+    """
+        Start importing a voter roll.
+
+        The body is either CSV with a header line (Content-Type: text/csv) or NDJSON, one voter per line, with the
+        fields of schemas.CreateVoter. It is stored and processed in the background, GET /users/bulk/{job_id}
+        reports the progress.
+
+    Args:
+        request (Request): The upload request.
+        admin_user (int): The ID of the admin user who is making the request.
+
+    Returns:
+        dict: The report of the new import job.
+
+    Raises:
+        HTTPException: If the authenticated user is not an admin user.
+    """
+    upload = await bulk.spool(request.stream())
+    job = roll.start_import(upload, request.headers.get("content-type"))
+    return job.report()
+
+
+@router.get("/bulk/{job_id}")
+async def get_import(job_id: str, admin_user: int = Depends(oauth.get_admin_user)):
+    """
+        Report the progress of a voter roll import.
+
+    Args:
+        job_id (str): The ID returned by POST /users/bulk.
+        admin_user (int): The ID of the admin user who is making the request.
+
+    Returns:
+        dict: The status, the number of rows processed, registered and rejected, the throughput in rows per
+            second and the row number and reason of every rejection.
+
+    Raises:
+        HTTPException: If the job is unknown to this worker or the authenticated user is not an admin user.
+    """
+    job = roll.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No import job with id {job_id}")
+    return job.report()
+
+
 @router.get("/profile/{user_ID}", status_code=status.HTTP_200_OK, response_model=schemas.UserProfile)
 async def get_user_profile(
-        user_ID: int, form_data: OAuth2PasswordRequestForm = Depends(oauth.get_current_user)
+        user_ID: int, db: AsyncSession = Depends(database.get_async_db),
+        form_data: OAuth2PasswordRequestForm = Depends(oauth.get_current_user)
 ):
     """
         Retrieve a user's profile.
 
     Args:
         user_ID (int): The ID of the user to retrieve the profile for.
+        db (AsyncSession): The database session.
         form_data (OAuth2PasswordRequestForm): The OAuth2 form data for authentication.
 
     Returns:
@@ -140,14 +209,14 @@ async def get_user_profile(
         HTTPException: If the user making the request is not authenticated or authorized to retrieve the profile.
 
     """
-    user = utils.get_user_with_id(user_ID)
+    user = await utils.get_user_with_id(user_ID, db)
     return user
 
 
 @router.put("/{userID}/update", response_model=schemas.User)
 async def update_user(
-        userID: int, user: schemas.UpdateVoters, db: Session = Depends(database.get_db),
-        found_user: models.User = Depends(oauth.get_current_user)
+        userID: int, user: schemas.UpdateVoters, db: AsyncSession = Depends(database.get_async_db),
+        current_user: oauth.Principal = Depends(oauth.get_current_user)
 ):
     """
         Update a user's information.
@@ -155,8 +224,8 @@ async def update_user(
     Args:
         userID (int): The ID of the user to update.
         user (schemas.UpdateVoters): The updated user information.
-        db (Session): The database session.
-        found_user (models.User): The authenticated user making the request.
+        db (AsyncSession): The database session.
+        current_user (oauth.Principal): The authenticated user making the request.
 
     Returns:
         schemas.User: The updated user information.
@@ -166,25 +235,35 @@ async def update_user(
                     or the user with the specified ID does not exist.
 
     """
-    if found_user is None:
+    if current_user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"User with id {userID} not found")
-    found_user.update(user)
-    db.commit()
-    db.refresh(found_user)
+    found_user = await utils.get_user_with_id(current_user.id, db)
+    before = eligibility.snapshot(found_user)
+    data = utils.filter_nones(user.dict())
+    if "password" in data:
+        data["password"] = await hasher.hash(data["password"])
+        # sessions opened with the old password must log in again
+        await oauth.revoke_refresh_tokens(db, user_id=found_user.id)
+    for key, value in data.items():
+        setattr(found_user, key, value)
+    await eligibility.adjust(db, eligibility.moved(before, eligibility.snapshot(found_user)))
+    await db.commit()
+    oauth.invalidate_principal(found_user.id)
+    await db.refresh(found_user)
     return found_user
 
 
 @router.delete("/{userID}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(
-        userID: int, db: Session = Depends(database.get_db), user: models.User = Depends(oauth.get_admin_user)
+        userID: int, db: AsyncSession = Depends(database.get_async_db), user: models.User = Depends(oauth.get_admin_user)
 ):
     """
         Delete a user.
 
     Args:
         userID (int): The ID of the user to delete.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         user (models.User): The authenticated admin user making the request.
 
     Raises:
@@ -192,20 +271,27 @@ async def delete_user(
                     or the user with the specified ID does not exist.
 
     """
-    db.query(models.User).where(models.User.id == userID).delete()
-    db.commit()
+    U = models.User
+    deleted = (await db.execute(
+        delete(U).where(U.id == userID).returning(U.accredited, U.state, U.lga, U.ward)
+    )).all()
+    await eligibility.adjust(db, eligibility.changes([voter for voter in deleted if voter.accredited], -1))
+    await db.commit()
+    oauth.invalidate_principal(userID)
     return
 
 
 @router.get("/{userID}", status_code=status.HTTP_200_OK, response_model=schemas.User)
 async def get_user(
-        user_ID: int, form_data: OAuth2PasswordRequestForm = Depends(oauth.get_current_user)
+        user_ID: int, db: AsyncSession = Depends(database.get_async_db),
+        form_data: OAuth2PasswordRequestForm = Depends(oauth.get_current_user)
 ):
     """
         Retrieve a user's information.
 
     Args:
         user_ID (int): The ID of the user to retrieve the information for.
+        db (AsyncSession): The database session.
         form_data (OAuth2PasswordRequestForm): The OAuth2 form data for authentication.
 
     Returns:
@@ -215,5 +301,5 @@ async def get_user(
         HTTPException: If the user making the request is not authenticated or authorized to retrieve the user information.
 
     """
-    user = utils.get_user_with_id(user_ID)
+    user = await utils.get_user_with_id(user_ID, db)
     return user
@@ -2,11 +2,12 @@
 This module defines the API routes and endpoints for managing votes in an election.
 
 Routes:
-- POST /votes: Cast a vote in an election
-- GET /votes/{electionId}: Retrieve all votes for an election
+- POST /votes: Cast a vote in an election, replaying the stored response of a retried Idempotency-Key
+- POST /votes/bulk: Import a CSV or NDJSON upload of offline ballots (admin only)
+- GET /votes/{electionId}: Retrieve a page of the votes of an election, or stream them all
 
 Dependencies:
-- get_db: A function that returns a SQLAlchemy database session
+- get_async_db: A function that returns a SQLAlchemy async database session
 - oauth.get_current_user: A function that returns the current authenticated user
 
 Models:
@@ -35,11 +36,12 @@ Schemas:
 
 Functions:
 - vote: Cast a vote in an election
+- import_votes: Import a CSV or NDJSON upload of offline ballots
 - get_all_votes_for_election: Retrieve all votes for an election
 
 Args:
 - body: A Pydantic schema representing the body of a POST request to the /votes route
-- db: A SQLAlchemy database session, obtained from the get_db dependency
+- db: A SQLAlchemy async database session, obtained from the get_async_db dependency
 - user: A SQLAlchemy model representing the current authenticated user,
             obtained from the oauth.get_current_user dependency
 - electionId: An integer representing the ID of an election,
@@ -55,27 +57,36 @@ Raises:
         a user has already voted in an election, or when a request is unauthorized or forbidden.
 """
 
-from fastapi import APIRouter, status, Depends, HTTPException
-from ..database import get_db
-from sqlalchemy.orm import Session
-from .. import models, schemas, oauth
-from datetime import datetime
-from typing import List
+from fastapi import APIRouter, status, Depends, HTTPException, Header, Request, Response
+from fastapi.responses import JSONResponse
+from ..database import get_async_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas, oauth, ballot, bulk, cache, idempotency
+from ..tally import tally
+from ..ingest import writer
+from ..pagination import Page, paginate
+from typing import List, Optional
 
 
 votes_router = APIRouter(tags=["Votes"], prefix="/votes")
 
 
 @votes_router.post("", status_code=status.HTTP_201_CREATED, response_model=schemas.Vote)
-def vote(body: schemas.VoteCreate, db: Session = Depends(get_db),
-         user: models.User = Depends(oauth.get_current_user)):
+async def vote(body: schemas.VoteCreate, db: AsyncSession = Depends(get_async_db),
+               user: models.User = Depends(oauth.get_current_user),
+               idempotency_key: Optional[str] = Header(None, max_length=255)):
     """
        Cast a vote in an election.
 
+       When the request carries an Idempotency-Key header that the voter already used within the idempotency
+       window, the response of the first request is returned again without validating or recording anything.
+
        Args:
            body (schemas.VoteCreate): The details of the vote to be cast.
-           db (Session, optional): The database session. Defaults to Depends(get_db).
+           db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
            user (models.User, optional): The user casting the vote. Defaults to Depends(oauth.get_current_user).
+           idempotency_key (str, optional): The Idempotency-Key header. Defaults to None.
 
        Returns:
            models.Vote: The vote object that was created.
@@ -84,76 +95,110 @@ def vote(body: schemas.VoteCreate, db: Session = Depends(get_db),
            HTTPException:
                404 Not Found: If the election with the given ID does not exist.
                400 Bad Request: If the candidate with the given ID is not registered for this election.
-               403 Forbidden: If the election is closed, the user is not eligible to vote, or the user has already voted.
-               401 Unauthorized: If the user is not authenticated.
+               403 Forbidden: If the election is closed or not yet started, or the user has already voted.
+               401 Unauthorized: If the user is not authenticated or not eligible to vote in this election.
+               422 Unprocessable Entity: If the Idempotency-Key was first used for a different ballot.
+               503 Service Unavailable: If group commit is enabled and the ballot queue is full.
     """
-    election: models.Election = db.query(models.Election).where(
-        models.Election.id == body.electionId).first()
-    if not election:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"No Election with Id= {body.electionId}"
-        )
+    if idempotency_key:
+        replay = await _replay(db, user, idempotency_key, body)
+        if replay is not None:
+            return replay
+
+    if cache.is_closed(body.electionId):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Election is Closed!")
+    # election window, candidate membership and eligibility are checked against cached metadata,
+    # duplicate votes by the primary key of the votes table
+    election = await cache.get_election(db, body.electionId)
+    ballot.check_ballot(election, body, user)
+    try:
+        # the response is stored under the Idempotency-Key in the transaction of the vote
+        if writer.running:
+            vote_cast = await writer.submit(body, user, idempotency_key)
+        else:
+            vote_cast = await ballot.record_vote(db, body, user, idempotency_key)
+    except HTTPException:
+        # a concurrent retry with the same key may have recorded the ballot in the meantime
+        replay = idempotency_key and await _replay(db, user, idempotency_key, body)
+        if replay:
+            return replay
+        raise
+    tally.increment(vote_cast.electionId, vote_cast.candidateId, user.state, user.lga)
+    return vote_cast
 
-    # confirm election is still active
-    if election.end_date <= datetime.utcnow():
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Election is Closed!"
-        )
 
-    # confirm candidate is participating in the election
-    candidate_found = len(
-        tuple(filter(lambda c: c.id == body.candidateId, election.candidates)))
-    if not candidate_found:
+async def _replay(db: AsyncSession, user: models.User, key: str, body: schemas.VoteCreate):
+    """Return the stored response of an Idempotency-Key as a JSONResponse, or None if the key is new"""
+    stored = await idempotency.lookup(db, user.id, key)
+    if stored is None:
+        return None
+    status_code, response = stored
+    if (response["electionId"], response["candidateId"]) != (body.electionId, body.candidateId):
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Candidate is not registered for this election"
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different ballot"
         )
+    return JSONResponse(status_code=status_code, content=response)
 
-    # confirm voter is eligible to vote in this election
-    if not election.user_eligible(user=user):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="You are not eligible to vote in this election"
-        )
 
-    # confirm has not already voted
-    has_voted = db.query(models.Vote).where(
-        models.Vote.electionId == election.id, models.Vote.voterId == user.id
-    ).first()
-    if has_voted:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="multiple voting is not allowed"
-        )
+@votes_router.post("/bulk")
+async def import_votes(request: Request, db: AsyncSession = Depends(get_async_db),
+                       admin: models.User = Depends(oauth.get_admin_user)):
+    """
+       Import offline ballots uploaded by a polling unit.
 
-    # cast vote
-    vote_cast = models.Vote(voterId=user.id, electionId=election.id,
-                            candidateId=body.candidateId)
-    db.add(vote_cast)
-    db.commit()
-    db.refresh(vote_cast)
+       The body is either CSV with a header line (Content-Type: text/csv) or NDJSON, one ballot per line, with
+       the fields voterId, electionId, candidateId and optionally voted_at. The upload is streamed and processed in
+       chunks of `bulk_chunk_size` ballots, each committed on its own, so a failed upload can be sent again as a
+       whole: the ballots already recorded are then reported as duplicates.
 
-    return vote_cast
+       Args:
+           request (Request): The upload request.
+           db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
+           admin (models.User, optional): The current admin. Defaults to Depends(oauth.get_admin_user).
+
+       Returns:
+           dict: The number of accepted and rejected ballots, and the row number and reason of every rejection.
+
+       Raises:
+           HTTPException:
+               401 Unauthorized: If the user is not an admin.
+    """
+    accepted = 0
+    rejections = []
+    uploaded = bulk.iter_records(request.stream(), request.headers.get("content-type"))
+    async for records in bulk.chunks(uploaded):
+        ballots, rejected = await ballot.import_ballots(db, records)
+        for body, voter in ballots:
+            tally.increment(body.electionId, body.candidateId, voter.state, voter.lga)
+        accepted += len(ballots)
+        rejections.extend(rejected)
+    rejections.sort(key=lambda rejection: rejection["row"])
+    return {"accepted": accepted, "rejected": len(rejections), "rejections": rejections}
 
 
 @votes_router.get("/{electionId}", response_model=List[schemas.Vote])
-def get_all_votes_for_election(electionId: int, db: Session = Depends(get_db)):
+async def get_all_votes_for_election(electionId: int, response: Response, candidate_id: Optional[int] = None,
+                                     page: Page = Depends(), db: AsyncSession = Depends(get_async_db)):
     """
-    Retrieve all votes for an election.
+    Retrieve a page of the votes of an election, ordered by voter ID.
 
     Args:
         electionId (int): The ID of the election.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        response (Response): The response, which gets the cursor of the next page in its X-Next-Cursor header.
+        candidate_id (int, optional): Only return the votes for this candidate.
+        page (Page): The limit, the cursor and the streaming flag, see pagination.Page.
+        db (AsyncSession, optional): The database session. Defaults to Depends(get_async_db).
 
     Returns:
-        List[schemas.Vote]: A list of all votes for the election.
+        List[schemas.Vote]: A list of votes for the election, or a stream of all of them.
 
     Raises:
         HTTPException:
-            404 Not Found: If the election with the given ID does not exist.
+            400 Bad Request: If the cursor is invalid.
     """
-    votes = db.query(models.Vote).where(
-        models.Vote.electionId == electionId).all()
-    return votes
+    V = models.Vote
+    qry = select(V).where(V.electionId == electionId)
+    if candidate_id is not None:
+        qry = qry.where(V.candidateId == candidate_id)
+    return await paginate(db, qry, [V.voterId], page, response, schemas.Vote)
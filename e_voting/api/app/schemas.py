@@ -1,6 +1,6 @@
 from datetime import date, datetime
 from pydantic import BaseModel, EmailStr, validator, Field
-from typing import Optional
+from typing import List, Optional
 from fastapi import HTTPException, status
 
 
@@ -94,6 +94,30 @@ class Election(ElectionCreate):
         orm_mode = True
 
 
+class VoterLookup(BaseModel):
+    id: int
+    vin: Optional[str]
+    name: str
+    state: str
+    lga: str
+    ward: int
+    accredited: bool
+
+    class Config:
+        orm_mode = True
+
+
+class BulkAccreditation(BaseModel):
+    # accredit the voters if True, de-accredit them otherwise
+    accredited: bool = True
+    ids: Optional[List[int]]
+    vins: Optional[List[str]]
+    # selector, the voters matching all the given fields
+    ward: Optional[int]
+    state: Optional[str]
+    lga: Optional[str]
+
+
 class TokData(BaseModel):
     id: Optional[str] = None
 
@@ -102,6 +126,17 @@ class UserLogin(BaseModel):
     id: int
     name: str
     access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class TokenPair(BaseModel):
+    access_token: str
+    refresh_token: str
     token_type: str = "bearer"
 
 
@@ -111,7 +146,6 @@ class VoteCreate(BaseModel):
 
 
 class Vote(VoteCreate):
-    id: int
     voterId: int
     voted_at: datetime
 
@@ -0,0 +1,76 @@
+"""
+This module encodes large lists of rows to JSON without going through Pydantic.
+
+List endpoints declare their response schema, e.g. List[schemas.Candidate], which keeps the OpenAPI document
+accurate, but validating every ORM object against it and encoding the result through jsonable_encoder costs far more
+CPU than the query on large pages and streams. Instead, the list query is projected onto the columns of the schema's
+fields, so no ORM object is built, and the resulting rows are encoded straight to bytes with orjson, which produces
+the same JSON for the column types used by the schemas: integers, strings, booleans, dates and datetimes.
+
+Since the rows skip validation, every field of the schema must be read from a column of the entity: a field the
+entity does not map is a mistake in the schema, reported when the query is built rather than as a silently different
+JSON document. A required field backed by a nullable column, such as User.vin before accreditation, makes the query
+skip the rows where the column is NULL, which the schema could not represent, so every item still validates.
+
+Classes:
+
+    Projection: the columns a schema is read from, and the encoding of rows selected through them.
+
+Functions:
+
+    project: projects a list query onto the fields of a schema.
+"""
+import orjson
+from pydantic import BaseModel
+from sqlalchemy import Select, inspect
+
+
+class Projection:
+    """The fields of a schema as columns of a query, followed by the extra columns the caller needs"""
+
+    __slots__ = ("stmt", "names", "extra")
+
+    def __init__(self, stmt: Select, names: tuple, extra: int):
+        self.stmt = stmt
+        self.names = names
+        self.extra = extra
+
+    def extras(self, row):
+        """Return the values of the extra columns of a row"""
+        return list(row[len(row) - self.extra:]) if self.extra else []
+
+    def dumps(self, rows):
+        """Encode rows as a JSON array of objects"""
+        return orjson.dumps([dict(zip(self.names, row)) for row in rows])
+
+    def dumps_items(self, rows):
+        """Encode rows as JSON objects separated by commas, to be written inside an array"""
+        return b",".join(orjson.dumps(dict(zip(self.names, row))) for row in rows)
+
+
+def project(stmt: Select, schema: BaseModel, extra: list = ()):
+    """
+        Project a query selecting one entity onto the columns of a schema's fields.
+
+        Args:
+            stmt (Select): The query, selecting a single ORM entity.
+            schema (BaseModel): The schema of the items.
+            extra (list, optional): Columns to select after the fields, e.g. the sort keys of a page.
+
+        Returns:
+            Projection: The projected query, without the rows that hold NULL in a required field, and the names of the
+                fields it selects.
+
+        Raises:
+            ValueError: If a field of the schema is not a column of the entity.
+    """
+    entity = stmt.column_descriptions[0]["entity"]
+    mapped = inspect(entity).column_attrs
+    names = tuple(schema.__fields__)
+    for name, field in schema.__fields__.items():
+        if name not in mapped:
+            raise ValueError(f"{schema.__name__}.{name} is not a column of {entity.__name__}")
+        if not field.allow_none and any(column.nullable for column in mapped[name].columns):
+            stmt = stmt.where(getattr(entity, name).is_not(None))
+    columns = [getattr(entity, name) for name in names]
+    return Projection(stmt.with_only_columns(*columns, *extra), names, len(extra))
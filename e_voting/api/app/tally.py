@@ -0,0 +1,227 @@
+"""
+This module keeps models.Candidates.total_votes and the election_stats aggregate table up to date without touching
+either table on every vote.
+
+Each worker process accumulates vote increments in memory, keyed by (electionId, candidateId) and broken down by the
+voter's state and LGA, in a small number of lock-protected shards so that concurrent requests rarely contend on the
+same lock. A background task periodically drains the shards and applies them in one transaction: a batched UPDATE of
+the candidates table and a batched upsert of election_stats. Reads combine the persisted values with the increments
+that have not been flushed yet.
+
+Because a crash loses whatever has not been flushed, both tables can be reconciled against the votes table with
+`python -m e_voting.api.app.manage reconcile`. Workers never do it on their own: the reconciliation overwrites totals
+that other live workers may still be adding unflushed increments to, so it runs once per deployment, before workers
+start taking votes.
+
+Classes:
+
+    TallyCounter: the sharded in-memory counters together with the flush and reconcile logic.
+
+Constants:
+
+    tally: the TallyCounter instance shared by the worker process.
+"""
+import asyncio
+import logging
+import threading
+from collections import Counter, defaultdict
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .database import session_scope, insert as upsert
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+SHARDS = 8
+
+
+def region(state: str, lga: str):
+    """Normalise a voter's state and LGA into the key used by election_stats"""
+    return models.normalise_region(state), models.normalise_region(lga)
+
+
+class TallyCounter:
+    """Sharded in-process vote counters with a periodic flush to candidates.total_votes and election_stats"""
+
+    def __init__(self, shards: int = SHARDS):
+        self._shards = [defaultdict(Counter) for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def _shard(self, key):
+        return hash(key) % len(self._shards)
+
+    def increment(self, election_id: int, candidate_id: int, state: str, lga: str, count: int = 1):
+        """Record `count` new votes for a candidate from voters of the given state and LGA"""
+        key = (election_id, candidate_id)
+        i = self._shard(key)
+        with self._locks[i]:
+            self._shards[i][key][region(state, lga)] += count
+
+    def pending(self, election_id: int = None):
+        """
+            Return the unflushed increments.
+
+            Args:
+                election_id (int, optional): Only return increments for this election.
+
+            Returns:
+                dict: A mapping of (electionId, candidateId) to a Counter of unflushed votes per (state, lga).
+        """
+        result = {}
+        for lock, shard in zip(self._locks, self._shards):
+            with lock:
+                for key, regions in shard.items():
+                    if election_id is None or key[0] == election_id:
+                        result[key] = Counter(regions)
+        return result
+
+    def drain(self):
+        """Remove and return every unflushed increment"""
+        drained = defaultdict(Counter)
+        for i, lock in enumerate(self._locks):
+            with lock:
+                shard, self._shards[i] = self._shards[i], defaultdict(Counter)
+            for key, regions in shard.items():
+                drained[key].update(regions)
+        return drained
+
+    def restore(self, drained: dict):
+        """Put back increments that could not be flushed"""
+        for (election_id, candidate_id), regions in drained.items():
+            for (state, lga), count in regions.items():
+                self.increment(election_id, candidate_id, state, lga, count)
+
+    async def flush(self, db: AsyncSession):
+        """
+            Apply the unflushed increments to candidates.total_votes and election_stats in one transaction.
+
+            Args:
+                db (AsyncSession): The database session.
+
+            Returns:
+                int: The number of candidates updated.
+        """
+        drained = self.drain()
+        if not drained:
+            return 0
+
+        # Core statements on the tables, so that the lists of parameters run as plain executemany
+        C, S = models.Candidates.__table__, models.ElectionStats.__table__
+        totals = update(C).where(C.c.id == bindparam("cid")).values(total_votes=C.c.total_votes + bindparam("delta"))
+        stats = upsert(S)
+        stats = stats.on_conflict_do_update(
+            index_elements=[S.c.election_id, S.c.candidate_id, S.c.state, S.c.lga],
+            set_={"votes": S.c.votes + stats.excluded.votes}
+        )
+        try:
+            await db.execute(totals, [
+                {"cid": candidate_id, "delta": sum(regions.values())}
+                for (_, candidate_id), regions in drained.items()
+            ])
+            await db.execute(stats, [
+                {"election_id": election_id, "candidate_id": candidate_id, "state": state, "lga": lga, "votes": count}
+                for (election_id, candidate_id), regions in drained.items()
+                for (state, lga), count in regions.items()
+            ])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self.restore(drained)
+            raise
+        return len(drained)
+
+    async def reconcile(self, db: AsyncSession):
+        """
+            Rebuild candidates.total_votes and election_stats from the votes table.
+
+            Only run it while no worker holds unflushed increments, see the manage module.
+
+            Args:
+                db (AsyncSession): The database session.
+        """
+        C, V, U, S = models.Candidates, models.Vote, models.User, models.ElectionStats
+        counted = select(func.count()).where(V.candidateId == C.id).scalar_subquery()
+        await db.execute(
+            update(C).where(C.total_votes != counted).values(total_votes=counted)
+            .execution_options(synchronize_session=False)
+        )
+
+        state, lga = models.normalise_region_sql(U.state), models.normalise_region_sql(U.lga)
+        await db.execute(delete(S).execution_options(synchronize_session=False))
+        await db.execute(insert(S).from_select(
+            ["election_id", "candidate_id", "state", "lga", "votes"],
+            select(V.electionId, V.candidateId, state, lga, func.count())
+            .join(U, U.id == V.voterId)
+            .group_by(V.electionId, V.candidateId, state, lga)
+        ))
+        await db.commit()
+
+    async def totals(self, db: AsyncSession, election_id: int):
+        """
+            Return the live vote count of every candidate in an election.
+
+            Args:
+                db (AsyncSession): The database session.
+                election_id (int): The election.
+
+            Returns:
+                dict: A mapping of candidate ID to the persisted total plus unflushed increments.
+        """
+        C = models.Candidates
+        rows = (await db.execute(select(C.id, C.total_votes).where(C.election_id == election_id))).all()
+        result = {candidate_id: total for candidate_id, total in rows}
+        for (_, candidate_id), regions in self.pending(election_id).items():
+            result[candidate_id] = result.get(candidate_id, 0) + sum(regions.values())
+        return result
+
+    async def regional_totals(self, db: AsyncSession, election_id: int):
+        """
+            Return the live vote count of every candidate in an election broken down by state and LGA.
+
+            Args:
+                db (AsyncSession): The database session.
+                election_id (int): The election.
+
+            Returns:
+                collections.Counter: A mapping of (candidateId, state, lga) to the persisted count plus
+                    unflushed increments.
+        """
+        S = models.ElectionStats
+        rows = (await db.execute(
+            select(S.candidate_id, S.state, S.lga, S.votes).where(S.election_id == election_id)
+        )).all()
+        result = Counter({(candidate_id, state, lga): votes for candidate_id, state, lga, votes in rows})
+        for (_, candidate_id), regions in self.pending(election_id).items():
+            for (state, lga), count in regions.items():
+                result[(candidate_id, state, lga)] += count
+        return result
+
+    def total_for(self, candidate: models.Candidates):
+        """Return the persisted total of an already loaded candidate plus its unflushed increments"""
+        key = (candidate.election_id, candidate.id)
+        i = self._shard(key)
+        with self._locks[i]:
+            regions = self._shards[i].get(key)
+            unflushed = sum(regions.values()) if regions else 0
+        return candidate.total_votes + unflushed
+
+    async def _flush_now(self):
+        async with session_scope() as db:
+            return await self.flush(db)
+
+    async def run(self, interval: float = None):
+        """Flush the counters every `interval` seconds until cancelled, then flush one last time"""
+        interval = interval or settings.tally_flush_interval_seconds
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self._flush_now()
+                except Exception:
+                    logger.exception("Failed to flush vote tallies, retrying in %s seconds", interval)
+        finally:
+            await self._flush_now()
+
+
+tally = TallyCounter()
@@ -0,0 +1,135 @@
+"""
+This module implements the admission control of the login endpoints.
+
+Every login attempt costs a bcrypt verification, wrong passwords included, so a burst of bad attempts could keep the
+password hashing workers busy and starve real voters. Before doing any work, a login attempt must get a token from
+three token buckets and a slot among `login_max_in_flight` concurrent logins. Attempts that do not are answered at
+once with 429 Too Many Requests and a Retry-After header. The buckets are:
+
+    per client IP: caps what one client can try across all accounts.
+    per client IP and account: the strict one, a handful of guesses at one account from one client.
+    per account: a much larger burst, which only caps guessing at one account spread over many clients. It is kept
+        large on purpose, since anybody can spend it, so that an attacker cannot lock a voter out of their account.
+
+The buckets live in memory, per worker process, in LRU-bounded tables so that a flood of distinct keys cannot
+exhaust memory. Forgetting an idle key is harmless since a new bucket starts full anyway.
+
+Metrics:
+
+    login_throttled_ip: counter of attempts refused by the per-IP bucket.
+    login_throttled_client_account: counter of attempts refused by the per-IP-and-account bucket.
+    login_throttled_account: counter of attempts refused by the per-account bucket.
+    login_throttled_busy: counter of attempts refused because too many logins were in flight.
+    logins_in_flight: gauge of the logins being processed.
+
+Classes:
+
+    TokenBucketLimiter: a table of token buckets keyed by client IP, account, or both.
+    LoginGate: the three limiters together with the concurrency cap.
+
+Constants:
+
+    login_gate: the LoginGate instance shared by the worker process.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
+from .config import settings
+from .metrics import metrics
+
+
+class TokenBucketLimiter:
+    """Token buckets refilled at `rate` tokens per second up to `burst` tokens, one per key"""
+
+    def __init__(self, rate: float, burst: int, maxsize: int):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """
+            Take a token from the bucket of `key`.
+
+            Returns:
+                float: 0 if a token was taken, otherwise the number of seconds until one is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def too_many_requests(retry_after: float):
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many login attempts, try again later",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class LoginGate:
+    """Per-IP, per-IP-and-account and per-account token buckets and a cap on concurrent logins"""
+
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.by_ip = TokenBucketLimiter(
+            settings.login_ip_rate_per_minute / 60, settings.login_ip_burst, settings.login_throttle_max_keys
+        )
+        self.by_client_account = TokenBucketLimiter(
+            settings.login_account_rate_per_minute / 60, settings.login_account_burst, settings.login_throttle_max_keys
+        )
+        self.by_account = TokenBucketLimiter(
+            settings.login_account_global_rate_per_minute / 60, settings.login_account_global_burst,
+            settings.login_throttle_max_keys
+        )
+        self._in_flight = 0
+        metrics.gauge("logins_in_flight", lambda: self._in_flight)
+
+    @asynccontextmanager
+    async def admit(self, ip: str, account: str):
+        """
+            Admit a login attempt, or refuse it before any work is done.
+
+            Args:
+                ip (str): The client IP.
+                account (str): The email or admin ID the attempt is for.
+
+            Raises:
+                HTTPException: 429 if the IP, the IP for this account, or the account ran out of attempts, or too
+                    many logins are in flight.
+        """
+        if self._in_flight >= self.max_in_flight:
+            metrics.inc("login_throttled_busy")
+            raise too_many_requests(1)
+        account = account.strip().lower()
+        for limiter, key, metric in (
+            (self.by_ip, ip, "login_throttled_ip"),
+            (self.by_client_account, (ip, account), "login_throttled_client_account"),
+            (self.by_account, account, "login_throttled_account"),
+        ):
+            wait = limiter.acquire(key)
+            if wait:
+                metrics.inc(metric)
+                raise too_many_requests(wait)
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+
+
+login_gate = LoginGate(settings.login_max_in_flight)
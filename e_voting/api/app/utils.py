@@ -1,9 +1,10 @@
-from fastapi import Depends, HTTPException, status, UploadFile
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from e_voting.api.app import database, models
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import uuid
+from random import randint
+from fastapi import HTTPException, status, UploadFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from e_voting.api.app import models
+from e_voting.api.app.hashing import pwd_context
 
 
 def filter_nones(body):
@@ -18,7 +19,18 @@ def filter_nones(body):
     return result
 
 
+def new_vin():
+    """Generate a voter identification number"""
+    return uuid.uuid4().hex.upper()[:20]
+
+
+def new_ward():
+    """Assign a voter to a ward"""
+    return randint(1, 10)
+
+
 def hashed(password: str):
+    # blocks for the whole bcrypt computation, request handlers await hashing.hasher instead
     return pwd_context.hash(password)
 
 
@@ -27,9 +39,8 @@ def verify(attempted_password, usr_password):
 
 
 # print(hashed("12345pass"))
-def get_user_with_id(user_id, db: Session = Depends(database.get_db)):
-    found_user = db.query(models.User).filter(models.User.id == user_id)
-    is_found = found_user.first()
+async def get_user_with_id(user_id, db: AsyncSession):
+    is_found = await db.scalar(select(models.User).where(models.User.id == int(user_id)))
     if not is_found:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return is_found
@@ -0,0 +1,67 @@
+"""
+Shared fixtures of the test suite.
+
+The application reads its settings and creates its engines at import time, so the environment is set up here before
+anything from e_voting is imported: the tests run against a throwaway SQLite database whose tables are created from
+the models, and emptied, together with every in-process cache, before each test.
+"""
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="e_voting_tests_")
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOK_EXPIRE_MINUTES", "30")
+os.environ.setdefault("CLOUDINARY_CLOUD_NAME", "test")
+os.environ.setdefault("CLOUDINARY_API_KEY", "test")
+os.environ.setdefault("CLOUDINARY_API_SECRET", "test")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from e_voting.api.app import cache, conditional, idempotency, lifecycle, models, oauth, throttle  # noqa: E402
+from e_voting.api.app.database import SessionLocal, engine  # noqa: E402
+from e_voting.api.app.main import app  # noqa: E402
+from e_voting.api.app.tally import tally  # noqa: E402
+
+models.Base.metadata.create_all(bind=engine)
+
+
+def _reset_memory():
+    cache.invalidate_elections()
+    cache.closed.clear()
+    oauth.principals.clear()
+    idempotency.responses.clear()
+    tally.drain()
+    lifecycle.scheduler.opened.clear()
+    lifecycle.scheduler.snapshots.clear()
+    lifecycle.scheduler.closed_through = None
+    conditional.versions._versions.clear()
+    for limiter in (throttle.login_gate.by_ip, throttle.login_gate.by_client_account, throttle.login_gate.by_account):
+        limiter._buckets.clear()
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    with engine.begin() as connection:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+    _reset_memory()
+    yield
+    _reset_memory()
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,109 @@
+"""
+Helpers inserting the rows a test needs straight into the database, and authenticating as a user.
+"""
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event
+from e_voting.api.app import models, oauth
+from e_voting.api.app.database import AsyncSessionLocal, async_engine, engine
+from e_voting.api.app.hashing import pwd_context
+
+PASSWORD = "password123"
+# hashing the same password once keeps the fixtures fast, bcrypt is slow on purpose
+PASSWORD_HASH = pwd_context.hash(PASSWORD)
+
+_serial = iter(range(1, 10 ** 9))
+
+
+def make_user(db, **fields):
+    """Insert a voter, accredited in Lagos/Ikeja unless told otherwise"""
+    n = next(_serial)
+    values = dict(
+        name=f"Voter {n}", email=f"voter{n}@example.com", nin=f"{n:011d}", dob="1990-01-01",
+        gender="F", mobile_no=f"080{n:08d}", address="1 Main Street", state="Lagos", lga="Ikeja", ward=1,
+        vin=f"VIN{n:010d}", password=PASSWORD_HASH, accredited=True,
+    )
+    values.update(fields)
+    user = models.User(**values)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def make_admin(db, **fields):
+    return make_user(db, role="admin", admin_id=f"adm{next(_serial)}", **fields)
+
+
+def make_party(db, name=None):
+    n = next(_serial)
+    party = models.Party(
+        name=name or f"P{n}", fullname=f"Party {n}", ideology="centre", party_chairman="Chair",
+        party_logo_url=f"https://example.com/{n}.png"
+    )
+    db.add(party)
+    db.commit()
+    db.refresh(party)
+    return party
+
+
+def make_election(db, state=None, lga=None, starts=-1, ends=1):
+    """Insert an election starting and ending the given number of hours from now"""
+    now = datetime.now(timezone.utc)
+    election = models.Election(
+        title=f"Election {next(_serial)}", state=state, lga=lga,
+        start_date=now + timedelta(hours=starts), end_date=now + timedelta(hours=ends)
+    )
+    db.add(election)
+    db.commit()
+    db.refresh(election)
+    return election
+
+
+def make_candidate(db, election, party=None):
+    party = party or make_party(db)
+    candidate = models.Candidates(
+        name=f"Candidate {next(_serial)}", party_name=party.name, position="Governor", state="Lagos",
+        ideology="centre", election_id=election.id
+    )
+    db.add(candidate)
+    db.commit()
+    db.refresh(candidate)
+    return candidate
+
+
+def auth(user):
+    """Return the Authorization header of a user"""
+    return {"Authorization": f"Bearer {oauth.create_access_token({'user_id': user.id})}"}
+
+
+@contextmanager
+def statements(target=None):
+    """Collect the SQL statements sent through an engine, by default both, with "COMMIT" for commits"""
+    targets = [target] if target else [engine, async_engine.sync_engine]
+    sent = []
+
+    def on_execute(conn, cursor, statement, *args):
+        sent.append(statement)
+
+    def on_commit(conn):
+        sent.append("COMMIT")
+
+    for target in targets:
+        event.listen(target, "before_cursor_execute", on_execute)
+        event.listen(target, "commit", on_commit)
+    try:
+        yield sent
+    finally:
+        for target in targets:
+            event.remove(target, "before_cursor_execute", on_execute)
+            event.remove(target, "commit", on_commit)
+
+
+def run(work):
+    """Run `work(session)` on a new AsyncSession in its own event loop and return its result"""
+    async def scoped():
+        async with AsyncSessionLocal() as session:
+            return await work(session)
+    return asyncio.run(scoped())
@@ -0,0 +1,71 @@
+import json
+
+from e_voting.api.app import models
+from tests.factories import auth, make_admin, make_candidate, make_election, make_user
+
+
+def test_metrics_are_for_admins(client, db):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=auth(make_user(db))).status_code == 401
+    response = client.get("/metrics", headers=auth(make_admin(db)))
+    assert response.status_code == 200
+    assert set(response.json()) == {"counters", "gauges", "summaries"}
+
+
+def test_csv_import(client, db):
+    admin = make_admin(db)
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+    voters = [make_user(db) for _ in range(3)]
+    upload = "voterId,electionId,candidateId\n" + "".join(
+        f"{voter.id},{election.id},{candidate.id}\n" for voter in voters
+    ) + f"{voters[0].id},{election.id},{candidate.id}\n" + f"999999,{election.id},{candidate.id}\n"
+
+    response = client.post(
+        "/votes/bulk", content=upload, headers={**auth(admin), "Content-Type": "text/csv"}
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["accepted"], body["rejected"]) == (3, 2)
+    assert body["rejections"] == [
+        {"row": 4, "reason": "multiple voting is not allowed"},
+        {"row": 5, "reason": "Voter not found"},
+    ]
+    assert db.query(models.Vote).count() == 3
+
+
+def test_ndjson_import_reports_every_rejection(client, db):
+    admin = make_admin(db)
+    election = make_election(db)
+    ended = make_election(db, starts=-2, ends=-1)
+    candidate = make_candidate(db, election)
+    voter, outsider = make_user(db), make_user(db, accredited=False)
+    db.add(models.Vote(voterId=voter.id, electionId=election.id, candidateId=candidate.id))
+    db.commit()
+    lines = [
+        {"voterId": voter.id, "electionId": election.id, "candidateId": candidate.id},
+        {"voterId": outsider.id, "electionId": election.id, "candidateId": candidate.id},
+        {"voterId": make_user(db).id, "electionId": ended.id, "candidateId": candidate.id},
+        {"voterId": voter.id, "electionId": election.id},
+        {"voterId": make_user(db).id, "electionId": election.id, "candidateId": candidate.id,
+         "voted_at": "2026-01-01T10:00:00"},
+    ]
+
+    response = client.post(
+        "/votes/bulk", content="\n".join(json.dumps(line) for line in lines), headers=auth(admin)
+    )
+
+    body = response.json()
+    assert body["accepted"] == 0
+    assert [rejection["reason"].split(":")[0] for rejection in body["rejections"]] == [
+        "multiple voting is not allowed",
+        "You are not eligible to vote in this election",
+        "Election is Closed!",
+        "Malformed row",
+        "Malformed row",
+    ]
+
+
+def test_import_is_for_admins(client, db):
+    assert client.post("/votes/bulk", content="", headers=auth(make_user(db))).status_code == 401
@@ -0,0 +1,46 @@
+from e_voting.api.app import models
+from tests.factories import auth, make_candidate, make_election, make_user
+
+
+def test_candidate_votes_lists_the_votes_and_the_live_count(client, db):
+    election = make_election(db)
+    candidate, other = make_candidate(db, election), make_candidate(db, election)
+    voters = [make_user(db) for _ in range(3)]
+    for voter in voters[:2]:
+        assert client.post(
+            "/votes", json={"electionId": election.id, "candidateId": candidate.id}, headers=auth(voter)
+        ).status_code == 201
+    db.add(models.Vote(voterId=voters[2].id, electionId=election.id, candidateId=other.id))
+    db.commit()
+
+    body = client.get(f"/candidates/{candidate.id}/votes").json()
+
+    assert set(body) == {"election", "votes", "total_votes"}
+    assert body["election"] == election.id
+    assert sorted(vote["voterId"] for vote in body["votes"]) == [voter.id for voter in voters[:2]]
+    assert {vote["candidateId"] for vote in body["votes"]} == {candidate.id}
+    assert body["total_votes"] == 2
+
+
+def test_candidate_votes_are_paged(client, db):
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+    voters = [make_user(db) for _ in range(5)]
+    db.add_all(models.Vote(voterId=voter.id, electionId=election.id, candidateId=candidate.id) for voter in voters)
+    db.query(models.Candidates).update({"total_votes": 5})
+    db.commit()
+
+    first = client.get(f"/candidates/{candidate.id}/votes", params={"limit": 3})
+    second = client.get(
+        f"/candidates/{candidate.id}/votes", params={"limit": 3, "after": first.headers["X-Next-Cursor"]}
+    )
+
+    assert [vote["voterId"] for vote in first.json()["votes"]] == [voter.id for voter in voters[:3]]
+    assert [vote["voterId"] for vote in second.json()["votes"]] == [voter.id for voter in voters[3:]]
+    assert "X-Next-Cursor" not in second.headers
+    assert first.json()["total_votes"] == second.json()["total_votes"] == 5
+    assert client.get(f"/candidates/{candidate.id}/votes", params={"stream": "true"}).status_code == 400
+
+
+def test_candidate_votes_of_unknown_candidate(client):
+    assert client.get("/candidates/999/votes").status_code == 404
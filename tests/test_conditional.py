@@ -0,0 +1,41 @@
+from sqlalchemy import update
+from e_voting.api.app import models
+from e_voting.api.app.conditional import PARTY, versions
+from tests.factories import auth, make_admin, make_party, run
+
+
+def test_unchanged_list_is_not_modified(client, db):
+    make_party(db)
+
+    response = client.get("/party/")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200 and response.headers["Cache-Control"].startswith("public, max-age=")
+
+    revalidated = client.get("/party/", headers={"If-None-Match": etag})
+    assert (revalidated.status_code, revalidated.content, revalidated.headers["ETag"]) == (304, b"", etag)
+    assert client.get("/party/", headers={"If-None-Match": f'W/{etag}, "other"'}).status_code == 304
+
+
+def test_write_changes_the_etag(client, db):
+    party = make_party(db)
+    etag = client.get("/party/").headers["ETag"]
+
+    assert client.delete(f"/party/{party.id}", headers=auth(make_admin(db))).status_code == 204
+
+    response = client.get("/party/", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json() == []
+    assert response.headers["ETag"] != etag
+    assert db.get(models.EntityVersion, PARTY).version == 1
+
+
+def test_reload_picks_up_the_writes_of_other_workers(client, db):
+    run(lambda session: versions.bump(session, PARTY))
+    etag = client.get("/party/").headers["ETag"]
+
+    # another worker bumped the version
+    db.execute(update(models.EntityVersion).where(models.EntityVersion.entity == PARTY).values(version=5))
+    db.commit()
+    run(versions.reload)
+
+    assert client.get("/party/", headers={"If-None-Match": etag}).status_code == 200
+    assert versions.current([PARTY]) == (5,)
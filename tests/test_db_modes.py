@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from e_voting.api.app import models
+from e_voting.api.app.config import settings
+from e_voting.api.app.database import SessionLocal
+from tests.factories import auth, make_admin, make_candidate, make_user
+
+
+@pytest.fixture(params=["async", "sync"])
+def mode(request, monkeypatch):
+    monkeypatch.setattr(settings, "db_mode", request.param)
+    return request.param
+
+
+def test_routes_work_in_both_modes(mode, client, db):
+    admin = make_admin(db)
+    now = datetime.now(timezone.utc)
+    response = client.post("/elections", headers=auth(admin), json={
+        "title": "Governorship", "start_date": (now - timedelta(hours=1)).isoformat(),
+        "end_date": (now + timedelta(hours=1)).isoformat(),
+    })
+    assert response.status_code == 201
+    election = response.json()
+    assert election["id"] and election["created_at"]
+
+    candidate = make_candidate(db, db.get(models.Election, election["id"]))
+    assert client.get(f"/elections/{election['id']}").json()["title"] == "Governorship"
+    voter = make_user(db)
+    response = client.post(
+        "/votes", json={"electionId": election["id"], "candidateId": candidate.id}, headers=auth(voter)
+    )
+    assert response.status_code == 201
+    assert [vote["voterId"] for vote in client.get(f"/votes/{election['id']}").json()] == [voter.id]
+
+
+def test_sync_sessions_keep_objects_loaded_after_commit(db):
+    voter = make_user(db)
+    session = SessionLocal()
+    try:
+        user = session.get(models.User, voter.id)
+        session.commit()
+        assert "name" in user.__dict__
+    finally:
+        session.close()
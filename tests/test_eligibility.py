@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+from e_voting.api.app import ballot, eligibility, manage, models, schemas
+from e_voting.api.app.main import app
+from tests.factories import auth, make_candidate, make_election, make_user, run
+
+
+def counts(db, election):
+    return run(lambda session: eligibility.eligible_counts(session, election.id))
+
+
+def test_rebuild_and_adjust_normalise_alike(db):
+    election = make_election(db, state="Lagos")
+    voter = make_user(db, state=" LAGOS ", lga="Ikeja ")
+    make_user(db, state="Kano", lga="Nassarawa")
+
+    run(lambda session: eligibility.rebuild(session, election.id))
+    assert counts(db, election) == {("lagos", "ikeja"): 1}
+
+    async def move(session):
+        await eligibility.adjust(session, eligibility.moved(eligibility.snapshot(voter), None))
+        await session.commit()
+    run(move)
+
+    assert db.query(models.ElectionEligibility.voters).scalar() == 0
+
+
+def test_rebuild_skips_unaccredited_and_ended_elections(db):
+    running, ended = make_election(db), make_election(db, starts=-2, ends=-1)
+    make_user(db)
+    make_user(db, accredited=False)
+
+    run(eligibility.rebuild)
+
+    assert counts(db, running) == {("lagos", "ikeja"): 1}
+    assert counts(db, ended) == {}
+
+
+def test_startup_does_not_rebuild(db):
+    election = make_election(db)
+    make_user(db)
+
+    with TestClient(app):
+        pass
+    assert counts(db, election) == {}
+
+    manage.main(["rebuild-eligibility"])
+    assert counts(db, election) == {("lagos", "ikeja"): 1}
+
+
+def test_padded_region_is_counted_and_can_vote(client, db):
+    state_election, lga_election = make_election(db, state="Lagos "), make_election(db, lga=" IKEJA")
+    voters = [make_user(db, state=" lagos ", lga="Ikeja  ") for _ in range(2)]
+    run(eligibility.rebuild)
+
+    assert counts(db, state_election) == counts(db, lga_election) == {("lagos", "ikeja"): 2}
+    # through the cached checks of POST /votes and through the single statement of ballot.cast_vote
+    candidate = make_candidate(db, state_election)
+    assert client.post(
+        "/votes", json={"electionId": state_election.id, "candidateId": candidate.id}, headers=auth(voters[0])
+    ).status_code == 201
+    body = schemas.VoteCreate(electionId=lga_election.id, candidateId=make_candidate(db, lga_election).id)
+    assert run(lambda session: ballot.cast_vote(session, body, voters[1])).voterId == voters[1].id
@@ -0,0 +1,79 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from e_voting.api.app import ballot, models, schemas
+from e_voting.api.app.config import settings
+from e_voting.api.app.main import app
+from e_voting.api.app.metrics import metrics
+from tests.factories import auth, make_candidate, make_election, make_user, run, statements
+
+
+def test_batch_is_one_insert_and_one_diagnostic_query(db):
+    election = make_election(db, state="Lagos")
+    ended = make_election(db, starts=-2, ends=-1)
+    candidate, stale = make_candidate(db, election), make_candidate(db, ended)
+    voters = [make_user(db) for _ in range(4)]
+    outsider = make_user(db, state="Kano", lga="Nassarawa")
+    db.add(models.Vote(voterId=voters[3].id, electionId=election.id, candidateId=candidate.id))
+    db.commit()
+
+    def ballot_of(target, choice):
+        return schemas.VoteCreate(electionId=target.id, candidateId=choice.id)
+
+    ballots = [
+        (ballot_of(election, candidate), voters[0]),
+        (ballot_of(election, candidate), voters[0]),
+        (ballot_of(ended, stale), voters[1]),
+        (ballot_of(election, stale), voters[2]),
+        (ballot_of(election, candidate), outsider),
+        (ballot_of(election, candidate), voters[3]),
+        (schemas.VoteCreate(electionId=999, candidateId=candidate.id), voters[2]),
+    ]
+    with statements() as sent:
+        results = run(lambda session: ballot.cast_votes(session, ballots))
+
+    assert results[0].voterId == voters[0].id
+    assert [(error.status_code, error.detail[:20]) for error in results[1:]] == [
+        (403, "multiple voting is n"),
+        (403, "Election is Closed!"),
+        (400, "Candidate is not reg"),
+        (401, "You are not eligible"),
+        (403, "multiple voting is n"),
+        (404, "No Election with Id="),
+    ]
+    assert [statement.split()[0] for statement in sent] == ["INSERT", "COMMIT", "SELECT"]
+
+
+def test_accepted_batch_skips_the_diagnosis(db):
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+    ballots = [(schemas.VoteCreate(electionId=election.id, candidateId=candidate.id), make_user(db)) for _ in range(3)]
+
+    with statements() as sent:
+        results = run(lambda session: ballot.cast_votes(session, ballots))
+
+    assert not any(isinstance(result, HTTPException) for result in results)
+    assert len(sent) == 2
+
+
+@pytest.fixture
+def group_commit(monkeypatch):
+    monkeypatch.setattr(settings, "vote_ingest_mode", "group_commit")
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_writer_records_ballots(group_commit, db):
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+    voter = make_user(db)
+    batches = metrics.snapshot()["summaries"].get("vote_batch_size", {}).get("count", 0)
+    body = {"electionId": election.id, "candidateId": candidate.id}
+
+    response = group_commit.post("/votes", json=body, headers=auth(voter))
+    assert response.status_code == 201
+    assert response.json()["voterId"] == voter.id
+    response = group_commit.post("/votes", json=body, headers=auth(voter))
+    assert (response.status_code, response.json()["detail"]) == (403, "multiple voting is not allowed")
+    assert metrics.snapshot()["summaries"]["vote_batch_size"]["count"] == batches + 2
+    assert db.query(models.Vote).count() == 1
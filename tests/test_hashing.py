@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from e_voting.api.app.hashing import PasswordHasher
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(workers=1, max_pending=10)
+
+    async def roundtrip():
+        hashed = await hasher.hash("secret")
+        return await hasher.verify("secret", hashed), await hasher.verify("wrong", hashed)
+
+    try:
+        assert asyncio.run(roundtrip()) == (True, False)
+    finally:
+        hasher.shutdown()
+
+
+def test_overload_is_refused_without_revealing_why():
+    hasher = PasswordHasher(workers=1, max_pending=0)
+    try:
+        with pytest.raises(HTTPException) as refused:
+            asyncio.run(hasher.hash("secret"))
+    finally:
+        hasher.shutdown()
+
+    assert refused.value.status_code == 503
+    assert refused.value.detail == "Server busy, retry later"
+    assert refused.value.headers == {"Retry-After": "1"}
@@ -0,0 +1,87 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from e_voting.api.app import idempotency, models
+from e_voting.api.app.config import settings
+from e_voting.api.app.main import app
+from tests.factories import auth, make_candidate, make_election, make_user, run, statements
+
+
+def cast(client, user, election, candidate, key):
+    return client.post(
+        "/votes", json={"electionId": election.id, "candidateId": candidate.id},
+        headers={**auth(user), "Idempotency-Key": key}
+    )
+
+
+def test_retry_gets_the_first_response(client, db):
+    voter = make_user(db)
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+
+    first = cast(client, voter, election, candidate, "k1")
+    retry = cast(client, voter, election, candidate, "k1")
+    idempotency.responses.clear()
+    from_database = cast(client, voter, election, candidate, "k1")
+
+    assert first.status_code == retry.status_code == from_database.status_code == 201
+    assert first.json() == retry.json() == from_database.json()
+    assert cast(client, voter, election, candidate, "k2").status_code == 403
+
+
+def test_key_of_another_ballot_is_refused(client, db):
+    voter = make_user(db)
+    election = make_election(db)
+    first, second = make_candidate(db, election), make_candidate(db, election)
+
+    assert cast(client, voter, election, first, "k1").status_code == 201
+    assert cast(client, voter, election, second, "k1").status_code == 422
+
+
+def test_key_is_committed_with_the_vote(client, db):
+    voter = make_user(db)
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+
+    with statements() as sent:
+        assert cast(client, voter, election, candidate, "k1").status_code == 201
+
+    writes = [statement.split()[0:3] for statement in sent if not statement.startswith("SELECT")]
+    assert writes == [["INSERT", "INTO", "votes"], ["INSERT", "INTO", "idempotency_keys"], ["COMMIT"]]
+
+
+@pytest.fixture
+def group_commit(monkeypatch):
+    monkeypatch.setattr(settings, "vote_ingest_mode", "group_commit")
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_key_is_committed_with_the_batch(group_commit, db):
+    voter = make_user(db)
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+
+    first = cast(group_commit, voter, election, candidate, "k1")
+    idempotency.responses.clear()
+    retry = cast(group_commit, voter, election, candidate, "k1")
+
+    assert first.status_code == retry.status_code == 201
+    assert first.json() == retry.json()
+    assert db.query(models.IdempotencyKey).count() == 1
+
+
+def test_replayed_key_keeps_its_expiry(db):
+    voter = make_user(db)
+    created_at = datetime.now(timezone.utc) - timedelta(seconds=settings.idempotency_window_seconds - 60)
+    db.add(models.IdempotencyKey(
+        user_id=voter.id, key="k1", status_code=201, response='{"electionId": 1}', created_at=created_at
+    ))
+    db.commit()
+
+    assert run(lambda session: idempotency.lookup(session, voter.id, "k1")) == (201, {"electionId": 1})
+
+    expires, _ = idempotency.responses._data[(voter.id, "k1")]
+    assert 55 < expires - time.monotonic() <= 60
@@ -0,0 +1,63 @@
+"""
+The hot queries of the API are checked to be answered through their index rather than a scan of the table.
+
+The plans are read with EXPLAIN QUERY PLAN on SQLite, and with EXPLAIN on Postgres when DATABASE_URL points at one,
+sequential scans disabled so that the planner does not prefer them on the small test tables.
+"""
+import json
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import func, select
+from e_voting.api.app import models
+from e_voting.api.app.database import engine
+
+U, C, V, E, R = models.User, models.Candidates, models.Vote, models.Election, models.RefreshToken
+NOW = datetime.now(timezone.utc)
+# the name prefix index leads with lower(lga) as well, either one serves a filter on the LGA
+LGA_INDEXES = ("ix_users_lower_lga", "ix_users_lga_name_prefix")
+
+HOT_QUERIES = [
+    ("login by email", select(U).where(U.email == "voter@example.com"), "ix_users_email"),
+    ("official login", select(U).where(U.admin_id == "adm1"), "ix_users_admin_id"),
+    ("voters of a state", select(U.id).where(func.lower(U.state) == "lagos"), "ix_users_lower_state"),
+    ("voters of an LGA", select(U.id).where(func.lower(U.lga) == "ikeja"), LGA_INDEXES),
+    ("voter by VIN", select(U).where(U.vin == "VIN1"), "ix_users_vin"),
+    ("voter by phone", select(U).where(U.mobile_no == "08012345678"), "ix_users_mobile_no"),
+    # SQLite's case insensitive LIKE cannot range over lower(name), there the index only narrows down the LGA
+    ("voter by name prefix", select(U).where(
+        func.lower(U.lga) == "ikeja", func.lower(U.name).startswith("ada", autoescape=True)
+    ), "ix_users_lga_name_prefix" if engine.dialect.name == "postgresql" else LGA_INDEXES),
+    ("candidates of an election", select(C).where(C.election_id == 1), "ix_candidates_election_id"),
+    ("candidates of a party", select(C).where(C.party_name == "APC"), "ix_candidates_party_name"),
+    ("votes of a candidate", select(V).where(V.candidateId == 1), "ix_votes_candidateId"),
+    ("active elections", select(E).where(E.end_date > NOW), "ix_election_end_date"),
+    ("active elections of a state", select(E).where(E.state == "Lagos", E.end_date > NOW),
+     "ix_election_state_end_date"),
+    ("active elections of an LGA", select(E).where(E.lga == "Ikeja", E.end_date > NOW), "ix_election_lga_end_date"),
+    ("refresh tokens of a user", select(R).where(R.user_id == 1), "ix_refresh_tokens_user_id"),
+]
+
+
+def plan(connection, stmt):
+    """Return the plan of a query as text"""
+    compiled = stmt.compile(dialect=connection.dialect)
+    params = compiled.construct_params()
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar_one()
+        return json.dumps(rows)
+    values = tuple(
+        value.isoformat(" ") if isinstance(value, datetime) else value
+        for value in (params[name] for name in compiled.positiontup)
+    )
+    return "\n".join(row.detail for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", values))
+
+
+@pytest.mark.parametrize("stmt, indexes", [(stmt, indexes) for _, stmt, indexes in HOT_QUERIES],
+                         ids=[name for name, _, _ in HOT_QUERIES])
+def test_hot_query_uses_its_index(stmt, indexes):
+    with engine.begin() as connection:
+        found = plan(connection, stmt)
+    assert any(index in found for index in ([indexes] if isinstance(indexes, str) else indexes)), found
+    assert "Seq Scan" not in found and f"SCAN {stmt.get_final_froms()[0].name}\n" not in found + "\n"
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+from e_voting.api.app import cache, models
+from e_voting.api.app.lifecycle import scheduler
+from e_voting.api.app.tally import tally
+from tests.factories import auth, make_candidate, make_election, make_user, run
+
+
+def vote(db, election, candidate):
+    voter = make_user(db)
+    db.add(models.Vote(voterId=voter.id, electionId=election.id, candidateId=candidate.id))
+    db.commit()
+    tally.increment(election.id, candidate.id, voter.state, voter.lga)
+    return voter
+
+
+def test_tick_opens_started_elections_and_closes_ended_ones(db):
+    running = make_election(db)
+    upcoming = make_election(db, starts=1, ends=2)
+    ended = make_election(db, starts=-2, ends=-1)
+
+    run(scheduler.tick)
+
+    assert scheduler.opened == {running.id}
+    assert cache.closed == {ended.id}
+    assert [row.election_id for row in db.query(models.ElectionResult)] == [ended.id]
+    assert upcoming.id not in scheduler.opened
+
+
+def test_ticks_only_read_the_elections_closed_since_the_previous_one(db):
+    run(lambda session: scheduler.close(session, make_election(db, starts=-2, ends=-1).id))
+    run(scheduler.tick)
+    # snapshots written by other workers, one long before the latest closure this worker has seen
+    recent, old = make_election(db), make_election(db)
+    db.add_all([
+        models.ElectionResult(election_id=recent.id, total_votes=0, statistics="{}", participants="[]"),
+        models.ElectionResult(election_id=old.id, total_votes=0, statistics="{}", participants="[]",
+                              closed_at=datetime.now(timezone.utc) - timedelta(hours=2)),
+    ])
+    db.commit()
+
+    run(scheduler.tick)
+
+    assert cache.is_closed(recent.id) and not cache.is_closed(old.id)
+
+
+def test_election_is_not_closed_within_the_grace_period(db, monkeypatch):
+    monkeypatch.setattr("e_voting.api.app.lifecycle.settings.election_close_grace_seconds", 7200)
+    ended = make_election(db, starts=-2, ends=-1)
+
+    run(scheduler.tick)
+
+    assert not cache.is_closed(ended.id)
+    assert db.query(models.ElectionResult).count() == 0
+
+
+def test_closed_election_serves_its_frozen_results(client, db):
+    election = make_election(db, starts=-2, ends=-1)
+    candidate = make_candidate(db, election)
+    vote(db, election, candidate)
+
+    run(lambda session: scheduler.close(session, election.id))
+    frozen = client.get(f"/elections/{election.id}/statistics").json()
+    assert frozen["total_votes"] == 1
+    assert db.get(models.ElectionResult, election.id).total_votes == 1
+
+    # a straggler counted after the close changes neither the snapshot nor what is served
+    vote(db, election, candidate)
+    run(tally.flush)
+    run(lambda session: scheduler.close(session, election.id))
+    scheduler.snapshots.clear()
+
+    assert client.get(f"/elections/{election.id}/statistics").json() == frozen
+    participants = client.get(f"/elections/{election.id}/participants").json()["participants"]
+    assert [participant["candidate_id"] for participant in participants] == [candidate.id]
+
+
+def test_closed_election_rejects_ballots(client, db):
+    election = make_election(db, starts=-2, ends=-1)
+    candidate = make_candidate(db, election)
+    run(lambda session: scheduler.close(session, election.id))
+
+    response = client.post(
+        "/votes", json={"electionId": election.id, "candidateId": candidate.id}, headers=auth(make_user(db))
+    )
+    assert (response.status_code, response.json()["detail"]) == (403, "Election is Closed!")
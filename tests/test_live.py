@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from e_voting.api.app import models
+from e_voting.api.app.database import AsyncSessionLocal
+from e_voting.api.app.lifecycle import scheduler
+from e_voting.api.app.live import broadcaster
+from e_voting.api.app.routers.election import stream_election_results
+from e_voting.api.app.tally import tally
+from tests.factories import make_candidate, make_election, make_user
+
+
+def ended_election_with_a_vote(db):
+    election = make_election(db, starts=-2, ends=-1)
+    candidate = make_candidate(db, election)
+    voter = make_user(db)
+    db.add(models.Vote(voterId=voter.id, electionId=election.id, candidateId=candidate.id))
+    db.commit()
+    # counted like POST /votes does, the close flushes it
+    tally.increment(election.id, candidate.id, voter.state, voter.lga)
+    return election, candidate
+
+
+async def close(election_id):
+    async with AsyncSessionLocal() as session:
+        await scheduler.close(session, election_id)
+
+
+def test_followers_get_the_final_results_when_the_election_closes(db):
+    election, candidate = ended_election_with_a_vote(db)
+
+    async def follow():
+        async with broadcaster.subscribe(election.id) as queue:
+            snapshot = await asyncio.wait_for(queue.get(), 5)
+            await close(election.id)
+            final = await asyncio.wait_for(queue.get(), 5)
+            assert queue.empty()
+        return snapshot, final
+
+    snapshot, final = asyncio.run(follow())
+
+    assert snapshot == {"type": "snapshot", "election": election.id, "counts": {str(candidate.id): 1}}
+    assert final == {"type": "final", "election": election.id, "counts": {str(candidate.id): 1}}
+    assert election.id not in broadcaster.feeds
+
+
+def test_event_stream_ends_when_the_election_closes(db):
+    election, candidate = ended_election_with_a_vote(db)
+
+    async def follow():
+        async with AsyncSessionLocal() as session:
+            response = await stream_election_results(election.id, session)
+        events = []
+        async for event in response.body_iterator:
+            events.append(event)
+            if len(events) == 1:
+                await close(election.id)
+        return events
+
+    events = asyncio.run(asyncio.wait_for(follow(), 10))
+
+    assert [event.split("\n")[0] for event in events] == ["event: snapshot", "event: final"]
+    assert json.loads(events[1].split("data: ")[1])["counts"] == {str(candidate.id): 1}
+
+
+def test_closed_election_gets_a_single_final_event(client, db):
+    election, candidate = ended_election_with_a_vote(db)
+    asyncio.run(close(election.id))
+
+    response = client.get(f"/elections/{election.id}/results/stream")
+
+    assert response.text.startswith("event: final\n")
+    assert response.text.count("event:") == 1
@@ -0,0 +1,57 @@
+import json
+
+from e_voting.api.app import models
+from tests.factories import make_candidate, make_election, make_user
+
+
+def vote_for_all(db, election, candidate, voters):
+    db.add_all(models.Vote(voterId=voter.id, electionId=election.id, candidateId=candidate.id) for voter in voters)
+    db.commit()
+
+
+def test_pages_follow_the_cursor(client, db):
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+    voters = [make_user(db) for _ in range(5)]
+    vote_for_all(db, election, candidate, voters)
+
+    seen = []
+    cursor = None
+    while True:
+        response = client.get(f"/votes/{election.id}", params={"limit": 2, **({"after": cursor} if cursor else {})})
+        assert response.status_code == 200
+        seen.extend(vote["voterId"] for vote in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == sorted(voter.id for voter in voters)
+
+
+def test_last_page_has_no_cursor(client, db):
+    election = make_election(db)
+    vote_for_all(db, election, make_candidate(db, election), [make_user(db)])
+
+    response = client.get(f"/votes/{election.id}", params={"limit": 5})
+
+    assert len(response.json()) == 1
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_filter_and_stream(client, db):
+    election = make_election(db)
+    first, second = make_candidate(db, election), make_candidate(db, election)
+    voters = [make_user(db) for _ in range(4)]
+    vote_for_all(db, election, first, voters[:3])
+    vote_for_all(db, election, second, voters[3:])
+
+    response = client.get(f"/votes/{election.id}", params={"stream": "true", "candidate_id": first.id})
+
+    assert response.headers["content-type"].startswith("application/json")
+    assert [vote["voterId"] for vote in json.loads(response.content)] == [voter.id for voter in voters[:3]]
+
+
+def test_invalid_cursor_and_limit(client, db):
+    election = make_election(db)
+    assert client.get(f"/votes/{election.id}", params={"after": "garbage"}).status_code == 400
+    assert client.get(f"/votes/{election.id}", params={"limit": 0}).status_code == 422
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+from e_voting.api.app import models, oauth
+from tests.factories import PASSWORD, make_admin, make_user
+
+
+def login(client, user):
+    response = client.post("/authentication/login", data={"username": user.email, "password": PASSWORD})
+    assert response.status_code == 200
+    return response.json()
+
+
+def refresh(client, token):
+    return client.post("/authentication/refresh", json={"refresh_token": token})
+
+
+def test_refresh_rotates_the_token(client, db):
+    tokens = login(client, make_user(db))
+
+    response = refresh(client, tokens["refresh_token"])
+
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert client.get("/elections/active/mine", headers={"Authorization": f"Bearer {rotated['access_token']}"}
+                      ).status_code == 200
+    assert refresh(client, rotated["refresh_token"]).status_code == 200
+
+
+def test_reused_token_revokes_the_whole_family(client, db):
+    tokens = login(client, make_user(db))
+    rotated = refresh(client, tokens["refresh_token"]).json()
+
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    assert refresh(client, rotated["refresh_token"]).status_code == 401
+
+
+def test_revoke(client, db):
+    voter = make_user(db)
+    first, second = login(client, voter), login(client, voter)
+
+    assert client.post("/authentication/revoke", json={"refresh_token": first["refresh_token"]}).status_code == 204
+    assert refresh(client, second["refresh_token"]).status_code == 200
+    assert refresh(client, first["refresh_token"]).status_code == 401
+
+    third = login(client, voter)
+    fourth = login(client, voter)
+    client.post("/authentication/revoke?everywhere=true", json={"refresh_token": third["refresh_token"]})
+    assert refresh(client, fourth["refresh_token"]).status_code == 401
+
+
+def test_stale_token_can_not_revoke_every_session(client, db):
+    voter = make_user(db)
+    revoked, expired, active = login(client, voter), login(client, voter), login(client, voter)
+    client.post("/authentication/revoke", json={"refresh_token": revoked["refresh_token"]})
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.token_hash == oauth.token_hash(expired["refresh_token"])
+    ).update({"expires_at": datetime.now(timezone.utc) - timedelta(minutes=1)})
+    db.commit()
+
+    for stale in (revoked, expired, {"refresh_token": "not-a-token"}):
+        response = client.post("/authentication/revoke?everywhere=true", json={"refresh_token": stale["refresh_token"]})
+        assert response.status_code == 401
+    assert refresh(client, active["refresh_token"]).status_code == 200
+
+
+def test_official_login_issues_a_refresh_token(client, db):
+    admin = make_admin(db)
+    response = client.post("/authentication/official/login", data={"username": admin.admin_id, "password": PASSWORD})
+    assert response.status_code == 200
+    assert refresh(client, response.json()["refresh_token"]).status_code == 200
+
+
+def test_unknown_token(client):
+    assert refresh(client, "not-a-token").status_code == 401
@@ -0,0 +1,68 @@
+import json
+from typing import Optional
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import select
+from e_voting.api.app import models, schemas
+from e_voting.api.app.serialization import project
+from tests.factories import auth, make_admin, make_candidate, make_election, make_party, make_user
+
+LISTS = [
+    (models.User, schemas.User), (models.Party, schemas.PartyView), (models.Vote, schemas.Vote),
+    (models.Election, schemas.Election), (models.Candidates, schemas.Candidate),
+]
+
+
+@pytest.mark.parametrize("entity, schema", LISTS)
+def test_list_schemas_are_projected_onto_every_field(entity, schema):
+    assert project(select(entity), schema).names == tuple(schema.__fields__)
+
+
+def test_unmapped_field_is_rejected():
+    class Voter(schemas.User):
+        age: Optional[int]
+
+    with pytest.raises(ValueError, match="Voter.age is not a column of User"):
+        project(select(models.User), Voter)
+
+
+def test_rows_with_null_in_a_required_field_are_skipped(db):
+    make_user(db, vin=None)
+    listed = make_user(db)
+
+    class Voter(BaseModel):
+        id: int
+        vin: Optional[str]
+
+    required = project(select(models.User).order_by(models.User.id), schemas.User)
+    optional = project(select(models.User).order_by(models.User.id), Voter)
+
+    assert [row.id for row in db.execute(required.stmt)] == [listed.id]
+    assert len(db.execute(optional.stmt).all()) == 2
+
+
+def test_users_without_vin_are_left_out_of_the_list(client, db):
+    unaccredited = make_user(db, vin=None)
+    admin = make_admin(db)
+
+    listed = [user["id"] for user in client.get("/users/", headers=auth(admin)).json()]
+    assert unaccredited.id not in listed and listed == [admin.id]
+
+
+def test_projection_encodes_like_pydantic(db):
+    make_user(db, vin=None)
+    make_user(db)
+    make_party(db)
+    election = make_election(db, state="Lagos")
+    make_candidate(db, election)
+
+    for entity, schema in LISTS:
+        projection = project(select(entity).order_by(*entity.__table__.primary_key), schema)
+        rows = db.execute(projection.stmt).all()
+        items = [item for item in db.scalars(select(entity).order_by(*entity.__table__.primary_key))
+                 if not (entity is models.User and item.vin is None)]
+        expected = jsonable_encoder([schema(**{name: getattr(item, name) for name in schema.__fields__})
+                                     for item in items])
+        assert json.loads(projection.dumps(rows)) == json.loads(json.dumps(expected)), schema.__name__
@@ -0,0 +1,59 @@
+from fastapi.testclient import TestClient
+from e_voting.api.app import manage, models
+from e_voting.api.app.main import app
+from e_voting.api.app.tally import TallyCounter, tally
+from tests.factories import auth, make_candidate, make_election, make_user, run
+
+
+def test_increments_are_counted_before_and_after_a_flush(db):
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+    counter = TallyCounter()
+    counter.increment(election.id, candidate.id, " Lagos", "IKEJA ")
+    counter.increment(election.id, candidate.id, "lagos", "ikeja")
+
+    assert run(lambda session: counter.totals(session, election.id)) == {candidate.id: 2}
+    assert run(counter.flush) == 1
+    assert counter.pending() == {}
+    assert run(lambda session: counter.totals(session, election.id)) == {candidate.id: 2}
+    regional = run(lambda session: counter.regional_totals(session, election.id))
+    assert regional == {(candidate.id, "lagos", "ikeja"): 2}
+
+
+def test_votes_are_tallied(client, db):
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+    for _ in range(3):
+        assert client.post(
+            "/votes", json={"electionId": election.id, "candidateId": candidate.id}, headers=auth(make_user(db))
+        ).status_code == 201
+
+    assert run(lambda session: tally.totals(session, election.id)) == {candidate.id: 3}
+
+
+def test_startup_does_not_reconcile(db):
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+    db.query(models.Candidates).update({"total_votes": 7})
+    db.commit()
+
+    with TestClient(app):
+        pass
+
+    assert db.get(models.Candidates, candidate.id).total_votes == 7
+
+
+def test_reconcile_command(db):
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+    voter = make_user(db, state="Lagos ", lga="Ikeja")
+    db.add(models.Vote(voterId=voter.id, electionId=election.id, candidateId=candidate.id))
+    db.query(models.Candidates).update({"total_votes": 7})
+    db.commit()
+
+    manage.main(["reconcile"])
+
+    db.expire_all()
+    assert db.get(models.Candidates, candidate.id).total_votes == 1
+    stats = db.query(models.ElectionStats.state, models.ElectionStats.lga, models.ElectionStats.votes).all()
+    assert stats == [("lagos", "ikeja", 1)]
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from e_voting.api.app.config import settings
+from e_voting.api.app.throttle import login_gate
+from tests.factories import PASSWORD, make_user
+
+
+def attempt(ip, account):
+    async def admit():
+        async with login_gate.admit(ip, account):
+            pass
+    asyncio.run(admit())
+
+
+def test_attacker_cannot_lock_a_voter_out():
+    for _ in range(settings.login_account_burst):
+        attempt("10.0.0.66", "voter@example.com")
+    with pytest.raises(HTTPException) as refused:
+        attempt("10.0.0.66", "voter@example.com")
+    assert refused.value.status_code == 429
+
+    attempt("10.0.0.7", " Voter@Example.com")
+
+
+def test_guessing_one_account_from_many_clients_is_capped():
+    for n in range(settings.login_account_global_burst):
+        attempt(f"10.1.{n // 256}.{n % 256}", "voter@example.com")
+    with pytest.raises(HTTPException) as refused:
+        attempt("10.2.0.1", "voter@example.com")
+    assert refused.value.status_code == 429
+
+
+def test_one_client_is_capped_across_accounts():
+    for n in range(settings.login_ip_burst):
+        attempt("10.0.0.66", f"voter{n}@example.com")
+    with pytest.raises(HTTPException):
+        attempt("10.0.0.66", "someone.else@example.com")
+
+
+def test_login_route_is_throttled(client, db):
+    voter = make_user(db)
+    for _ in range(settings.login_account_burst):
+        response = client.post("/authentication/login", data={"username": voter.email, "password": "wrong"})
+        assert response.status_code == 403
+
+    response = client.post("/authentication/login", data={"username": voter.email, "password": PASSWORD})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
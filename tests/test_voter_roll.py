@@ -0,0 +1,44 @@
+import time
+
+from e_voting.api.app import models
+from tests.factories import auth, make_admin, make_user
+
+HEADER = "name,email,password,nin,state,lga,address,dob,gender,mobile_no\n"
+
+
+def row(n, nin=None, email=None):
+    return (f"Voter {n},{email or f'roll{n}@example.com'},secret{n},{nin or f'9{n:010d}'},Lagos,Ikeja,"
+            f"1 Main Street,1990-01-01,F,080{n:08d}\n")
+
+
+def wait_for(client, admin, job_id):
+    for _ in range(200):
+        report = client.get(f"/users/bulk/{job_id}", headers=auth(admin)).json()
+        if report["status"] in ("done", "failed"):
+            return report
+        time.sleep(0.05)
+    raise AssertionError(f"import {job_id} did not finish: {report}")
+
+
+def test_roll_import(client, db):
+    admin = make_admin(db)
+    registered = make_user(db)
+    upload = HEADER + row(1) + row(2) + row(3, nin="90000000001") + row(4, email="not-an-email") \
+        + row(5, nin=registered.nin)
+
+    response = client.post("/users/bulk", content=upload, headers={**auth(admin), "Content-Type": "text/csv"})
+    assert response.status_code == 202
+    report = wait_for(client, admin, response.json()["job"])
+
+    assert report["status"] == "done"
+    assert (report["rows"], report["inserted"], report["rejected"]) == (5, 2, 3)
+    assert [rejection["row"] for rejection in report["rejections"]] == [3, 4, 5]
+    imported = db.query(models.User).filter(models.User.email.in_(["roll1@example.com", "roll2@example.com"])).all()
+    assert len(imported) == 2
+    assert all(user.vin and user.password != "secret1" for user in imported)
+
+
+def test_roll_import_is_for_admins(client, db):
+    voter = make_user(db)
+    assert client.post("/users/bulk", content=HEADER, headers=auth(voter)).status_code == 401
+    assert client.get("/users/bulk/unknown", headers=auth(make_admin(db))).status_code == 404
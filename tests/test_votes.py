@@ -0,0 +1,102 @@
+import asyncio
+
+from e_voting.api.app import ballot, schemas
+from e_voting.api.app.database import AsyncSessionLocal
+from tests.factories import auth, make_candidate, make_election, make_user, statements
+
+
+def cast(client, user, election, candidate, **headers):
+    return client.post(
+        "/votes", json={"electionId": election.id, "candidateId": candidate.id}, headers={**auth(user), **headers}
+    )
+
+
+def test_vote_is_recorded(client, db):
+    voter = make_user(db)
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+
+    response = cast(client, voter, election, candidate)
+
+    assert response.status_code == 201
+    body = response.json()
+    assert (body["voterId"], body["electionId"], body["candidateId"]) == (voter.id, election.id, candidate.id)
+    assert body["voted_at"]
+    listed = client.get(f"/votes/{election.id}").json()
+    assert [(vote["voterId"], vote["candidateId"]) for vote in listed] == [(voter.id, candidate.id)]
+
+
+def test_unknown_election(client, db):
+    voter = make_user(db)
+    response = client.post("/votes", json={"electionId": 999, "candidateId": 1}, headers=auth(voter))
+    assert response.status_code == 404
+
+
+def test_election_window(client, db):
+    voter = make_user(db)
+    ended = make_election(db, starts=-2, ends=-1)
+    upcoming = make_election(db, starts=1, ends=2)
+
+    response = cast(client, voter, ended, make_candidate(db, ended))
+    assert (response.status_code, response.json()["detail"]) == (403, "Election is Closed!")
+    response = cast(client, voter, upcoming, make_candidate(db, upcoming))
+    assert (response.status_code, response.json()["detail"]) == (403, "Election has not started!")
+
+
+def test_candidate_of_another_election(client, db):
+    voter = make_user(db)
+    election = make_election(db)
+    other = make_candidate(db, make_election(db))
+    assert cast(client, voter, election, other).status_code == 400
+
+
+def test_eligibility(client, db):
+    election = make_election(db, state="Lagos")
+    candidate = make_candidate(db, election)
+
+    assert cast(client, make_user(db, state="Kano", lga="Nassarawa"), election, candidate).status_code == 401
+    assert cast(client, make_user(db, accredited=False), election, candidate).status_code == 401
+    assert cast(client, make_user(db, state="LAGOS"), election, candidate).status_code == 201
+
+
+def test_multiple_voting(client, db):
+    voter = make_user(db)
+    election = make_election(db)
+    first, second = make_candidate(db, election), make_candidate(db, election)
+
+    assert cast(client, voter, election, first).status_code == 201
+    response = cast(client, voter, election, second)
+    assert (response.status_code, response.json()["detail"]) == (403, "multiple voting is not allowed")
+
+
+def _cast_vote(body, user):
+    async def run():
+        async with AsyncSessionLocal() as session:
+            with statements() as sent:
+                try:
+                    return await ballot.cast_vote(session, body, user), sent
+                except Exception as exc:
+                    return exc, sent
+    return asyncio.run(run())
+
+
+def test_cast_vote_is_one_statement(db):
+    voter = make_user(db)
+    election = make_election(db)
+    candidate = make_candidate(db, election)
+
+    vote_cast, sent = _cast_vote(schemas.VoteCreate(electionId=election.id, candidateId=candidate.id), voter)
+
+    assert (vote_cast.voterId, vote_cast.candidateId) == (voter.id, candidate.id)
+    assert len(sent) == 2 and sent[0].startswith("INSERT INTO votes") and sent[1] == "COMMIT"
+
+
+def test_rejected_ballot_is_diagnosed_with_one_query(db):
+    voter = make_user(db)
+    election = make_election(db, starts=-2, ends=-1)
+    candidate = make_candidate(db, election)
+
+    error, sent = _cast_vote(schemas.VoteCreate(electionId=election.id, candidateId=candidate.id), voter)
+
+    assert (error.status_code, error.detail) == (403, "Election is Closed!")
+    assert [statement.split()[0] for statement in sent] == ["INSERT", "COMMIT", "SELECT"]